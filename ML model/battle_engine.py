@@ -0,0 +1,134 @@
+"""
+Vectorized version of the battle rules in battle_simulator.py.
+
+`simulate_battle` plays a fight out hit by hit. Every hit a Pokémon lands does
+the same damage, so the fight is decided by how many hits each side needs:
+
+    damage   = (Attack / Defense) * 50 * multiplier
+    hits     = number of hits until HP <= 0
+    p1 wins  iff  hits(first mover) <= hits(other)
+
+BattleEngine keeps every species' stats in NumPy arrays and evaluates whole
+batches of pairs with a few array operations. Hit counts come from
+ceil(HP / damage), except where HP / damage is within rounding distance of
+an integer; for those few pairs the HP subtraction is replayed exactly as the
+loop does it, so winners are bit-identical to `simulate_battle`.
+
+    python battle_engine.py --benchmark
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+from battle_simulator import DATA_PATH, simulate_battle
+from app.type_chart import combo_index, dual_multipliers, type_index
+
+# HP / damage closer than this (relative) to a whole number is re-checked hit by hit
+NEAR_INTEGER = 1e-6
+
+
+class BattleEngine:
+    """All species of a Pokédex DataFrame as arrays, indexed by DataFrame position."""
+
+    def __init__(self, df):
+        self.hp = df['HP'].to_numpy(dtype=np.float64)
+        self.attack = df['Attack'].to_numpy(dtype=np.float64)
+        self.defense = df['Defense'].to_numpy(dtype=np.float64)
+        self.speed = df['Speed'].to_numpy(dtype=np.float64)
+        # Attacking type and defending type combination, as indices into app.type_chart.DUAL_MULTIPLIERS
+        self.type1 = np.array([type_index(t) for t in df['Type 1']], dtype=np.intp)
+        self.combo = np.array([combo_index(t1, t2) for t1, t2 in zip(df['Type 1'], df['Type 2'])], dtype=np.intp)
+
+    @classmethod
+    def from_csv(cls, path=DATA_PATH):
+        return cls(pd.read_csv(path))
+
+    def __len__(self):
+        return len(self.hp)
+
+    def damage(self, attackers, defenders):
+        """Damage per hit, computed in the same order of operations as calculate_damage."""
+        # Only the attacker's primary type counts, against both of the defender's types
+        multiplier = dual_multipliers(self.type1[attackers], self.combo[defenders])
+        return (self.attack[attackers] / self.defense[defenders]) * 50 * multiplier
+
+    @staticmethod
+    def hits_to_ko(hp, damage):
+        """Hits needed to bring `hp` to 0 or below with repeated `hp -= damage`; inf when damage is 0."""
+        hits = np.full(hp.shape, np.inf)
+        hurts = damage > 0
+        ratio = hp[hurts] / damage[hurts]
+        hits[hurts] = np.ceil(ratio)
+
+        # Replay the subtraction where float rounding could move the KO by one hit
+        nearest = np.rint(ratio)
+        suspect = np.flatnonzero(hurts)[np.abs(ratio - nearest) <= NEAR_INTEGER * np.maximum(nearest, 1)]
+        if len(suspect):
+            remaining = hp[suspect].copy()
+            step = damage[suspect]
+            count = np.zeros(len(suspect))
+            alive = remaining > 0
+            while alive.any():
+                remaining[alive] -= step[alive]
+                count[alive] += 1
+                alive = remaining > 0
+            hits[suspect] = count
+        return hits
+
+    def simulate(self, p1, p2):
+        """Winner (1 or 2) of each battle p1[i] vs p2[i], given as DataFrame row positions."""
+        p1 = np.asarray(p1, dtype=np.intp)
+        p2 = np.asarray(p2, dtype=np.intp)
+        p1_hits = self.hits_to_ko(self.hp[p2], self.damage(p1, p2))
+        p2_hits = self.hits_to_ko(self.hp[p1], self.damage(p2, p1))
+
+        # p1 moves first on ties; the first mover wins if it needs no more hits than the other side.
+        # When neither side can do damage the first mover is declared the winner.
+        p1_first = self.speed[p1] >= self.speed[p2]
+        first_hits = np.where(p1_first, p1_hits, p2_hits)
+        second_hits = np.where(p1_first, p2_hits, p1_hits)
+        first_wins = first_hits <= second_hits
+        return np.where(first_wins == p1_first, 1, 2).astype(np.int8)
+
+
+def benchmark(num_battles=20000, seed=0):
+    """Battles per second of simulate_battle on DataFrame rows vs. BattleEngine, plus an agreement check."""
+    df = pd.read_csv(DATA_PATH)
+    engine = BattleEngine(df)
+
+    rng = random.Random(seed)
+    pairs = np.array([rng.sample(range(len(df)), 2) for _ in range(num_battles)])
+
+    start = time.perf_counter()
+    loop_winners = np.array([simulate_battle(df.iloc[i], df.iloc[j]) for i, j in pairs], dtype=np.int8)
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine_winners = engine.simulate(pairs[:, 0], pairs[:, 1])
+    engine_seconds = time.perf_counter() - start
+
+    # Every ordered pair, to check agreement beyond the sample
+    n = len(engine)
+    start = time.perf_counter()
+    engine.simulate(np.repeat(np.arange(n), n), np.tile(np.arange(n), n))
+    all_pairs_seconds = time.perf_counter() - start
+
+    mismatches = int((loop_winners != engine_winners).sum())
+    print(f"Loop:   {num_battles / loop_seconds:12,.0f} battles/s ({loop_seconds:.2f}s for {num_battles:,})")
+    print(f"Engine: {num_battles / engine_seconds:12,.0f} battles/s ({engine_seconds * 1000:.1f}ms for {num_battles:,})")
+    print(f"Engine, all {n * n:,} ordered pairs: {n * n / all_pairs_seconds:,.0f} battles/s")
+    print(f"Winners differing from simulate_battle: {mismatches}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vectorized battle simulation.")
+    parser.add_argument("--benchmark", action="store_true", help="Compare throughput and winners with simulate_battle")
+    parser.add_argument("--battles", type=int, default=20000)
+    args = parser.parse_args()
+    if args.benchmark:
+        raise SystemExit(1 if benchmark(args.battles) else 0)
+    parser.print_help()
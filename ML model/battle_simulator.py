@@ -1,126 +1,286 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
 import pandas as pd
-import random
+
+# The type chart is shared with the server: import app.type_chart from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.catalog import PokemonCatalog  # noqa: E402
+from app.ground_truth import GroundTruth, OUTCOMES_PATH, save_outcomes  # noqa: E402
+from app.type_chart import TYPE_CHART, dual_multiplier  # noqa: E402
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pokemon_data.csv')
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 def get_type_effectiveness():
     """Returns a dictionary representing the Pokémon type effectiveness chart."""
-    return {
-        'Normal': {'Rock': 0.5, 'Ghost': 0, 'Steel': 0.5},
-        'Fire': {'Fire': 0.5, 'Water': 0.5, 'Grass': 2, 'Ice': 2, 'Bug': 2, 'Rock': 0.5, 'Dragon': 0.5, 'Steel': 2},
-        'Water': {'Fire': 2, 'Water': 0.5, 'Grass': 0.5, 'Ground': 2, 'Rock': 2, 'Dragon': 0.5},
-        'Electric': {'Water': 2, 'Electric': 0.5, 'Grass': 0.5, 'Ground': 0, 'Flying': 2, 'Dragon': 0.5},
-        'Grass': {'Fire': 0.5, 'Water': 2, 'Grass': 0.5, 'Poison': 0.5, 'Ground': 2, 'Flying': 0.5, 'Bug': 0.5, 'Rock': 2, 'Dragon': 0.5, 'Steel': 0.5},
-        'Ice': {'Fire': 0.5, 'Water': 0.5, 'Grass': 2, 'Ice': 0.5, 'Ground': 2, 'Flying': 2, 'Dragon': 2, 'Steel': 0.5},
-        'Fighting': {'Normal': 2, 'Ice': 2, 'Poison': 0.5, 'Flying': 0.5, 'Psychic': 0.5, 'Bug': 0.5, 'Rock': 2, 'Ghost': 0, 'Dark': 2, 'Steel': 2, 'Fairy': 0.5},
-        'Poison': {'Grass': 2, 'Poison': 0.5, 'Ground': 0.5, 'Rock': 0.5, 'Ghost': 0.5, 'Steel': 0, 'Fairy': 2},
-        'Ground': {'Fire': 2, 'Electric': 2, 'Grass': 0.5, 'Poison': 2, 'Flying': 0, 'Bug': 0.5, 'Rock': 2, 'Steel': 2},
-        'Flying': {'Electric': 0.5, 'Grass': 2, 'Fighting': 2, 'Bug': 2, 'Rock': 0.5, 'Steel': 0.5},
-        'Psychic': {'Fighting': 2, 'Poison': 2, 'Psychic': 0.5, 'Dark': 0, 'Steel': 0.5},
-        'Bug': {'Fire': 0.5, 'Grass': 2, 'Fighting': 0.5, 'Poison': 0.5, 'Flying': 0.5, 'Psychic': 2, 'Ghost': 0.5, 'Dark': 2, 'Steel': 0.5, 'Fairy': 0.5},
-        'Rock': {'Fire': 2, 'Ice': 2, 'Fighting': 0.5, 'Ground': 0.5, 'Flying': 2, 'Bug': 2, 'Steel': 0.5},
-        'Ghost': {'Normal': 0, 'Psychic': 2, 'Ghost': 2, 'Dark': 0.5},
-        'Dragon': {'Dragon': 2, 'Steel': 0.5, 'Fairy': 0},
-        'Dark': {'Fighting': 0.5, 'Psychic': 2, 'Ghost': 2, 'Dark': 0.5, 'Fairy': 0.5},
-        'Steel': {'Fire': 0.5, 'Water': 0.5, 'Electric': 0.5, 'Ice': 2, 'Rock': 2, 'Steel': 0.5, 'Fairy': 2},
-        'Fairy': {'Fire': 0.5, 'Fighting': 2, 'Poison': 0.5, 'Dragon': 2, 'Dark': 2, 'Steel': 0.5}
-    }
-
-def calculate_damage(attacker, defender, type_chart):
-    """Calculates damage based on stats and type effectiveness."""
+    return TYPE_CHART
+
+def calculate_damage(attacker, defender):
+    """Calculates damage based on stats and type effectiveness (app.type_chart)."""
     # Simplified damage formula
     damage = (attacker['Attack'] / defender['Defense']) * 50
     
-    # Calculate type multiplier
-    multiplier = 1
-    type1_attacker = attacker['Type 1']
-    type2_attacker = attacker['Type 2']
-    
-    type1_defender = defender['Type 1']
-    type2_defender = defender['Type 2']
-    
-    if type1_defender in type_chart.get(type1_attacker, {}):
-        multiplier *= type_chart[type1_attacker][type1_defender]
-    if type2_defender and type2_defender in type_chart.get(type1_attacker, {}):
-        multiplier *= type_chart[type1_attacker][type2_defender]
+    # Type multiplier: the attacker's primary type against both of the defender's types
+    multiplier = dual_multiplier(attacker['Type 1'], defender['Type 1'], defender['Type 2'])
         
     # Sp. Atk could also be incorporated, but this is a good start
     
     return damage * multiplier
 
-def simulate_battle(p1, p2, type_chart):
+def simulate_battle(p1, p2):
     """Simulates a turn-based battle until one Pokémon faints."""
     p1_hp = p1['HP']
     p2_hp = p2['HP']
     
     # Pokémon with higher speed attacks first
     turn = 1 if p1['Speed'] >= p2['Speed'] else 2
+
+    # Neither side can hurt the other (e.g. Normal vs Ghost): the first mover wins instead of looping forever
+    if calculate_damage(p1, p2) == 0 and calculate_damage(p2, p1) == 0:
+        return turn
     
     while p1_hp > 0 and p2_hp > 0:
         if turn == 1:
-            damage = calculate_damage(p1, p2, type_chart)
+            damage = calculate_damage(p1, p2)
             p2_hp -= damage
             turn = 2
         else:
-            damage = calculate_damage(p2, p1, type_chart)
+            damage = calculate_damage(p2, p1)
             p1_hp -= damage
             turn = 1
             
     return 1 if p1_hp > 0 else 2
 
+# --- Chunked, parallel dataset generation ---
+#
+# Battles are generated in fixed-size chunks. Chunk i draws its pairs from the i-th child of
+# SeedSequence(seed), so the dataset is identical for a given seed whatever the number of
+# workers or the order chunks finish in. Each chunk is written to its own file as soon as it
+# is done (Parquet when pyarrow is installed, NPZ otherwise); rerunning with the same
+# settings skips the chunks already on disk.
+
+OUTPUT_COLUMNS = ['Name', 'Type 1', 'Type 2', 'HP', 'Attack', 'Defense', 'Speed']
+META_FILE = '_dataset.json'
+
+_worker_df = None
+_worker_engine = None
+
+
+def default_format():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return 'npz'
+    return 'parquet'
+
+
+def chunk_path(out_dir, index, fmt):
+    return os.path.join(out_dir, f'chunk-{index:05d}.{fmt}')
+
+
+def _init_worker():
+    global _worker_df, _worker_engine
+    from battle_engine import BattleEngine
+
+    _worker_df = pd.read_csv(DATA_PATH)
+    _worker_engine = BattleEngine(_worker_df)
+
+
+def simulate_chunk(num_battles, seed_sequence):
+    """Columns of one chunk of random battles, in the layout of battle_data.csv."""
+    rng = np.random.default_rng(seed_sequence)
+    n = len(_worker_df)
+    # Two different random Pokémon per battle
+    first = rng.integers(0, n, num_battles)
+    second = rng.integers(0, n - 1, num_battles)
+    second += second >= first
+    winners = _worker_engine.simulate(first, second)
+
+    # Randomly decide which Pokémon is 'pokemon_1' to avoid bias
+    swap = rng.random(num_battles) >= 0.5
+    p1_rows = np.where(swap, second, first)
+    p2_rows = np.where(swap, first, second)
+
+    columns = {}
+    for prefix, rows in (('p1_', p1_rows), ('p2_', p2_rows)):
+        for column in OUTPUT_COLUMNS:
+            columns[prefix + column] = _worker_df[column].to_numpy()[rows]
+    # Winner is 0 if pokemon_1 wins, 1 if pokemon_2 wins
+    columns['Winner'] = ((winners == 1) == swap).astype(np.int8)
+    return columns
+
+
+def write_chunk(columns, path, fmt):
+    """Writes atomically, so a chunk file on disk is always complete."""
+    tmp_path = path + '.tmp'
+    if fmt == 'parquet':
+        pd.DataFrame(columns).to_parquet(tmp_path, index=False)
+    else:
+        arrays = {
+            name: values.astype(str) if values.dtype == object else values
+            for name, values in columns.items()
+        }
+        for name in ('p1_Type 2', 'p2_Type 2'):
+            arrays[name] = np.where(pd.isna(columns[name]), '', arrays[name])
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def read_chunk(path):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    with np.load(path) as data:
+        df = pd.DataFrame({name: data[name] for name in data.files})
+    for name in ('p1_Type 2', 'p2_Type 2'):
+        df[name] = df[name].replace('', np.nan)
+    return df
+
+
+def iter_battle_chunks(path, csv_chunksize=100_000):
+    """
+    Yields the simulated battles as DataFrames, one chunk at a time, from a chunk
+    directory, a CSV, or the all-pairs outcome table (every ordered pair once).
+    """
+    if path.endswith('.npy'):
+        yield from iter_all_pairs_chunks(path)
+    elif os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.startswith('chunk-') and not name.endswith('.tmp'):
+                yield read_chunk(os.path.join(path, name))
+    else:
+        yield from pd.read_csv(path, chunksize=csv_chunksize)
+
+
+def _run_chunk(index, num_battles, seed_sequence, path, fmt):
+    write_chunk(simulate_chunk(num_battles, seed_sequence), path, fmt)
+    return index, num_battles
+
+
+def generate(out_dir, num_battles, chunk_size=100_000, seed=0, workers=None, fmt=None):
+    """Simulates `num_battles` battles into `out_dir`, resuming from the chunks already written."""
+    os.makedirs(out_dir, exist_ok=True)
+    meta_path = os.path.join(out_dir, META_FILE)
+    meta = {'num_battles': num_battles, 'chunk_size': chunk_size, 'seed': seed, 'format': fmt or default_format()}
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            existing = json.load(f)
+        if fmt is None:
+            meta['format'] = existing['format']
+        if existing != meta:
+            raise SystemExit(f"{out_dir} holds a different dataset ({existing}); use another --out or delete it.")
+    else:
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+    fmt = meta['format']
+
+    num_chunks = -(-num_battles // chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(num_chunks)
+    pending = [i for i in range(num_chunks) if not os.path.exists(chunk_path(out_dir, i, fmt))]
+    if len(pending) < num_chunks:
+        print(f"Resuming: {num_chunks - len(pending)} of {num_chunks} chunks already done.")
+
+    start = time.perf_counter()
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = [
+            pool.submit(_run_chunk, i, min(chunk_size, num_battles - i * chunk_size), seeds[i],
+                        chunk_path(out_dir, i, fmt), fmt)
+            for i in pending
+        ]
+        for future in as_completed(futures):
+            index, battles = future.result()
+            done += battles
+            elapsed = time.perf_counter() - start
+            print(f"Chunk {index + 1}/{num_chunks} written ({done:,} battles, {done / elapsed:,.0f} battles/s)")
+
+    elapsed = time.perf_counter() - start
+    if done:
+        print(f"Simulated {done:,} battles in {elapsed:.1f}s ({done / elapsed:,.0f} battles/s).")
+    return out_dir
+
+
+# --- Every ordered pair ---
+
+def _simulate_rows(start, stop):
+    n = len(_worker_df)
+    rows1 = np.repeat(np.arange(start, stop), n)
+    rows2 = np.tile(np.arange(n), stop - start)
+    return start, (_worker_engine.simulate(rows1, rows2) == 1).reshape(stop - start, n)
+
+
+def simulate_all_pairs(path=None, workers=None, block_rows=32):
+    """Simulates all n x n ordered pairs (the diagonal included) and saves the bit-packed outcome table."""
+    path = path or os.path.join(REPO_ROOT, OUTCOMES_PATH)
+    df = pd.read_csv(DATA_PATH)
+    n = len(df)
+    p1_wins = np.empty((n, n), dtype=bool)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = [pool.submit(_simulate_rows, row, min(row + block_rows, n)) for row in range(0, n, block_rows)]
+        for future in as_completed(futures):
+            row, block = future.result()
+            p1_wins[row:row + len(block)] = block
+    elapsed = time.perf_counter() - start
+
+    with open(DATA_PATH, 'rb') as f:
+        csv_sha256 = hashlib.sha256(f.read()).hexdigest()
+    fingerprints = [p.fingerprint for p in PokemonCatalog.from_csv(DATA_PATH)]
+    save_outcomes(p1_wins, df['Name'].tolist(), csv_sha256, path, os.path.splitext(path)[0] + '.json', fingerprints)
+    print(f"Simulated all {n * n:,} ordered pairs in {elapsed:.2f}s ({n * n / elapsed:,.0f} battles/s); "
+          f"wrote {path} ({os.path.getsize(path) / 1024:.0f} KB).")
+    return path
+
+
+def iter_all_pairs_chunks(path, block_rows=100):
+    """The outcome table as battles in the layout of battle_data.csv, block_rows attackers at a time."""
+    ground_truth = GroundTruth.load(path, os.path.splitext(path)[0] + '.json')
+    df = pd.read_csv(DATA_PATH)
+    if df['Name'].tolist() != ground_truth.names:
+        raise SystemExit(f"{path} was built from a different pokemon_data.csv; rebuild it with --all-pairs.")
+    columns = df[OUTPUT_COLUMNS]
+    n = len(df)
+    for start in range(0, n, block_rows):
+        stop = min(start + block_rows, n)
+        rows1 = np.repeat(np.arange(start, stop), n)
+        rows2 = np.tile(np.arange(n), stop - start)
+        chunk = pd.concat([
+            columns.iloc[rows1].add_prefix('p1_').reset_index(drop=True),
+            columns.iloc[rows2].add_prefix('p2_').reset_index(drop=True),
+        ], axis=1)
+        # Winner is 0 if pokemon_1 wins, 1 if pokemon_2 wins
+        chunk['Winner'] = (~ground_truth.p1_wins(rows1, rows2)).astype(np.int8)
+        yield chunk
+
+
 def main():
-    print("Loading Pokémon data...")
-    df = pd.read_csv('Pokemon/ML mode/pokemon_data.csv')
-    df.rename(columns={'#': 'Number'}, inplace=True)
-    
-    type_chart = get_type_effectiveness()
-    
-    num_battles = 20000  # You can increase this for a more robust dataset
-    battle_results = []
-    
-    print(f"Simulating {num_battles} battles...")
-    
-    for i in range(num_battles):
-        # Select two different random Pokémon
-        indices = random.sample(range(len(df)), 2)
-        p1 = df.iloc[indices[0]]
-        p2 = df.iloc[indices[1]]
-        
-        winner = simulate_battle(p1, p2, type_chart)
-        
-        # Randomly decide which Pokémon is 'pokemon_1' to avoid bias
-        if random.random() < 0.5:
-            pokemon_1 = p1
-            pokemon_2 = p2
-            # Winner is 0 if pokemon_1 wins, 1 if pokemon_2 wins
-            result = 0 if winner == 1 else 1
-        else:
-            pokemon_1 = p2
-            pokemon_2 = p1
-            result = 1 if winner == 1 else 0
-
-        battle_results.append({
-            'p1_Name': pokemon_1['Name'],
-            'p1_Type 1': pokemon_1['Type 1'],
-            'p1_Type 2': pokemon_1['Type 2'],
-            'p1_HP': pokemon_1['HP'],
-            'p1_Attack': pokemon_1['Attack'],
-            'p1_Defense': pokemon_1['Defense'],
-            'p1_Speed': pokemon_1['Speed'],
-            
-            'p2_Name': pokemon_2['Name'],
-            'p2_Type 1': pokemon_2['Type 1'],
-            'p2_Type 2': pokemon_2['Type 2'],
-            'p2_HP': pokemon_2['HP'],
-            'p2_Attack': pokemon_2['Attack'],
-            'p2_Defense': pokemon_2['Defense'],
-            'p2_Speed': pokemon_2['Speed'],
-            
-            'Winner': result # 0 for p1, 1 for p2
-        })
+    parser = argparse.ArgumentParser(description="Simulate random battles into chunked training data.")
+    parser.add_argument('--battles', type=int, default=20000, help="Number of battles to simulate")
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--format', choices=['parquet', 'npz'], default=None,
+                        help="Chunk file format (default: parquet if pyarrow is installed, else npz)")
+    parser.add_argument('--out', default='battle_data', help="Output directory")
+    parser.add_argument('--all-pairs', action='store_true',
+                        help=f"Simulate every ordered pair into the outcome table ({OUTCOMES_PATH})")
+    args = parser.parse_args()
 
-    results_df = pd.DataFrame(battle_results)
-    results_df.to_csv('battle_data.csv', index=False)
-    
-    print(f"Simulation complete. 'battle_data.csv' created with {len(results_df)} results.")
+    if args.all_pairs:
+        simulate_all_pairs(workers=args.workers)
+        return
+
+    print(f"Simulating {args.battles:,} battles into {args.out}/ ...")
+    generate(args.out, args.battles, args.chunk_size, args.seed, args.workers, args.format)
+    print(f"Simulation complete. Read it with iter_battle_chunks('{args.out}').")
 
 if __name__ == "__main__":
     main()
@@ -1,3 +1,12 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
@@ -5,44 +14,152 @@ from sklearn.metrics import accuracy_score
 from sklearn.preprocessing import LabelEncoder
 import joblib
 
-def train_model():
-    print("Loading battle data...")
-    df = pd.read_csv('battle_data.csv')
+from battle_simulator import iter_battle_chunks
+from app.compiled_forest import CompiledForest, latency_ms
+from app.type_chart import ENCODER_CLASSES
+
+# Define features (X) and target (y)
+features = [
+    'p1_HP', 'p1_Attack', 'p1_Defense', 'p1_Speed', 'p1_Type 1_encoded', 'p1_Type 2_encoded',
+    'p2_HP', 'p2_Attack', 'p2_Defense', 'p2_Speed', 'p2_Type 1_encoded', 'p2_Type 2_encoded'
+]
+target = 'Winner'
+
+
+def fit_type_encoder():
+    """Fits on every type plus 'None', so the codes match app.type_chart.ENCODER_CODES whatever was sampled."""
+    return LabelEncoder().fit(list(ENCODER_CLASSES))
+
+
+def load_features(path, type_encoder):
+    """
+    Reads the battles chunk by chunk, keeping only the encoded feature columns.
+
+    This bounds parsing memory, not training memory: the forest is fitted on one
+    in-memory matrix (12 int32 columns, about 50 bytes per battle), so the data
+    set still has to fit in RAM.
+    """
+    X_parts, y_parts = [], []
+    for chunk in iter_battle_chunks(path):
+        # Handle missing Type 2 data
+        chunk = chunk.fillna({'p1_Type 2': 'None', 'p2_Type 2': 'None'})
+        for column in ('p1_Type 1', 'p1_Type 2', 'p2_Type 1', 'p2_Type 2'):
+            chunk[column + '_encoded'] = type_encoder.transform(chunk[column])
+        X_parts.append(chunk[features].to_numpy(dtype=np.int32))
+        y_parts.append(chunk[target].to_numpy(dtype=np.int8))
+    return pd.DataFrame(np.vstack(X_parts), columns=features), pd.Series(np.concatenate(y_parts), name=target)
+
+
+# --- Hyperparameter sweep ---
+#
+# Every (n_estimators, max_depth) candidate is fitted in its own process and scored on
+# accuracy. Serving cost -- single-row predict_proba latency (p50/p99), pickled size and
+# load time -- is measured afterwards, one candidate at a time in this process, so the
+# latency budget is not judged while other candidates are fitting on every core. The
+# most accurate candidate within the budget is the one we ship.
+
+_sweep_data = None
+
+
+def _init_sweep(X_train, y_train, X_test, y_test):
+    global _sweep_data
+    _sweep_data = (X_train, y_train, X_test, y_test)
+
+
+def candidate_path(directory, n_estimators, max_depth):
+    return os.path.join(directory, f'model_{n_estimators}_{max_depth}.pkl')
+
+
+def evaluate_candidate(n_estimators, max_depth, directory):
+    """Fits one candidate, saves it to `directory` and returns its accuracy and fit time."""
+    X_train, y_train, X_test, y_test = _sweep_data
+    start = time.perf_counter()
+    # n_jobs=1: candidates already run in parallel
+    model = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=42, n_jobs=1)
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    accuracy = accuracy_score(y_test, model.predict(X_test))
+    joblib.dump(model, candidate_path(directory, n_estimators, max_depth))
+    return {'n_estimators': n_estimators, 'max_depth': max_depth, 'accuracy': accuracy, 'fit_seconds': fit_seconds}
+
+
+def measure_serving(result, rows, serving, directory, repeats=300):
+    """Adds the saved candidate's size, load time and latency to `result`; run with nothing else busy."""
+    path = candidate_path(directory, result['n_estimators'], result['max_depth'])
+    start = time.perf_counter()
+    model = joblib.load(path)
+    load_seconds = time.perf_counter() - start
+    # Latency of the form the server will run: the compiled flat arrays or the sklearn object
+    predictor = CompiledForest.from_sklearn(model) if serving == 'compiled' else model
+    result.update(latency_ms(predictor.predict_proba, rows, repeats),
+                  model_bytes=os.path.getsize(path), load_seconds=load_seconds)
+    return result
+
+
+def sweep(X_train, y_train, X_test, y_test, trees, depths, directory, serving='compiled', workers=None):
+    candidates = [(n, d) for n in trees for d in depths]
+    print(f"Training {len(candidates)} candidates...")
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep,
+                             initargs=(X_train, y_train, X_test, y_test)) as pool:
+        futures = [pool.submit(evaluate_candidate, n, d, directory) for n, d in candidates]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"  trees={result['n_estimators']:<4} depth={str(result['max_depth']):<5} "
+                  f"acc={result['accuracy'] * 100:.2f}%  fit={result['fit_seconds']:.1f}s")
+
+    print(f"Measuring {serving} serving latency, one candidate at a time...")
+    rows = X_test.to_numpy(dtype=np.float64)[:1000]
+    results.sort(key=lambda r: (r['n_estimators'], r['max_depth'] or 0))
+    for result in results:
+        measure_serving(result, rows, serving, directory)
+        print(f"  trees={result['n_estimators']:<4} depth={str(result['max_depth']):<5} "
+              f"p50={result['p50_ms']:.3f}ms  p99={result['p99_ms']:.3f}ms  "
+              f"size={result['model_bytes'] / 2**20:.1f}MB  load={result['load_seconds'] * 1000:.0f}ms")
+    return results
+
+
+def select(results, latency_budget_ms):
+    """Most accurate candidate whose p99 fits the budget (smaller model on ties); the fastest if none fits."""
+    within = [r for r in results if r['p99_ms'] <= latency_budget_ms]
+    if not within:
+        print(f"Warning: no candidate meets the {latency_budget_ms}ms p99 budget; choosing the fastest.")
+        return min(results, key=lambda r: r['p99_ms'])
+    return max(within, key=lambda r: (r['accuracy'], -r['model_bytes']))
+
+
+def _depth(value):
+    return None if value.lower() == 'none' else int(value)
+
+
+def train_model(path=None, trees=(50, 100, 200), depths=(8, 12, 16, None), latency_budget_ms=1.0,
+                serving='compiled', workers=None, report_path='training_report.json'):
+    # Chunked output of battle_simulator.py, or a battle_data.csv from older runs
+    path = path or ('battle_data' if os.path.isdir('battle_data') else 'battle_data.csv')
+    print(f"Loading battle data from {path}...")
 
     # --- Feature Engineering & Preprocessing ---
     print("Preprocessing data...")
-    
-    # Handle missing Type 2 data
-    df['p1_Type 2'].fillna('None', inplace=True)
-    df['p2_Type 2'].fillna('None', inplace=True)
 
     # Encode categorical features (Pokémon types)
     # We create one encoder and fit it on all possible types to ensure consistency
-    all_types = pd.concat([df['p1_Type 1'], df['p1_Type 2'], df['p2_Type 1'], df['p2_Type 2']]).unique()
-    type_encoder = LabelEncoder().fit(all_types)
-    
-    df['p1_Type 1_encoded'] = type_encoder.transform(df['p1_Type 1'])
-    df['p1_Type 2_encoded'] = type_encoder.transform(df['p1_Type 2'])
-    df['p2_Type 1_encoded'] = type_encoder.transform(df['p2_Type 1'])
-    df['p2_Type 2_encoded'] = type_encoder.transform(df['p2_Type 2'])
-    
-    # Define features (X) and target (y)
-    features = [
-        'p1_HP', 'p1_Attack', 'p1_Defense', 'p1_Speed', 'p1_Type 1_encoded', 'p1_Type 2_encoded',
-        'p2_HP', 'p2_Attack', 'p2_Defense', 'p2_Speed', 'p2_Type 1_encoded', 'p2_Type 2_encoded'
-    ]
-    target = 'Winner'
-
-    X = df[features]
-    y = df[target]
+    type_encoder = fit_type_encoder()
+    X, y = load_features(path, type_encoder)
     
     # --- Model Training ---
-    print("Splitting data and training model...")
+    print("Splitting data and training models...")
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
-    # We'll use a RandomForestClassifier, which is great for this kind of task
-    model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
-    model.fit(X_train, y_train)
+    # We'll use a RandomForestClassifier, sized by the sweep
+    with tempfile.TemporaryDirectory() as tmp:
+        results = sweep(X_train, y_train, X_test, y_test, trees, depths, tmp, serving, workers)
+        best = select(results, latency_budget_ms)
+        print(f"Selected trees={best['n_estimators']} depth={best['max_depth']}: "
+              f"accuracy {best['accuracy'] * 100:.2f}%, p99 {best['p99_ms']:.3f}ms (budget {latency_budget_ms}ms)")
+        # The sweep already fitted the chosen configuration on this split
+        shutil.copyfile(candidate_path(tmp, best['n_estimators'], best['max_depth']), 'battle_predictor.pkl')
+    model = joblib.load('battle_predictor.pkl')
     
     # --- Evaluation ---
     print("Evaluating model...")
@@ -52,10 +169,29 @@ def train_model():
     
     # --- Saving the Model and Encoder ---
     print("Saving model and type encoder...")
-    joblib.dump(model, 'battle_predictor.pkl')
     joblib.dump(type_encoder, 'type_encoder.pkl')
+    with open(report_path, 'w') as f:
+        json.dump({
+            'data': path,
+            'rows': len(X),
+            'features': features,
+            'serving': serving,
+            'latency_budget_ms': latency_budget_ms,
+            'selected': best,
+            'candidates': results,
+        }, f, indent=2)
     
-    print("Training complete. 'battle_predictor.pkl' and 'type_encoder.pkl' have been saved.")
+    print(f"Training complete. 'battle_predictor.pkl' and 'type_encoder.pkl' have been saved; sweep results in '{report_path}'.")
 
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train the battle predictor with a latency-aware hyperparameter sweep.")
+    # e.g. ../app/ml_models/battle_outcomes.npy to train on every pair
+    parser.add_argument('data', nargs='?', help="battle_data/ chunks, a CSV, or the all-pairs outcome table")
+    parser.add_argument('--trees', type=int, nargs='+', default=[50, 100, 200])
+    parser.add_argument('--depths', type=_depth, nargs='+', default=[8, 12, 16, None], help="'none' for unlimited")
+    parser.add_argument('--latency-budget-ms', type=float, default=1.0, help="Max single-row p99 for the chosen model")
+    parser.add_argument('--serving', choices=['compiled', 'pickle'], default='compiled',
+                        help="Model form whose latency is measured (the server prefers the compiled form)")
+    parser.add_argument('--workers', type=int, default=None, help="Parallel candidates (default: all cores)")
+    args = parser.parse_args()
+    train_model(args.data, args.trees, args.depths, args.latency_budget_ms, args.serving, args.workers)
@@ -0,0 +1,116 @@
+"""
+In-process cache of verified bearer tokens.
+
+Every authenticated route used to decode the JWT and then look the user up by
+username. `oauth2.get_current_identity` now resolves a token once and keeps
+the resulting UserIdentity here until the token expires or AUTH_CACHE_TTL_SECONDS
+pass, whichever comes first. Tokens issued by /login also carry the user id
+(`uid` claim), so even a cache miss needs no query for them.
+
+Any ORM update or delete of a User_model drops that user's cached tokens and
+makes this worker re-check their older `uid` tokens against the database.
+Other workers drop cached entries within the TTL; like any stateless JWT, a
+`uid` token they have not seen before is honoured until it expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+
+from . import models
+from .config import settings
+
+
+@dataclass(frozen=True)
+class UserIdentity:
+    """Who a token belongs to; enough for every route that only needs the caller's id."""
+    id: int
+    username: str
+
+
+class AuthCache:
+    """A bounded LRU of token -> (UserIdentity, expiry), with hit/miss counters."""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[UserIdentity, float]]" = OrderedDict()
+        # When each user last changed; `uid` claims issued before that are not trusted
+        self._changed_at: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.claim_resolutions = 0
+        self.db_lookups = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, token: str) -> Optional[UserIdentity]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[token]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, identity: UserIdentity, token_expires_at: Optional[float] = None) -> None:
+        """Caches `identity` for the TTL, or until `token_expires_at` (a Unix timestamp) if sooner."""
+        ttl = self.ttl_seconds
+        if token_expires_at is not None:
+            ttl = min(ttl, token_expires_at - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (identity, time.monotonic() + ttl)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def claim_trusted(self, user_id: int, issued_at: Optional[float]) -> bool:
+        """Whether a `uid` claim issued at `issued_at` predates no change to that user."""
+        changed_at = self._changed_at.get(user_id)
+        return changed_at is None or (issued_at is not None and issued_at > changed_at)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self._changed_at[user_id] = time.time()
+            for token in [t for t, (identity, _) in self._entries.items() if identity.id == user_id]:
+                del self._entries[token]
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "claim_resolutions": self.claim_resolutions,
+            "db_lookups": self.db_lookups,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+auth_cache = AuthCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL_SECONDS)
+
+
+@event.listens_for(models.User_model, "after_update")
+@event.listens_for(models.User_model, "after_delete")
+def _user_changed(mapper, connection, target) -> None:
+    auth_cache.invalidate_user(target.id)
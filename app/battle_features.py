@@ -0,0 +1,115 @@
+"""
+Feature encoding for the battle predictor.
+
+Each species' model inputs are computed once into a NumPy table, so encoding a
+batch of matchups is a row gather instead of building DataFrames and calling
+`type_encoder.transform` per request. Used by the prediction router and by the
+offline win-matrix build, so both see exactly the same features.
+
+The column layout comes from the model's feature names (see the registry in
+app/ml_models), which may mix these forms:
+
+    p1_<stat> / p2_<stat>                  raw stat of either side
+    p1_Type 1_encoded ... p2_Type 2_encoded  type codes from the LabelEncoder
+    <stat>_diff                            p1 stat minus p2 stat
+    Type_Advantage                         see app.type_chart.type_advantage
+"""
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from .catalog import CatalogPokemon
+from .type_chart import combo_index, dual_multipliers, type_advantages, type_index
+
+# The features of the original 12-column model, in column order
+RAW_FEATURES = [
+    'p1_HP', 'p1_Attack', 'p1_Defense', 'p1_Speed', 'p1_Type 1_encoded', 'p1_Type 2_encoded',
+    'p2_HP', 'p2_Attack', 'p2_Defense', 'p2_Speed', 'p2_Type 1_encoded', 'p2_Type 2_encoded'
+]
+
+# Columns of the per-species table
+STAT_COLUMNS = {'HP': 0, 'Attack': 1, 'Defense': 2, 'Sp. Atk': 3, 'Sp. Def': 4, 'Speed': 5}
+TYPE1_CODE, TYPE2_CODE, TYPE1_CHART, TYPE2_CHART, COMBO = 6, 7, 8, 9, 10
+
+
+def type_codes(type_encoder) -> Dict[str, int]:
+    """Precomputed equivalent of type_encoder.transform for a single label."""
+    return {label: code for code, label in enumerate(type_encoder.classes_)}
+
+
+def _parse_feature(name: str) -> Tuple[str, int]:
+    """Maps a feature name to (side, table column); side is 'p1', 'p2', 'diff' or 'advantage'."""
+    if name == 'Type_Advantage':
+        return 'advantage', -1
+    if name.endswith('_diff') and name[:-len('_diff')] in STAT_COLUMNS:
+        return 'diff', STAT_COLUMNS[name[:-len('_diff')]]
+    side, _, rest = name.partition('_')
+    if side in ('p1', 'p2'):
+        if rest in STAT_COLUMNS:
+            return side, STAT_COLUMNS[rest]
+        if rest == 'Type 1_encoded':
+            return side, TYPE1_CODE
+        if rest == 'Type 2_encoded':
+            return side, TYPE2_CODE
+    raise ValueError(f"Unsupported model feature: {name!r}")
+
+
+class SpeciesFeatures:
+    """Stats, encoded types and type-chart indices of every species, one row each."""
+
+    def __init__(self, entries: Iterable[CatalogPokemon], codes: Dict[str, int],
+                 features: Sequence[str] = RAW_FEATURES):
+        self.entries: Tuple[CatalogPokemon, ...] = tuple(entries)
+        self.row_of = {p.id: row for row, p in enumerate(self.entries)}
+        self.features: List[str] = list(features)
+        self._columns = [_parse_feature(name) for name in self.features]
+        self._uses_codes = any(column in (TYPE1_CODE, TYPE2_CODE) for _, column in self._columns)
+        self.table = np.array(
+            [
+                [
+                    p.HP, p.Attack, p.Defense, p.Sp_Atk, p.Sp_Def, p.Speed,
+                    codes.get(p.type1, -1), codes.get(p.type2 or 'None', -1),
+                    type_index(p.type1), type_index(p.type2), combo_index(p.type1, p.type2),
+                ]
+                for p in self.entries
+            ],
+            dtype=np.float64,
+        ).reshape(len(self.entries), 11)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def encode(self, rows1: np.ndarray, rows2: np.ndarray) -> np.ndarray:
+        a, b = self.table[rows1], self.table[rows2]
+        if self._uses_codes and ((a[:, TYPE1_CODE:TYPE2_CODE + 1] < 0).any() or (b[:, TYPE1_CODE:TYPE2_CODE + 1] < 0).any()):
+            raise ValueError("Pokémon type not known to the type encoder.")
+
+        X = np.empty((len(a), len(self._columns)), dtype=np.float64)
+        for i, (side, column) in enumerate(self._columns):
+            if side == 'p1':
+                X[:, i] = a[:, column]
+            elif side == 'p2':
+                X[:, i] = b[:, column]
+            elif side == 'diff':
+                X[:, i] = a[:, column] - b[:, column]
+            else:
+                X[:, i] = self.type_advantage(a, b)
+        return X
+
+    @staticmethod
+    def type_advantage(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        attack1, attack2 = a[:, TYPE1_CHART].astype(np.intp), a[:, TYPE2_CHART].astype(np.intp)
+        return type_advantages(attack1, attack2, b[:, COMBO].astype(np.intp)).astype(np.float64)
+
+    def type_multipliers(self, rows1: np.ndarray, rows2: np.ndarray) -> np.ndarray:
+        """Multiplier of each rows1 species' primary type against the rows2 species, as the simulator applies it."""
+        return dual_multipliers(self.table[rows1, TYPE1_CHART].astype(np.intp), self.table[rows2, COMBO].astype(np.intp))
+
+    def all_pairs(self, block_rows: int = 64) -> Iterator[Tuple[slice, np.ndarray]]:
+        """Yields (p1 row slice, features) blocks covering every ordered pair, p2 varying fastest."""
+        n = len(self.entries)
+        for start in range(0, n, block_rows):
+            stop = min(start + block_rows, n)
+            rows1 = np.repeat(np.arange(start, stop), n)
+            rows2 = np.tile(np.arange(n), stop - start)
+            yield slice(start, stop), self.encode(rows1, rows2)
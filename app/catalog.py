@@ -0,0 +1,245 @@
+"""
+In-memory snapshot of the Pokédex reference data.
+
+The `pokemon_model` table is static (it is seeded once by load_data.py), so
+every worker loads it a single time at startup and serves all Pokédex reads,
+encounter lookups, team validation and battle predictions from this snapshot
+instead of checking out a pooled connection per request.
+
+`load_data.py --sync` bumps the `catalog_version` row whenever it changes the
+table; each worker polls that row (`start_watching()`) and reloads its
+snapshot, which in turn refreshes everything registered with `on_reload`.
+"""
+import csv
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    from sqlalchemy.orm import Session
+    from . import models
+
+
+# Columns that define a species; a change in any of them is a change to the Pokédex data
+SPECIES_FIELDS = ("pokedex_id", "name", "type1", "type2", "HP", "Attack", "Defense",
+                  "Sp_Atk", "Sp_Def", "Speed", "Generation", "Legendary")
+
+
+def species_fingerprint(species: Union[Mapping[str, Any], "CatalogPokemon"]) -> str:
+    """Short stable hash of a species' SPECIES_FIELDS, from a column mapping or a CatalogPokemon."""
+    get = species.get if isinstance(species, Mapping) else lambda name: getattr(species, name)
+    text = "\x1f".join("" if get(name) is None else str(get(name)) for name in SPECIES_FIELDS)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class CatalogPokemon:
+    id: int
+    pokedex_id: int
+    name: str
+    type1: str
+    type2: Optional[str]
+    HP: int
+    Attack: int
+    Defense: int
+    Sp_Atk: int
+    Sp_Def: int
+    Speed: int
+    Generation: int
+    Legendary: bool
+
+    @classmethod
+    def from_orm(cls, row: "models.Pokemon_model") -> "CatalogPokemon":
+        return cls(
+            id=row.id,
+            pokedex_id=row.pokedex_id,
+            name=row.name,
+            type1=row.type1,
+            type2=row.type2,
+            HP=row.HP,
+            Attack=row.Attack,
+            Defense=row.Defense,
+            Sp_Atk=row.Sp_Atk,
+            Sp_Def=row.Sp_Def,
+            Speed=row.Speed,
+            Generation=row.Generation,
+            Legendary=row.Legendary,
+        )
+
+    @property
+    def fingerprint(self) -> str:
+        return species_fingerprint(self)
+
+
+class PokemonCatalog:
+    """An immutable, indexed view of every row in `pokemon_model`."""
+
+    def __init__(self, entries: Iterable[CatalogPokemon], version: int = 0):
+        self.version = version
+        self.entries: Tuple[CatalogPokemon, ...] = tuple(sorted(entries, key=lambda p: p.id))
+        self._by_id: Dict[int, CatalogPokemon] = {p.id: p for p in self.entries}
+        self._by_name: Dict[str, CatalogPokemon] = {p.name: p for p in self.entries}
+        by_pokedex_id: Dict[int, List[CatalogPokemon]] = {}
+        for p in self.entries:
+            by_pokedex_id.setdefault(p.pokedex_id, []).append(p)
+        self._by_pokedex_id = {k: tuple(v) for k, v in by_pokedex_id.items()}
+
+    @classmethod
+    def from_db(cls, db: "Session", version: int = 0) -> "PokemonCatalog":
+        from . import models
+
+        rows = db.query(models.Pokemon_model).all()
+        return cls((CatalogPokemon.from_orm(row) for row in rows), version=version)
+
+    @classmethod
+    def from_csv(cls, path: str = "pokemon_data.csv") -> "PokemonCatalog":
+        """Reads the source CSV directly, numbering rows the way load_data.py inserts them."""
+        with open(path, newline="", encoding="utf-8") as f:
+            entries = [
+                CatalogPokemon(
+                    id=row_number,
+                    pokedex_id=int(row["#"]),
+                    name=row["Name"],
+                    type1=row["Type 1"],
+                    type2=row["Type 2"] or None,
+                    HP=int(row["HP"]),
+                    Attack=int(row["Attack"]),
+                    Defense=int(row["Defense"]),
+                    Sp_Atk=int(row["Sp. Atk"]),
+                    Sp_Def=int(row["Sp. Def"]),
+                    Speed=int(row["Speed"]),
+                    Generation=int(row["Generation"]),
+                    Legendary=row["Legendary"].strip().upper() == "TRUE",
+                )
+                for row_number, row in enumerate(csv.DictReader(f), start=1)
+            ]
+        return cls(entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[CatalogPokemon]:
+        return iter(self.entries)
+
+    def __contains__(self, pokemon_id: int) -> bool:
+        return pokemon_id in self._by_id
+
+    def get(self, pokemon_id: int) -> Optional[CatalogPokemon]:
+        return self._by_id.get(pokemon_id)
+
+    def by_name(self, name: str) -> Optional[CatalogPokemon]:
+        return self._by_name.get(name)
+
+    def by_pokedex_id(self, pokedex_id: int) -> Tuple[CatalogPokemon, ...]:
+        """All forms (base and Mega) sharing a National Pokédex number."""
+        return self._by_pokedex_id.get(pokedex_id, ())
+
+    def many(self, pokemon_ids: Iterable[int]) -> List[CatalogPokemon]:
+        """Looks up several ids at once; raises KeyError naming the first unknown id."""
+        found = []
+        for pid in pokemon_ids:
+            pokemon = self._by_id.get(pid)
+            if pokemon is None:
+                raise KeyError(pid)
+            found.append(pokemon)
+        return found
+
+
+# --- Process-wide snapshot ---
+
+_catalog: Optional[PokemonCatalog] = None
+_lock = threading.Lock()
+_reload_listeners: List[Callable[[PokemonCatalog], None]] = []
+# catalog_version row the current snapshot was read at
+_db_version: Optional[int] = None
+_watcher: Optional[threading.Thread] = None
+_stop_watching = threading.Event()
+
+
+def on_reload(callback: Callable[[PokemonCatalog], None]) -> Callable[[PokemonCatalog], None]:
+    """Registers a callback run with the new snapshot every time the catalog is (re)loaded."""
+    _reload_listeners.append(callback)
+    return callback
+
+
+def read_db_version(db: "Session") -> int:
+    """The `catalog_version` counter, 0 before the first sync."""
+    from . import models
+
+    row = db.get(models.CatalogVersion, 1)
+    return row.version if row is not None else 0
+
+
+def load_catalog(db: Optional["Session"] = None) -> PokemonCatalog:
+    """Builds a fresh snapshot from the database and swaps it in atomically."""
+    global _catalog, _db_version
+    with _lock:
+        version = _catalog.version + 1 if _catalog is not None else 1
+        if db is not None:
+            db_version = read_db_version(db)
+            new_catalog = PokemonCatalog.from_db(db, version=version)
+        else:
+            from .database import SessionLocal
+
+            session = SessionLocal()
+            try:
+                db_version = read_db_version(session)
+                new_catalog = PokemonCatalog.from_db(session, version=version)
+            finally:
+                session.close()
+        _catalog = new_catalog
+        _db_version = db_version
+
+    for callback in _reload_listeners:
+        callback(new_catalog)
+    return new_catalog
+
+
+# Explicit name for callers that refresh an already-loaded catalog.
+reload_catalog = load_catalog
+
+
+def check_for_update() -> bool:
+    """Reloads the snapshot if `catalog_version` moved since it was read; returns True if it did."""
+    from .database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        changed = read_db_version(session) != _db_version
+    finally:
+        session.close()
+    if changed:
+        new_catalog = load_catalog()
+        print(f"Pokédex catalog reloaded at catalog_version {_db_version} ({len(new_catalog)} species).")
+    return changed
+
+
+def _watch(interval: float) -> None:
+    while not _stop_watching.wait(interval):
+        try:
+            check_for_update()
+        except Exception as e:  # a failed poll (e.g. the database restarting) must not end the watcher
+            print(f"Catalog watcher error: {e}")
+
+
+def start_watching(interval: float) -> None:
+    """Polls `catalog_version` every `interval` seconds on a daemon thread; call once per worker."""
+    global _watcher
+    if interval <= 0 or (_watcher is not None and _watcher.is_alive()):
+        return
+    _stop_watching.clear()
+    _watcher = threading.Thread(target=_watch, args=(interval,), name="catalog-watcher", daemon=True)
+    _watcher.start()
+
+
+def stop_watching() -> None:
+    _stop_watching.set()
+
+
+def get_catalog() -> PokemonCatalog:
+    """FastAPI dependency returning the current snapshot, loading it on first use."""
+    catalog = _catalog
+    if catalog is None:
+        catalog = load_catalog()
+    return catalog
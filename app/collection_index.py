@@ -0,0 +1,80 @@
+"""
+Per-user bitmap of owned species, kept next to `user_collection`.
+
+Bit i of a user's bitmap is set when they own the Pokémon with id i. It is
+stored as little-endian bytes in `user_collection_bitmap` (about 100 bytes for
+the whole Pokédex) and updated in the same transaction as every insert into
+`user_collection`, so a safari encounter reads one short row instead of
+loading the user's whole collection. A missing row is rebuilt from
+`user_collection` on first use, which is also how rows dropped by
+load_data.py's maintenance are restored.
+"""
+from typing import Iterable, List
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import dialect_insert
+
+
+def mask_of(pokemon_ids: Iterable[int]) -> int:
+    mask = 0
+    for pid in pokemon_ids:
+        mask |= 1 << pid
+    return mask
+
+
+def ids_of(mask: int) -> List[int]:
+    ids = []
+    while mask:
+        low = mask & -mask
+        ids.append(low.bit_length() - 1)
+        mask ^= low
+    return ids
+
+
+def _to_bytes(mask: int) -> bytes:
+    return mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+
+
+def owned_mask(db: Session, user_id: int, for_update: bool = False) -> int:
+    """The user's owned-species bitmap, rebuilding its row from `user_collection` if needed."""
+    query = select(models.CollectionBitmap).where(models.CollectionBitmap.user_id == user_id)
+    if for_update:
+        query = query.with_for_update()
+    row = db.scalars(query).first()
+    if row is not None:
+        return int.from_bytes(row.bits, "little")
+
+    link = models.user_collection_association
+    mask = mask_of(db.scalars(select(link.c.pokemon_id).where(link.c.user_id == user_id)))
+    # Concurrent first requests for the same user may both rebuild; the primary key keeps one row
+    db.execute(
+        dialect_insert(models.CollectionBitmap.__table__)
+        .values(user_id=user_id, bits=_to_bytes(mask))
+        .on_conflict_do_nothing()
+    )
+    row = db.scalars(query.execution_options(populate_existing=True)).first()
+    return int.from_bytes(row.bits, "little")
+
+
+def add_to_collection(db: Session, user_id: int, pokemon_id: int) -> bool:
+    """Records a catch in `user_collection` and the bitmap; False if it was already owned. Caller commits."""
+    # The primary key settles two concurrent catches of the same species
+    inserted = db.execute(
+        dialect_insert(models.user_collection_association)
+        .values(user_id=user_id, pokemon_id=pokemon_id)
+        .on_conflict_do_nothing()
+    ).rowcount
+    if not inserted:
+        return False
+    mask = owned_mask(db, user_id, for_update=True)
+    if not mask >> pokemon_id & 1:  # a row rebuilt just now already includes the catch
+        db.execute(
+            models.CollectionBitmap.__table__.update()
+            .where(models.CollectionBitmap.user_id == user_id)
+            .values(bits=_to_bytes(mask | 1 << pokemon_id))
+        )
+    return True
+
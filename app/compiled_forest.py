@@ -0,0 +1,346 @@
+"""
+Flat-array compilation of tree ensembles for low-latency inference.
+
+A fitted scikit-learn forest (or an XGBoost binary classifier) is converted
+into contiguous NumPy arrays -- feature, threshold, left, right and leaf
+value per node -- with every tree laid end to end. The evaluator walks all
+trees for a whole batch at once, one vectorized step per tree level, so a
+prediction is a handful of array gathers instead of a call into hundreds of
+Python tree objects. Compiled models are saved as plain .npy files that can
+be memory-mapped, and loading them needs neither sklearn nor xgboost.
+
+    python -m app.compiled_forest app/ml_models/battle_predictor3.pkl --verify --benchmark
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+NODE_DTYPE = np.dtype([
+    ("feature", np.int32),
+    ("threshold", np.float64),
+    ("left", np.int32),
+    ("right", np.int32),
+    ("default_left", np.bool_),
+])
+
+
+class CompiledForest:
+    """Drop-in replacement for `predict_proba` on a fitted tree ensemble.
+
+    kind == "forest": leaf values are class probabilities, averaged over trees,
+    and a sample goes left when x <= threshold (scikit-learn semantics).
+    kind == "boosted": leaf values are margins, summed with `base_margin` and
+    passed through a sigmoid, and a sample goes left when x < threshold
+    (XGBoost semantics).
+    """
+
+    def __init__(self, kind: str, nodes: np.ndarray, values: np.ndarray, roots: np.ndarray, max_depth: int,
+                 classes: Sequence, n_features: int, base_margin: float = 0.0,
+                 feature_names: Optional[List[str]] = None, metadata: Optional[Dict] = None):
+        self.kind = kind
+        self.nodes = nodes
+        self.values = values
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = n_features
+        self.base_margin = base_margin
+        self.feature_names = feature_names
+        self.metadata = metadata or {}
+        # Field views are taken once; on a memory-mapped file they stay lazy.
+        self._feature = nodes["feature"]
+        self._threshold = nodes["threshold"]
+        self._left = nodes["left"]
+        self._right = nodes["right"]
+        self._default_left = nodes["default_left"]
+
+    # --- Conversion ---
+
+    @classmethod
+    def from_sklearn(cls, model) -> "CompiledForest":
+        estimators = model.estimators_
+        node_blocks, value_blocks, roots = [], [], []
+        offset = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            n = tree.node_count
+            nodes = np.zeros(n, dtype=NODE_DTYPE)
+            is_leaf = tree.children_left == -1
+            own = np.arange(offset, offset + n, dtype=np.int32)
+            nodes["feature"] = np.where(is_leaf, 0, tree.feature)
+            nodes["threshold"] = np.where(is_leaf, np.inf, tree.threshold)
+            nodes["left"] = np.where(is_leaf, own, tree.children_left + offset)
+            nodes["right"] = np.where(is_leaf, own, tree.children_right + offset)
+            # Same normalization DecisionTreeClassifier.predict_proba applies to each leaf.
+            value = tree.value[:, 0, :].astype(np.float64)
+            totals = value.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+            node_blocks.append(nodes)
+            value_blocks.append(value / totals)
+            roots.append(offset)
+            offset += n
+        return cls(
+            "forest",
+            np.concatenate(node_blocks),
+            np.concatenate(value_blocks),
+            np.asarray(roots, dtype=np.int32),
+            max(e.tree_.max_depth for e in estimators),
+            model.classes_,
+            model.n_features_in_,
+            feature_names=list(getattr(model, "feature_names_in_", [])) or None,
+        )
+
+    @classmethod
+    def from_xgboost(cls, model) -> "CompiledForest":
+        booster = model.get_booster()
+        learner = json.loads(booster.save_raw("json"))["learner"]
+        if learner["objective"]["name"] != "binary:logistic":
+            raise ValueError(f"Unsupported XGBoost objective {learner['objective']['name']!r}.")
+        base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+
+        node_blocks, value_blocks, roots = [], [], []
+        offset = 0
+        max_depth = 0
+        for tree in learner["gradient_booster"]["model"]["trees"]:
+            left = np.asarray(tree["left_children"], dtype=np.int64)
+            right = np.asarray(tree["right_children"], dtype=np.int64)
+            conditions = np.asarray(tree["split_conditions"], dtype=np.float32).astype(np.float64)
+            n = len(left)
+            is_leaf = left == -1
+            own = np.arange(offset, offset + n, dtype=np.int32)
+            nodes = np.zeros(n, dtype=NODE_DTYPE)
+            nodes["feature"] = np.where(is_leaf, 0, tree["split_indices"])
+            nodes["threshold"] = np.where(is_leaf, np.inf, conditions)
+            nodes["left"] = np.where(is_leaf, own, left + offset)
+            nodes["right"] = np.where(is_leaf, own, right + offset)
+            nodes["default_left"] = np.asarray(tree["default_left"], dtype=bool)
+            # Leaf weights live in split_conditions.
+            node_blocks.append(nodes)
+            value_blocks.append(np.where(is_leaf, conditions, 0.0).reshape(n, 1))
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, _depth(left, right))
+        return cls(
+            "boosted",
+            np.concatenate(node_blocks),
+            np.concatenate(value_blocks),
+            np.asarray(roots, dtype=np.int32),
+            max_depth,
+            getattr(model, "classes_", [0, 1]),
+            int(learner["learner_model_param"]["num_feature"]),
+            base_margin=float(np.log(base_score / (1 - base_score))),
+            feature_names=learner.get("feature_names") or None,
+        )
+
+    @classmethod
+    def from_model(cls, model) -> "CompiledForest":
+        if hasattr(model, "get_booster"):
+            return cls.from_xgboost(model)
+        if hasattr(model, "estimators_"):
+            return cls.from_sklearn(model)
+        raise TypeError(f"Don't know how to compile a {type(model).__name__}.")
+
+    # --- Inference ---
+
+    def leaves(self, X: np.ndarray) -> np.ndarray:
+        """Index of the leaf each sample reaches in every tree, shape (n_samples, n_trees)."""
+        # Both libraries compare single-precision features against the stored thresholds.
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        sample = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], len(self.roots))).copy()
+        strict = self.kind == "boosted"
+        for _ in range(self.max_depth):
+            x = X[sample, self._feature[node]]
+            threshold = self._threshold[node]
+            go_left = (x < threshold) if strict else (x <= threshold)
+            missing = np.isnan(x)
+            if missing.any():
+                go_left = np.where(missing, self._default_left[node], go_left)
+            node = np.where(go_left, self._left[node], self._right[node])
+        return node
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        leaf_values = self.values[self.leaves(X)]  # (n_samples, n_trees, n_values)
+        if self.kind == "forest":
+            return leaf_values.mean(axis=1)
+        margin = leaf_values[:, :, 0].sum(axis=1) + self.base_margin
+        p1 = 1.0 / (1.0 + np.exp(-margin))
+        return np.column_stack([1.0 - p1, p1])
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    # --- Persistence ---
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "nodes.npy"), self.nodes)
+        np.save(os.path.join(path, "values.npy"), self.values)
+        np.save(os.path.join(path, "roots.npy"), self.roots)
+        meta = {
+            "kind": self.kind,
+            "max_depth": self.max_depth,
+            "classes": self.classes_.tolist(),
+            "n_features": self.n_features_in_,
+            "base_margin": self.base_margin,
+            "feature_names": self.feature_names,
+            "metadata": self.metadata,
+        }
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "CompiledForest":
+        mode = "r" if mmap else None
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(
+            meta["kind"],
+            np.load(os.path.join(path, "nodes.npy"), mmap_mode=mode),
+            np.load(os.path.join(path, "values.npy"), mmap_mode=mode),
+            np.load(os.path.join(path, "roots.npy")),
+            meta["max_depth"],
+            meta["classes"],
+            meta["n_features"],
+            base_margin=meta["base_margin"],
+            feature_names=meta["feature_names"],
+            metadata=meta.get("metadata", {}),
+        )
+
+
+def _depth(left: np.ndarray, right: np.ndarray) -> int:
+    depth = np.zeros(len(left), dtype=np.int64)
+    for node in range(len(left)):  # children always have larger ids than their parent
+        if left[node] != -1:
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+
+# --- Verification and benchmarking ---
+
+def sample_inputs(compiled: CompiledForest, n: int, seed: int = 0) -> np.ndarray:
+    """Inputs that exercise every split: thresholds themselves, their neighbours, and random values."""
+    rng = np.random.default_rng(seed)
+    split = compiled._threshold != np.inf
+    X = np.empty((n, compiled.n_features_in_))
+    for f in range(compiled.n_features_in_):
+        thresholds = compiled._threshold[split & (compiled._feature == f)]
+        if len(thresholds) == 0:
+            X[:, f] = rng.normal(size=n)
+            continue
+        low, high = thresholds.min() - 1, thresholds.max() + 1
+        picks = rng.choice(thresholds, n) + rng.choice([-1.0, -1e-3, 0.0, 1e-3, 1.0], n)
+        X[:, f] = np.where(rng.random(n) < 0.5, picks, rng.uniform(low, high, n))
+    return X
+
+
+def verify(model, compiled: CompiledForest, n: int = 20000) -> float:
+    """Largest absolute probability difference against the original model."""
+    X = sample_inputs(compiled, n)
+    return float(np.abs(model.predict_proba(X) - compiled.predict_proba(X)).max())
+
+
+def latency_ms(predict, X: np.ndarray, repeats: int) -> Dict[str, float]:
+    timings = []
+    for i in range(repeats):
+        row = X[i % len(X): i % len(X) + 1]
+        start = time.perf_counter()
+        predict(row)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": float(np.percentile(timings, 50)), "p99_ms": float(np.percentile(timings, 99))}
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:  # not Linux: fall back to the peak, which is close enough for a fresh process
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _rss_after_loading(kind: str, path: str, queue) -> None:
+    before = current_rss_mb()
+    if kind == "compiled":
+        loaded = CompiledForest.load(path)
+        loaded.predict_proba(np.zeros((1, loaded.n_features_in_)))
+    else:
+        import joblib
+
+        loaded = joblib.load(path)
+        loaded.predict_proba(np.zeros((1, loaded.n_features_in_)))
+    queue.put(current_rss_mb() - before)
+
+
+def resident_memory_mb(kind: str, path: str) -> float:
+    """Peak RSS growth (MB) of a fresh process that only loads the model."""
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_rss_after_loading, args=(kind, path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def benchmark(model, compiled: CompiledForest, model_path: str, compiled_path: str, repeats: int = 500) -> Dict:
+    X = sample_inputs(compiled, 1000, seed=1)
+    return {
+        "original": {
+            **latency_ms(model.predict_proba, X, repeats),
+            "rss_mb": resident_memory_mb("original", model_path),
+        },
+        "compiled": {
+            **latency_ms(compiled.predict_proba, X, repeats),
+            "rss_mb": resident_memory_mb("compiled", compiled_path),
+        },
+    }
+
+
+def compiled_path_for(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + ".forest"
+
+
+def main():
+    import joblib
+
+    from .win_matrix import file_sha256
+
+    parser = argparse.ArgumentParser(description="Compile a pickled tree ensemble into flat NumPy arrays.")
+    parser.add_argument("model", help="Path to the pickled model, e.g. app/ml_models/battle_predictor3.pkl")
+    parser.add_argument("--out", help="Output directory (defaults to the model path with a .forest suffix)")
+    parser.add_argument("--encoder", help="Type encoder to embed, so serving never unpickles sklearn")
+    parser.add_argument("--verify", action="store_true", help="Check probabilities match the original model")
+    parser.add_argument("--benchmark", action="store_true", help="Compare p50/p99 latency and resident memory")
+    args = parser.parse_args()
+
+    out = args.out or compiled_path_for(args.model)
+    model = joblib.load(args.model)
+    compiled = CompiledForest.from_model(model)
+    if args.encoder:
+        compiled.metadata["type_classes"] = [str(c) for c in joblib.load(args.encoder).classes_]
+    # Lets loaders tell whether the compiled copy is still current
+    compiled.metadata["source_sha256"] = file_sha256(args.model)
+    compiled.save(out)
+    print(f"Compiled {len(compiled.roots)} trees ({len(compiled.nodes)} nodes, depth {compiled.max_depth}) to {out}.")
+
+    if args.verify:
+        difference = verify(model, compiled)
+        print(f"Max |p_original - p_compiled| = {difference:.3g}")
+        if difference > 1e-6:
+            raise SystemExit("Compiled model does not match the original.")
+    if args.benchmark:
+        results = benchmark(model, compiled, args.model, out)
+        for name, stats in results.items():
+            print(f"{name:>9}: p50 {stats['p50_ms']:.3f} ms, p99 {stats['p99_ms']:.3f} ms, RSS +{stats['rss_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
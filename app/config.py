@@ -3,6 +3,26 @@ import os
 
 class Settings(BaseSettings):
     DATABASE_URL : str
+    # Load the battle model in the gunicorn master (run with --preload) so workers share it
+    PRELOAD_MODELS : bool = False
+    # How often each worker checks app/ml_models/registry.json for a new active model (0 disables)
+    MODEL_REGISTRY_POLL_SECONDS : float = 5.0
+    # How often each worker checks catalog_version for a Pokédex sync (0 disables)
+    CATALOG_POLL_SECONDS : float = 10.0
+    # How often each worker checks app/spawn_tables for added or edited spawn tables (0 disables)
+    SPAWN_TABLES_POLL_SECONDS : float = 5.0
+    # How often each worker writes buffered XP and coin grants (0 writes each grant at once)
+    REWARD_FLUSH_SECONDS : float = 2.0
+    # Verified bearer tokens are cached per worker (see app.auth_cache)
+    AUTH_CACHE_TTL_SECONDS : float = 60.0
+    AUTH_CACHE_SIZE : int = 10000
+    # bcrypt cost for new hashes; older hashes are upgraded on the next login
+    BCRYPT_ROUNDS : int = 12
+    # Password hashing threads per worker, and how many calls may wait before /login answers 503
+    HASH_POOL_WORKERS : int = 4
+    HASH_POOL_MAX_QUEUE : int = 64
+    # Comma-separated usernames allowed to use the /admin endpoints
+    ADMIN_USERNAMES : str = ""
 
     class Config:
         env_file = ".env"
@@ -1,18 +1,31 @@
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from .config import settings
 
 DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"sslmode": "require"}, 
+url = make_url(DATABASE_URL)
+# Heroku still hands out postgres:// URLs, which SQLAlchemy no longer accepts
+if url.drivername == "postgres":
+    url = url.set(drivername="postgresql")
+is_postgres = url.get_backend_name() == "postgresql"
+
+# Pool sizing for the hosted Postgres; local SQLite keeps SQLAlchemy's defaults
+pool_options = dict(
     pool_size=10,
     max_overflow=2,
     pool_recycle=180,  
     pool_pre_ping=True
-    
+) if is_postgres else {}
+
+engine = create_engine(
+    url,
+    connect_args={"sslmode": "require"} if is_postgres else {},
+    **pool_options
 )
 
 SessionLocal = sessionmaker(
@@ -21,12 +34,41 @@ SessionLocal = sessionmaker(
     autocommit = False
 )
 
+# --- Async engine for `async def` routes (asyncpg in production, aiosqlite locally) ---
+async_url = url.set(drivername="postgresql+asyncpg" if is_postgres else "sqlite+aiosqlite")
+if is_postgres:
+    # asyncpg takes `ssl` instead of libpq's `sslmode`
+    async_url = async_url.difference_update_query(["sslmode"])
+
+async_engine = create_async_engine(
+    async_url,
+    connect_args={"ssl": "require"} if is_postgres else {},
+    **pool_options
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    # Objects stay readable after commit without another round trip
+    expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
+def dialect_insert(table):
+    """An INSERT that supports ON CONFLICT on both Postgres and the local SQLite."""
+    return postgresql.insert(table) if is_postgres else sqlite.insert(table)
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,133 @@
+"""
+Simulated outcome of every ordered pair of species.
+
+`python battle_simulator.py --all-pairs` (in ML model/) runs the battle rules
+on all ~640k ordered pairs from pokemon_data.csv and stores whether pokemon1
+wins as a bit-packed n x n matrix, 80 KB for the whole Pokédex. The server
+uses it as an exact answer when no model is available, and it is the oracle
+for measuring a model against the rules it was trained to imitate. Like the
+win matrix, it records each species' fingerprint and skips species whose data
+has changed since it was built:
+
+    python -m app.ground_truth --validate
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+OUTCOMES_PATH = "app/ml_models/battle_outcomes.npy"
+META_PATH = "app/ml_models/battle_outcomes.json"
+
+
+def save_outcomes(p1_wins: np.ndarray, names: List[str], csv_sha256: str,
+                  path: str = OUTCOMES_PATH, meta_path: str = META_PATH,
+                  fingerprints: Optional[List[str]] = None) -> None:
+    """Writes the boolean matrix `p1_wins[i, j]` (species i attacking species j) bit-packed along rows."""
+    np.save(path + ".tmp.npy", np.packbits(p1_wins, axis=1))
+    os.replace(path + ".tmp.npy", path)
+    meta = {
+        "names": names,
+        "fingerprints": fingerprints,
+        "csv_sha256": csv_sha256,
+        "p1_win_rate": float(p1_wins.mean()),
+        "built_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)
+
+
+class GroundTruth:
+    def __init__(self, packed: np.ndarray, names: List[str], fingerprints: Optional[List[str]] = None):
+        self.packed = packed
+        self.names = names
+        self.fingerprints = fingerprints
+        self.row_of_name: Dict[str, int] = {name: row for row, name in enumerate(names)}
+        self._catalog_rows = None  # (entries, mapping) for the last catalog seen
+
+    @classmethod
+    def load(cls, path: str = OUTCOMES_PATH, meta_path: str = META_PATH) -> Optional["GroundTruth"]:
+        if not (os.path.exists(path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(np.load(path, mmap_mode="r"), meta["names"], meta.get("fingerprints"))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def rows_for(self, entries) -> np.ndarray:
+        """Table row of each catalog entry (by position), -1 for species that were not simulated or changed since."""
+        cached = self._catalog_rows
+        if cached is not None and cached[0] is entries:
+            return cached[1]
+        rows = np.array([self.row_of_name.get(p.name, -1) for p in entries], dtype=np.intp)
+        if self.fingerprints is not None:
+            changed = np.fromiter((row >= 0 and self.fingerprints[row] != p.fingerprint for p, row in zip(entries, rows)),
+                                  dtype=bool, count=len(rows))
+            rows[changed] = -1
+        self._catalog_rows = (entries, rows)
+        return rows
+
+    def p1_wins(self, rows1: np.ndarray, rows2: np.ndarray) -> np.ndarray:
+        """Whether species rows1[i] beats rows2[i] (table rows, not catalog positions)."""
+        bits = self.packed[rows1, rows2 >> 3]
+        return ((bits >> (7 - (rows2 & 7))) & 1).astype(bool)
+
+    def matrix(self) -> np.ndarray:
+        return np.unpackbits(self.packed, axis=1, count=len(self.names)).astype(bool)
+
+
+def validate(ground_truth: GroundTruth, block_rows: int = 64) -> Dict:
+    """Accuracy of the active model over every ordered pair, scored against the simulated winners."""
+    from .battle_features import SpeciesFeatures
+    from .catalog import PokemonCatalog
+    from .model_loader import load_artifacts
+
+    artifacts = load_artifacts()
+    catalog = PokemonCatalog.from_csv()
+    species = SpeciesFeatures(catalog.entries, artifacts.type_codes, artifacts.features)
+    table_rows = ground_truth.rows_for(catalog.entries)
+    if (table_rows < 0).any():
+        raise SystemExit("pokemon_data.csv has species the outcome table does not; rebuild it.")
+
+    truth = ground_truth.matrix()[np.ix_(table_rows, table_rows)]
+    p1_column = list(artifacts.model.classes_).index(0)
+    correct = 0
+    confident_wrong = 0
+    n = len(species)
+    for rows, X in species.all_pairs(block_rows):
+        p1_win = artifacts.model.predict_proba(X)[:, p1_column].reshape(-1, n)
+        predicted = p1_win >= 0.5
+        correct += int((predicted == truth[rows]).sum())
+        confident_wrong += int(((predicted != truth[rows]) & (np.abs(p1_win - 0.5) >= 0.4)).sum())
+    pairs = n * n
+    return {
+        "model_version": artifacts.version,
+        "pairs": pairs,
+        "accuracy": correct / pairs,
+        "confidently_wrong": confident_wrong / pairs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the all-pairs simulated outcome table.")
+    parser.add_argument("--validate", action="store_true", help="Score the current model against every pair")
+    args = parser.parse_args()
+
+    ground_truth = GroundTruth.load()
+    if ground_truth is None:
+        raise SystemExit(f"No outcome table at {OUTCOMES_PATH}; run `python battle_simulator.py --all-pairs` in ML model/.")
+    print(f"{len(ground_truth)} species, {len(ground_truth) ** 2:,} ordered pairs.")
+    if args.validate:
+        report = validate(ground_truth)
+        print(f"Model v{report['model_version']}: {report['accuracy']:.2%} of all pairs correct, "
+              f"{report['confidently_wrong']:.2%} wrong with >= 90% confidence.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,128 @@
+"""
+Password hashing.
+
+bcrypt costs 100-300 ms of CPU per call, so async routes must not run it on
+the event loop. `hash_pool` runs it on a small dedicated thread pool (bcrypt
+releases the GIL while hashing, so the threads run in parallel) and refuses
+new work with HashPoolBusy once HASH_POOL_MAX_QUEUE calls are already
+waiting, so a login storm degrades into fast 503s instead of a stalled worker.
+
+`verify_and_update` also reports when a stored hash uses an outdated bcrypt
+cost (BCRYPT_ROUNDS), so /login can re-hash the password transparently.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
 from passlib.context import CryptContext
 
-pwd_cxt = CryptContext(schemes=["bcrypt"],deprecated = "auto" )
+from .config import settings
+
+# Hashes with any other cost count as outdated, so changing BCRYPT_ROUNDS re-hashes on the next login
+pwd_cxt = CryptContext(
+    schemes=["bcrypt"],deprecated = "auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 
 class Hash():
     def hashing(password):
         hashed_password = pwd_cxt.hash(password)
         return hashed_password
-    
+
     def verify(plain_password,Hashpassword):
         return pwd_cxt.verify(plain_password,Hashpassword)
-    
-        
\ No newline at end of file
+
+    def verify_and_update(plain_password, Hashpassword) -> Tuple[bool, Optional[str]]:
+        """(valid, new hash if the stored one should be replaced, else None)."""
+        return pwd_cxt.verify_and_update(plain_password, Hashpassword)
+
+
+class HashPoolBusy(RuntimeError):
+    """Too many hashing calls are already queued."""
+
+
+class HashPool:
+    """Bounded executor for password hashing, with queue-depth and latency counters."""
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created on first use so that it is never inherited across a fork
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hash")
+        return self._executor
+
+    def _timed(self, fn, submitted: float, *args):
+        started = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self._wait_seconds += started - submitted
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self._run_seconds += time.perf_counter() - started
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HashPoolBusy(f"{self.queued} password hashing calls already queued.")
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), self._timed, fn, time.perf_counter(), *args)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(Hash.hashing, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        valid, new_hash = await self._run(Hash.verify_and_update, password, hashed)
+        if new_hash is not None:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict:
+        completed = self.completed
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": self.queued,
+            "running": self.running,
+            "peak_queued": self.peak_queued,
+            "completed": completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "avg_wait_ms": round(self._wait_seconds / completed * 1000, 2) if completed else None,
+            "avg_run_ms": round(self._run_seconds / completed * 1000, 2) if completed else None,
+            "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+        }
+
+
+hash_pool = HashPool(settings.HASH_POOL_WORKERS, settings.HASH_POOL_MAX_QUEUE)
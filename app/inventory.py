@@ -0,0 +1,67 @@
+"""
+Player inventory (Pokéballs) as one `player_inventory` row per user and item.
+
+Counts change only through a conditional `UPDATE ... SET quantity = quantity
++ :delta WHERE quantity + :delta >= 0 RETURNING quantity`, so two concurrent
+throws can never spend the same ball: the database re-checks the condition
+against the latest row, and a throw without a ball left updates nothing.
+
+Profiles created before this table kept their balls in the `pokeballs` JSON
+column (new profiles still get their starting balls through its default). A
+user's rows are created from it the first time their inventory is touched.
+"""
+from typing import Dict, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import dialect_insert
+
+BALL_TYPES = ("pokeball", "greatball", "ultraball")
+
+_inventory = models.InventoryItem.__table__
+
+
+def seed_inventory(db: Session, user_id: int) -> bool:
+    """Creates the user's rows from their profile's legacy counts; False if there was nothing to create."""
+    legacy = db.execute(
+        select(models.PlayerProfile.legacy_pokeballs).where(models.PlayerProfile.user_id == user_id)
+    ).first()
+    if legacy is None:
+        return False
+    counts = legacy[0] or {}
+    rows = [{"user_id": user_id, "item": ball, "quantity": int(counts.get(ball, 0))} for ball in BALL_TYPES]
+    # A concurrent request may seed the same user; the primary key keeps the first
+    return db.execute(dialect_insert(_inventory).values(rows).on_conflict_do_nothing()).rowcount > 0
+
+
+def adjust(db: Session, user_id: int, item: str, delta: int) -> Optional[int]:
+    """Adds `delta` to the user's count of `item`; the new count, or None if it would go below zero. Caller commits."""
+    statement = (
+        update(_inventory)
+        .where(_inventory.c.user_id == user_id, _inventory.c.item == item, _inventory.c.quantity + delta >= 0)
+        .values(quantity=_inventory.c.quantity + delta)
+        .returning(_inventory.c.quantity)
+    )
+    left = db.scalar(statement)
+    # Seeding is tried once per session, so a batch of throws with an empty stock re-runs only the UPDATE
+    seeded = db.info.setdefault("inventory_seeded", set())
+    if left is None and user_id not in seeded:
+        seeded.add(user_id)
+        seed_inventory(db, user_id)
+        # Retry even if a concurrent request created the rows first: they exist now either way
+        left = db.scalar(statement)
+    return left
+
+
+def use_ball(db: Session, user_id: int, ball_type: str) -> Optional[int]:
+    """Spends one ball; the number left, or None if the user had none."""
+    return adjust(db, user_id, ball_type, -1)
+
+
+def ball_counts(db: Session, user_id: int) -> Dict[str, int]:
+    rows = db.execute(select(_inventory.c.item, _inventory.c.quantity).where(_inventory.c.user_id == user_id))
+    counts = {ball: 0 for ball in BALL_TYPES}
+    counts.update((item, quantity) for item, quantity in rows)
+    return counts
@@ -1,16 +1,53 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from . import models
-from .database import engine
-from .routers import pokemon, users, teams,battle,score,game,safari
+from . import models, catalog
+from .config import settings
+from .database import async_engine, engine
+from .hashing import hash_pool
+from .model_loader import loader as model_loader
+from .response_cache import static_page
+from .rewards import reward_buffer
+from .spawn_engine import spawn_engine
+from .routers import pokemon, users, teams,battle,score,game,safari,admin,ops
 
 # This line creates the database tables (if they don't exist)
 models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+# With gunicorn --preload this module is imported once in the master, so the model
+# loaded here is shared copy-on-write by every forked worker.
+if settings.PRELOAD_MODELS:
+    model_loader.preload()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connections opened in the master before the fork must not be reused by this worker
+    engine.dispose(close=False)
+    # Load the static Pokédex reference data once per worker
+    catalog.load_catalog()
+    # Reload it when `load_data.py --sync` changes the table
+    catalog.start_watching(settings.CATALOG_POLL_SECONDS)
+    # Follow activations and rollbacks of the model registry without a restart
+    model_loader.start_watching(settings.MODEL_REGISTRY_POLL_SECONDS)
+    # Compile the safari spawn tables and pick up event tables as they are dropped in
+    spawn_engine.load()
+    spawn_engine.start_watching(settings.SPAWN_TABLES_POLL_SECONDS)
+    # Batch XP and coin grants into periodic additive UPDATEs
+    reward_buffer.start_flushing(settings.REWARD_FLUSH_SECONDS)
+    yield
+    # Write pending XP and coins before the connections go away
+    reward_buffer.stop_flushing()
+    spawn_engine.stop_watching()
+    model_loader.stop_watching()
+    catalog.stop_watching()
+    hash_pool.shutdown()
+    await async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -27,35 +64,35 @@ app.mount("/static", StaticFiles(directory="app/static"), name="static")
 # --- UPDATED ROUTING FOR SEPARATE HTML FILES ---
 
 @app.get("/", include_in_schema=False)
-async def read_index():
-    return FileResponse('app/static/landing.html')
+async def read_index(request: Request):
+    return static_page(request, 'app/static/landing.html')
 
 @app.get("/pokedex.html", include_in_schema=False)
-async def read_pokedex():
-    return FileResponse('app/static/pokedex.html')
+async def read_pokedex(request: Request):
+    return static_page(request, 'app/static/pokedex.html')
 
 @app.get("/teams.html", include_in_schema=False)
-async def read_teams():
-    return FileResponse('app/static/teams.html')
+async def read_teams(request: Request):
+    return static_page(request, 'app/static/teams.html')
 
 @app.get("/auth.html", include_in_schema=False)
-async def read_auth():
-    return FileResponse('app/static/auth.html')
+async def read_auth(request: Request):
+    return static_page(request, 'app/static/auth.html')
 
 @app.get("/battle.html", include_in_schema=False)
-async def read_battle():
-    return FileResponse('app/static/battle.html')
+async def read_battle(request: Request):
+    return static_page(request, 'app/static/battle.html')
 
 @app.get("/starter.html", include_in_schema=False)
-async def read_starter():
-    return FileResponse('app/static/starter.html')
+async def read_starter(request: Request):
+    return static_page(request, 'app/static/starter.html')
 
 @app.get("/safari.html", include_in_schema=False)
-async def read_safari():
-    return FileResponse('app/static/safari.html')
+async def read_safari(request: Request):
+    return static_page(request, 'app/static/safari.html')
 @app.get("/shop.html", include_in_schema=False)
-async def read_safari():
-    return FileResponse('app/static/shop.html')
+async def read_safari(request: Request):
+    return static_page(request, 'app/static/shop.html')
 # Include all the API routers
 app.include_router(pokemon.router)
 app.include_router(users.router)
@@ -64,6 +101,8 @@ app.include_router(battle.router)
 app.include_router(score.router) 
 app.include_router(safari.router) 
 app.include_router(game.router)   # <-- ADD THIS LINE
+app.include_router(admin.router)
+app.include_router(ops.router)
 
 
 
@@ -0,0 +1,301 @@
+"""
+Loading of the battle predictor's artifacts, driven by app/ml_models/registry.json.
+
+The registry (see app.model_registry) lists every model version with its
+type encoder, the optional compiled copy (see app.compiled_forest), the
+feature columns in order, the SHA-256 of each file and its metrics, and names
+the active version, so the server no longer hard-codes artifact paths.
+
+Artifacts load on first use, not at import, so workers that never serve a
+prediction never pay for them. Calling `preload()` before the server forks
+(gunicorn --preload with PRELOAD_MODELS=1) loads them once in the master and
+lets every worker share those pages copy-on-write. The compiled model and the
+win matrix are memory-mapped, so they are shared through the page cache
+either way.
+
+Each worker polls the registry (`start_watching()`); when the active version
+changes, the new artifacts are loaded on the watcher thread and swapped in
+with a single reference assignment. Requests already holding the previous
+ModelArtifacts finish with it, new requests get the new one, and a version
+that fails to load leaves the current one serving.
+"""
+import gc
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .battle_features import type_codes
+from .compiled_forest import CompiledForest, current_rss_mb
+from .model_registry import (REGISTRY_PATH, RegistryError, previous_version, read_registry, rollback,
+                             set_active, version_manifest)
+from .type_chart import ENCODER_CODES
+from .win_matrix import WinMatrix, file_sha256
+
+
+class ModelUnavailable(RuntimeError):
+    """The registry or one of the artifacts it names is missing or does not match its checksum."""
+
+
+@dataclass
+class ModelArtifacts:
+    version: str
+    model: object  # CompiledForest, or the unpickled estimator when no current compiled copy exists
+    type_codes: Dict[str, int]
+    features: List[str]
+    model_path: str
+    encoder_path: str
+    source: str  # "compiled" or "pickle"
+    win_matrix: Optional[WinMatrix] = None
+    load_seconds: float = 0.0
+    rss_delta_mb: float = 0.0
+    mapped_mb: float = 0.0
+    loaded_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+
+def read_manifest(version: Optional[str] = None, registry_path: str = REGISTRY_PATH) -> Dict:
+    """Registry entry of `version` (default: the active one), artifact paths resolved; RegistryError if unknown."""
+    return version_manifest(read_registry(registry_path), version, registry_path)
+
+
+def _checked(path: str, expected: Optional[str]) -> str:
+    if not os.path.exists(path):
+        raise ModelUnavailable(f"Model artifact not found at {path}.")
+    if expected and file_sha256(path) != expected:
+        raise ModelUnavailable(f"Checksum mismatch for {path}; register the retrained model as a new version.")
+    return path
+
+
+def _mapped_mb(*arrays: np.ndarray) -> float:
+    return sum(a.nbytes for a in arrays if isinstance(a, np.memmap)) / 2**20
+
+
+def load_artifacts(version: Optional[str] = None, registry_path: str = REGISTRY_PATH) -> ModelArtifacts:
+    import joblib
+
+    start = time.perf_counter()
+    rss_before = current_rss_mb()
+    manifest = read_manifest(version, registry_path)
+    checksums = manifest.get("sha256", {})
+    model_path = _checked(manifest["model"], checksums.get("model"))
+    encoder_path = _checked(manifest["encoder"], checksums.get("encoder"))
+
+    # Prefer the compiled flat-array form: it is memory-mapped and needs no sklearn/xgboost
+    compiled_path = manifest.get("compiled")
+    model, source = None, "pickle"
+    if compiled_path and os.path.isdir(compiled_path):
+        compiled = CompiledForest.load(compiled_path, mmap=True)
+        if compiled.metadata.get("source_sha256") in (None, checksums.get("model")):
+            model, source = compiled, "compiled"
+        else:
+            print(f"Compiled model at {compiled_path} is stale; run `python -m app.compiled_forest {model_path}`.")
+    if model is None:
+        model = joblib.load(model_path)
+
+    type_classes = model.metadata.get("type_classes") if source == "compiled" else None
+    if type_classes:
+        codes = {label: code for code, label in enumerate(type_classes)}
+    else:
+        codes = type_codes(joblib.load(encoder_path))
+    if codes != ENCODER_CODES:
+        print(f"Warning: type encoding of {encoder_path} differs from app.type_chart.ENCODER_CODES.")
+
+    features = list(manifest["features"])
+    model_features = getattr(model, "feature_names", None) or list(getattr(model, "feature_names_in_", []))
+    if model_features and list(model_features) != features:
+        raise ModelUnavailable(f"Registered features {features} do not match the model's {list(model_features)}.")
+
+    win_matrix = WinMatrix.load(model_path, encoder_path)
+    arrays = [win_matrix.matrix] if win_matrix is not None else []
+    if source == "compiled":
+        arrays += [model.nodes, model.values, model.roots]
+
+    return ModelArtifacts(
+        version=str(manifest.get("version", "")),
+        model=model,
+        type_codes=codes,
+        features=features,
+        model_path=model_path,
+        encoder_path=encoder_path,
+        source=source,
+        win_matrix=win_matrix,
+        load_seconds=time.perf_counter() - start,
+        rss_delta_mb=current_rss_mb() - rss_before,
+        mapped_mb=_mapped_mb(*arrays),
+    )
+
+
+def _load(version: Optional[str], registry_path: str) -> ModelArtifacts:
+    """load_artifacts, with every failure except an unknown version reported as ModelUnavailable."""
+    try:
+        return load_artifacts(version, registry_path)
+    except (RegistryError, ModelUnavailable):
+        raise
+    except Exception as e:  # e.g. a missing xgboost or a pickle from an incompatible library version
+        raise ModelUnavailable(f"{type(e).__name__}: {e}") from e
+
+
+class ModelLoader:
+    """
+    Loads the active version once per process, on first use or explicitly via
+    `preload()`, and follows later changes of the active version.
+    """
+
+    def __init__(self, registry_path: str = REGISTRY_PATH):
+        self.registry_path = registry_path
+        self._artifacts: Optional[ModelArtifacts] = None
+        self._error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._registry_mtime: Optional[float] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self._artifacts is not None
+
+    def _registry_changed(self) -> bool:
+        try:
+            mtime = os.stat(self.registry_path).st_mtime
+        except OSError:
+            return False
+        changed = mtime != self._registry_mtime
+        self._registry_mtime = mtime
+        return changed
+
+    def get(self) -> ModelArtifacts:
+        """Returns the loaded artifacts, loading them on first call; raises ModelUnavailable on failure."""
+        artifacts = self._artifacts
+        if artifacts is not None:
+            return artifacts
+        with self._lock:
+            if self._artifacts is None:
+                if self._error is not None:
+                    raise ModelUnavailable(self._error)
+                self._registry_changed()
+                try:
+                    self._artifacts = _load(None, self.registry_path)
+                except Exception as e:
+                    self._error = str(e)
+                    print(f"Error loading prediction model: {e} Prediction endpoints will be disabled.")
+                    raise ModelUnavailable(self._error)
+                print(f"ML model v{self._artifacts.version} loaded from {self._artifacts.source} "
+                      f"artifacts in {self._artifacts.load_seconds:.2f}s.")
+            return self._artifacts
+
+    def preload(self) -> bool:
+        """Loads eagerly, e.g. in the gunicorn master before workers fork. Returns readiness."""
+        try:
+            self.get()
+        except ModelUnavailable:
+            return False
+        # Keep the garbage collector from touching (and so copying) the shared objects in every worker
+        gc.freeze()
+        return True
+
+    def reset(self) -> None:
+        """Forgets the loaded artifacts (or the last failure) so the next `get()` loads again."""
+        with self._lock:
+            self._artifacts = None
+            self._error = None
+
+    def check_for_update(self) -> bool:
+        """
+        Switches to the registry's active version if it differs from the loaded
+        one. Loading happens before the swap, so predictions keep being served
+        throughout; returns True if a new version was swapped in.
+        """
+        if not self._registry_changed():
+            return False
+        try:
+            active = str(read_registry(self.registry_path).get("active"))
+        except (RegistryError, ValueError) as e:
+            print(f"Ignoring unreadable model registry: {e}")
+            return False
+        current = self._artifacts
+        if current is not None and current.version == active:
+            return False
+        if current is None and self._error is None:
+            return False  # Nothing loaded yet: the first get() picks up the active version
+        try:
+            artifacts = _load(active, self.registry_path)
+        except Exception as e:
+            self._error = f"Model v{active} failed to load: {e}"
+            print(f"{self._error} Keeping the current model.")
+            return False
+        with self._lock:
+            self._artifacts = artifacts
+            self._error = None
+        print(f"ML model v{artifacts.version} swapped in (pid {os.getpid()}).")
+        return True
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.check_for_update()
+            except Exception as e:  # the watcher must outlive any single bad reload
+                print(f"Model registry watcher error: {e}")
+
+    def start_watching(self, interval: float) -> None:
+        """Polls the registry every `interval` seconds on a daemon thread; call once per worker."""
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+        self._registry_changed()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="model-registry-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+
+    def activate(self, version: str) -> ModelArtifacts:
+        """
+        Loads `version` in this process and, only if that succeeds, makes it the
+        registry's active version; other workers follow on their next poll.
+        """
+        artifacts = _load(version, self.registry_path)
+        set_active(version, self.registry_path)
+        with self._lock:
+            self._artifacts = artifacts
+            self._error = None
+            self._registry_changed()
+        return artifacts
+
+    def rollback(self) -> ModelArtifacts:
+        """Re-activates the previously active version (see `activate`)."""
+        previous = previous_version(read_registry(self.registry_path))
+        artifacts = _load(previous, self.registry_path)
+        rollback(self.registry_path)
+        with self._lock:
+            self._artifacts = artifacts
+            self._error = None
+            self._registry_changed()
+        return artifacts
+
+    def status(self) -> Dict:
+        artifacts = self._artifacts
+        if artifacts is None:
+            return {"ready": False, "error": self._error, "registry": self.registry_path}
+        return {
+            "ready": True,
+            "version": artifacts.version,
+            "source": artifacts.source,
+            "model": artifacts.model_path,
+            "encoder": artifacts.encoder_path,
+            "features": artifacts.features,
+            "win_matrix": artifacts.win_matrix is not None,
+            "loaded_at": artifacts.loaded_at,
+            "load_seconds": round(artifacts.load_seconds, 4),
+            "rss_delta_mb": round(artifacts.rss_delta_mb, 1),
+            "mapped_mb": round(artifacts.mapped_mb, 1),
+            "last_reload_error": self._error,
+            "pid": os.getpid(),
+        }
+
+
+# Process-wide loader used by the prediction routes
+loader = ModelLoader()
@@ -0,0 +1,168 @@
+"""
+Versioned registry of battle predictor models: app/ml_models/registry.json.
+
+    {
+      "active": "3",
+      "history": ["2"],            # previously active versions, most recent last
+      "versions": {
+        "2": {...},
+        "3": {"model": "battle_predictor3.pkl", "encoder": "type_encoder3.pkl",
+              "compiled": "battle_predictor3.forest", "features": [...],
+              "sha256": {"model": ..., "encoder": ...}, "metrics": {...},
+              "registered_at": ...}
+      }
+    }
+
+File names are relative to the registry's directory. Each version entry is the
+manifest app.model_loader loads. Every worker watches this file and switches
+to a new active version in the background (see ModelLoader.check_for_update),
+so activating or rolling back never needs a restart:
+
+    python -m app.model_registry list
+    python -m app.model_registry register 4 --model battle_predictor.pkl --encoder type_encoder.pkl \
+        --metrics "ML model/training_report.json"
+    python -m app.model_registry activate 4
+    python -m app.model_registry rollback
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+REGISTRY_PATH = "app/ml_models/registry.json"
+
+
+class RegistryError(ValueError):
+    """Unknown version, nothing to roll back to, or a malformed registry."""
+
+
+def read_registry(path: str = REGISTRY_PATH) -> Dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise RegistryError(f"Model registry not found at {path}.")
+
+
+def write_registry(registry: Dict, path: str = REGISTRY_PATH) -> None:
+    """Atomic replace, so watchers never read a half-written file."""
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(registry, f, indent=2)
+        f.write("\n")
+    os.replace(path + ".tmp", path)
+
+
+def version_manifest(registry: Dict, version: Optional[str] = None, path: str = REGISTRY_PATH) -> Dict:
+    """Manifest of `version` (default: the active one) with artifact paths resolved."""
+    version = str(version if version is not None else registry.get("active"))
+    entry = registry.get("versions", {}).get(version)
+    if entry is None:
+        raise RegistryError(f"Model version {version!r} is not registered.")
+    manifest = dict(entry, version=version)
+    base = os.path.dirname(path)
+    for key in ("model", "encoder", "compiled"):
+        if manifest.get(key):
+            manifest[key] = os.path.join(base, manifest[key])
+    return manifest
+
+
+def set_active(version: str, path: str = REGISTRY_PATH) -> Dict:
+    registry = read_registry(path)
+    version = str(version)
+    if version not in registry.get("versions", {}):
+        raise RegistryError(f"Model version {version!r} is not registered.")
+    if registry.get("active") != version:
+        if registry.get("active") is not None:
+            registry.setdefault("history", []).append(registry["active"])
+        registry["active"] = version
+        write_registry(registry, path)
+    return registry
+
+
+def previous_version(registry: Dict) -> str:
+    history: List[str] = registry.get("history", [])
+    if not history:
+        raise RegistryError("No previous model version to roll back to.")
+    return history[-1]
+
+
+def rollback(path: str = REGISTRY_PATH) -> Dict:
+    """Re-activates the previously active version and drops it from the history."""
+    registry = read_registry(path)
+    registry["active"] = previous_version(registry)
+    registry["history"] = registry["history"][:-1]
+    write_registry(registry, path)
+    return registry
+
+
+def register(version: str, model: str, encoder: str, features: List[str], metrics: Optional[Dict] = None,
+             compiled: Optional[str] = None, path: str = REGISTRY_PATH) -> Dict:
+    """Adds a version; `model`, `encoder` and `compiled` are paths inside the registry's directory."""
+    from .win_matrix import file_sha256
+
+    try:
+        registry = read_registry(path)
+    except RegistryError:
+        registry = {"active": None, "history": [], "versions": {}}
+    version = str(version)
+    if version in registry["versions"]:
+        raise RegistryError(f"Model version {version!r} is already registered.")
+    base = os.path.dirname(path)
+    registry["versions"][version] = {
+        "model": os.path.relpath(model, base),
+        "encoder": os.path.relpath(encoder, base),
+        "compiled": os.path.relpath(compiled, base) if compiled else None,
+        "features": list(features),
+        "sha256": {"model": file_sha256(model), "encoder": file_sha256(encoder)},
+        "metrics": metrics or {},
+        "registered_at": datetime.now(timezone.utc).isoformat(),
+    }
+    write_registry(registry, path)
+    return registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the battle predictor model registry.")
+    parser.add_argument("--registry", default=REGISTRY_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Show registered versions")
+    add = commands.add_parser("register", help="Register a trained model (copy it into app/ml_models first)")
+    add.add_argument("version")
+    add.add_argument("--model", required=True)
+    add.add_argument("--encoder", required=True)
+    add.add_argument("--compiled", help="Compiled copy from app.compiled_forest")
+    add.add_argument("--metrics", help="training_report.json; its selected candidate is stored as the metrics")
+    add.add_argument("--activate", action="store_true")
+    activate = commands.add_parser("activate", help="Make a version active in every worker")
+    activate.add_argument("version")
+    commands.add_parser("rollback", help="Re-activate the previously active version")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "register":
+            import joblib
+
+            features = [str(f) for f in getattr(joblib.load(args.model), "feature_names_in_", [])]
+            metrics = None
+            if args.metrics:
+                with open(args.metrics, encoding="utf-8") as f:
+                    metrics = json.load(f).get("selected")
+            register(args.version, args.model, args.encoder, features, metrics, args.compiled, args.registry)
+            if args.activate:
+                set_active(args.version, args.registry)
+        elif args.command == "activate":
+            set_active(args.version, args.registry)
+        elif args.command == "rollback":
+            rollback(args.registry)
+    except RegistryError as e:
+        raise SystemExit(str(e))
+
+    registry = read_registry(args.registry)
+    for version, entry in registry["versions"].items():
+        marker = "*" if version == registry.get("active") else " "
+        print(f"{marker} {version:<8} {entry['model']:<32} {json.dumps(entry.get('metrics', {}))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from .database import Base
-from sqlalchemy import Column, String, Integer, ForeignKey, Boolean, Table,JSON
+from sqlalchemy import Column, String, Integer, ForeignKey, Boolean, Table,JSON, Index, LargeBinary, CheckConstraint
 from sqlalchemy.orm import relationship
 # Association table for Many-to-Many
 team_pokemon = Table(
@@ -26,6 +26,9 @@ class Pokemon_model(Base):
     Generation = Column(Integer)
     Legendary = Column(Boolean)
 
+    # Key for load_data.py's upserts; forms such as Mega evolutions share a pokedex_id
+    __table_args__ = (Index("uq_pokemon_pokedex_id_name", "pokedex_id", "name", unique=True),)
+
     # M2M with Team
     teams = relationship("Team", secondary=team_pokemon, back_populates="pokemons")
 
@@ -74,9 +77,21 @@ class PlayerProfile(Base):
     level = Column(Integer, default=1, nullable=False)
     experience = Column(Integer, default=0, nullable=False)
     poke_coins = Column(Integer, default=100, nullable=False)
-    pokeballs = Column(JSON, default={"pokeball": 10, "greatball": 0, "ultraball": 0})
+    # Ball counts from before player_inventory; read once to seed the player's inventory rows (see app.inventory)
+    legacy_pokeballs = Column("pokeballs", JSON, default={"pokeball": 10, "greatball": 0, "ultraball": 0})
 
     owner = relationship("User_model")
+    inventory = relationship(
+        "InventoryItem",
+        primaryjoin="foreign(InventoryItem.user_id) == PlayerProfile.user_id",
+        viewonly=True
+    )
+
+    @property
+    def pokeballs(self):
+        if not self.inventory:
+            return dict(self.legacy_pokeballs or {})
+        return {item.item: item.quantity for item in self.inventory}
 
 user_collection_association = Table(
     "user_collection",
@@ -96,3 +111,30 @@ Pokemon_model.owned_by_users = relationship(
     back_populates="collection"
 )
 User_model.profile = relationship("PlayerProfile", back_populates="owner", uselist=False)
+
+
+class CollectionBitmap(Base):
+    """Owned-species bitmap per user, mirroring user_collection (see app.collection_index)."""
+    __tablename__ = "user_collection_bitmap"
+
+    user_id = Column(Integer, ForeignKey("user_model.id"), primary_key=True)
+    bits = Column(LargeBinary, nullable=False, default=b"")
+
+
+class CatalogVersion(Base):
+    """Single row (id 1) bumped by load_data.py whenever pokemon_model changes; workers poll it."""
+    __tablename__ = "catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class InventoryItem(Base):
+    """How many of each item (ball type) a player holds; updated in place with conditional UPDATEs."""
+    __tablename__ = "player_inventory"
+
+    user_id = Column(Integer, ForeignKey("user_model.id"), primary_key=True)
+    item = Column(String(50), primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (CheckConstraint("quantity >= 0", name="ck_player_inventory_quantity"),)
@@ -0,0 +1,164 @@
+"""
+Prefix and fuzzy name search over the Pokédex catalog.
+
+Names are normalized (Unicode NFKD, accents and punctuation stripped, gender
+symbols spelled out, case-folded) so "Farfetch’d", "farfetchd" and
+"Farfetch'd" all share one key. Every word of a name is inserted into a trie
+for type-ahead prefix matches, and the full key into a trigram index whose
+candidates are ranked by edit distance for typo-tolerant matches.
+"""
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from .catalog import CatalogPokemon, PokemonCatalog, get_catalog
+
+_SYMBOLS = {"♀": " female ", "♂": " male ", "’": "'", "‘": "'", "`": "'"}
+_SPLIT_WORDS = re.compile(r"[a-z0-9]+")
+# The CSV glues forms onto the base name ("CharizardMega Charizard X").
+_CAMEL_BOUNDARY = re.compile(r"(?<=[a-zà-ÿ])(?=[A-Z])")
+
+
+def _fold(name: str) -> str:
+    for symbol, replacement in _SYMBOLS.items():
+        name = name.replace(symbol, replacement)
+    decomposed = unicodedata.normalize("NFKD", name)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def normalize_name(name: str) -> str:
+    """Canonical lookup key for a Pokémon name, e.g. "Nidoran♀" -> "nidoranfemale"."""
+    return "".join(_SPLIT_WORDS.findall(_fold(name)))
+
+
+def name_tokens(name: str) -> List[str]:
+    """Normalized words of a name, splitting glued form names like "CharizardMega"."""
+    return _SPLIT_WORDS.findall(_fold(_CAMEL_BOUNDARY.sub(" ", name)).replace("'", ""))
+
+
+def _trigrams(key: str) -> List[str]:
+    padded = f"  {key} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def edit_distance(a: str, b: str, limit: Optional[int] = None) -> int:
+    """Levenshtein distance; stops early once every cell in a row exceeds `limit`."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.ids: List[int] = []
+
+
+@dataclass(frozen=True)
+class NameMatch:
+    id: int
+    name: str
+    match: str  # "exact", "prefix" or "fuzzy"
+    score: float
+
+
+class NameSearchIndex:
+    def __init__(self, catalog: PokemonCatalog):
+        self.catalog = catalog
+        self.keys: Dict[int, str] = {}
+        self.by_key: Dict[str, CatalogPokemon] = {}
+        self.root = _TrieNode()
+        self.trigrams: Dict[str, List[int]] = {}
+
+        for pokemon in catalog:
+            key = normalize_name(pokemon.name)
+            self.keys[pokemon.id] = key
+            self.by_key.setdefault(key, pokemon)
+            for word in set(name_tokens(pokemon.name)) | {key}:
+                self._insert(word, pokemon.id)
+            for gram in set(_trigrams(key)):
+                self.trigrams.setdefault(gram, []).append(pokemon.id)
+
+    def _insert(self, word: str, pokemon_id: int) -> None:
+        node = self.root
+        for char in word:
+            node = node.children.setdefault(char, _TrieNode())
+            node.ids.append(pokemon_id)
+
+    def _prefix_ids(self, prefix: str) -> set:
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return set(node.ids)
+
+    def lookup(self, name: str) -> Optional[CatalogPokemon]:
+        """Exact match on the normalized key."""
+        return self.by_key.get(normalize_name(name))
+
+    def search(self, query: str, limit: int = 10) -> List[NameMatch]:
+        key = normalize_name(query)
+        words = name_tokens(query)
+        if not key:
+            return []
+
+        # Every query word must prefix some word of the name ("mega char" -> Mega Charizard X/Y).
+        prefix_ids = None
+        for word in words:
+            ids = self._prefix_ids(word)
+            prefix_ids = ids if prefix_ids is None else prefix_ids & ids
+        prefix_ids = (prefix_ids or set()) | self._prefix_ids(key)
+
+        matches: Dict[int, NameMatch] = {}
+        for pid in prefix_ids:
+            name_key = self.keys[pid]
+            exact = name_key == key
+            # Shorter names rank higher: "Pikachu" before "Pikachu Cosplay".
+            score = 1.0 if exact else 0.5 + 0.5 * len(key) / len(name_key)
+            matches[pid] = NameMatch(pid, self.catalog.get(pid).name, "exact" if exact else "prefix", round(score, 4))
+
+        if len(matches) < limit:
+            grams = _trigrams(key)
+            shared = Counter(pid for gram in set(grams) for pid in self.trigrams.get(gram, ()))
+            max_distance = max(1, len(key) // 3)
+            for pid, count in shared.most_common(limit * 5):
+                if pid in matches:
+                    continue
+                name_key = self.keys[pid]
+                # Compare against the name's leading characters too, so partial typos still match.
+                distance = min(
+                    edit_distance(key, name_key, max_distance),
+                    edit_distance(key, name_key[:len(key)], max_distance),
+                )
+                if distance <= max_distance:
+                    score = 0.5 * (1 - distance / max(len(key), 1)) * count / len(grams)
+                    matches[pid] = NameMatch(pid, self.catalog.get(pid).name, "fuzzy", round(score, 4))
+
+        ranked = sorted(matches.values(), key=lambda m: (-m.score, m.id))
+        return ranked[:limit]
+
+
+_index: Optional[NameSearchIndex] = None
+
+
+def get_name_index() -> NameSearchIndex:
+    """FastAPI dependency returning the search index for the current catalog snapshot."""
+    global _index
+    catalog = get_catalog()
+    index = _index
+    if index is None or index.catalog is not catalog:
+        index = _index = NameSearchIndex(catalog)
+    return index
@@ -2,26 +2,56 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from . import token, models, database, schemas
+from .auth_cache import UserIdentity, auth_cache
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def get_current_user(
-    db: Session = Depends(database.get_db), 
-    data: str = Depends(oauth2_scheme)
-):
-    credentials_exception = HTTPException(
+
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    token_data = token.verify_token(data, credentials_exception)
 
-    # fetch user from DB using username
-    user = db.query(models.User_model).filter(models.User_model.username == token_data.username).first()
+def get_current_identity(
+    db: Session = Depends(database.get_db),
+    data: str = Depends(oauth2_scheme)
+) -> UserIdentity:
+    """The caller's id and username; served from the token cache or the `uid` claim when possible."""
+    identity = auth_cache.get(data)
+    if identity is not None:
+        return identity
 
-    if user is None:
-        raise credentials_exception
+    token_data = token.verify_token(data, credentials_exception())
+    if token_data.user_id is not None and auth_cache.claim_trusted(token_data.user_id, token_data.issued_at):
+        auth_cache.claim_resolutions += 1
+        identity = UserIdentity(id=token_data.user_id, username=token_data.username)
+    else:
+        # fetch user from DB using username (the session only connects here)
+        auth_cache.db_lookups += 1
+        row = (
+            db.query(models.User_model.id, models.User_model.username)
+            .filter(models.User_model.username == token_data.username)
+            .first()
+        )
+        if row is None:
+            raise credentials_exception()
+        identity = UserIdentity(id=row.id, username=row.username)
 
+    auth_cache.put(data, identity, token_data.expires_at)
+    return identity
+
+
+def get_current_user(
+    db: Session = Depends(database.get_db),
+    identity: UserIdentity = Depends(get_current_identity)
+):
+    """The full User_model, for routes that need more than the id (e.g. the collection relationship)."""
+    user = db.get(models.User_model, identity.id)
+    if user is None:
+        auth_cache.invalidate_user(identity.id)
+        raise credentials_exception()
     return user   # ⚡ return actual User model, not TokenData
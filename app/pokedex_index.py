@@ -0,0 +1,191 @@
+"""
+Precomputed per-attribute indexes over the Pokédex catalog.
+
+Categorical attributes (types, generation, legendary flag) get one boolean
+bitmap per value, stats get a sorted array that range filters binary-search,
+and every sortable field gets a dense rank array so multi-key ordering is a
+single `np.lexsort`. Pagination is keyset based: the cursor carries the sort
+key of the last row returned, so every page costs the same regardless of how
+deep the client has scrolled.
+"""
+import base64
+import json
+from dataclasses import dataclass, field, fields as dataclass_fields
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .catalog import CatalogPokemon, PokemonCatalog, get_catalog
+
+STAT_FIELDS = ("HP", "Attack", "Defense", "Sp_Atk", "Sp_Def", "Speed")
+SORTABLE_FIELDS = ("id", "pokedex_id", "name", "type1", "type2") + STAT_FIELDS + ("Generation", "Legendary")
+ALL_FIELDS = tuple(f.name for f in dataclass_fields(CatalogPokemon))
+
+
+@dataclass
+class PokedexQuery:
+    type1: Optional[str] = None
+    type2: Optional[str] = None
+    generations: Optional[List[int]] = None
+    legendary: Optional[bool] = None
+    # stat name -> (min, max), either bound may be None
+    stat_ranges: Dict[str, Tuple[Optional[int], Optional[int]]] = field(default_factory=dict)
+    sort: str = "id"
+    fields: Optional[List[str]] = None
+    limit: int = 50
+    cursor: Optional[str] = None
+
+    def cache_key(self) -> Tuple:
+        """Hashable form of the query, the same however the request ordered or padded its parameters."""
+        return (
+            self.type1,
+            self.type2,
+            tuple(sorted(set(self.generations))) if self.generations else None,
+            self.legendary,
+            tuple(sorted((stat, bounds) for stat, bounds in self.stat_ranges.items() if bounds != (None, None))),
+            self.sort,
+            tuple(self.fields) if self.fields is not None else None,
+            self.limit,
+            self.cursor,
+        )
+
+
+class PokedexIndex:
+    def __init__(self, catalog: PokemonCatalog):
+        self.catalog = catalog
+        self.entries = catalog.entries
+        n = len(self.entries)
+
+        # Raw column values; type2 uses "" for mono-type Pokémon so it sorts first.
+        self.values: Dict[str, np.ndarray] = {}
+        for name in SORTABLE_FIELDS:
+            column = [getattr(p, name) for p in self.entries]
+            if name in ("name", "type1", "type2"):
+                self.values[name] = np.array([v or "" for v in column], dtype=str)
+            else:
+                self.values[name] = np.array(column, dtype=np.int64).reshape(n)
+
+        # Dense ranks make every field sortable as an integer key.
+        self.ranks = {name: np.unique(values, return_inverse=True)[1].reshape(n) for name, values in self.values.items()}
+
+        # Bitmaps for the categorical filters.
+        self.bitmaps: Dict[str, Dict[Any, np.ndarray]] = {}
+        for name in ("type1", "type2", "Generation", "Legendary"):
+            values = self.values[name]
+            self.bitmaps[name] = {v.item(): values == v for v in np.unique(values)}
+
+        # Sorted arrays for the stat range filters.
+        self.sorted_stats = {}
+        for name in STAT_FIELDS:
+            order = np.argsort(self.values[name], kind="stable")
+            self.sorted_stats[name] = (order, self.values[name][order])
+
+    def _mask(self, query: PokedexQuery) -> np.ndarray:
+        n = len(self.entries)
+        mask = np.ones(n, dtype=bool)
+        empty = np.zeros(n, dtype=bool)
+
+        if query.type1 is not None:
+            mask &= self.bitmaps["type1"].get(query.type1, empty)
+        if query.type2 is not None:
+            type2 = "" if query.type2 == "None" else query.type2
+            mask &= self.bitmaps["type2"].get(type2, empty)
+        if query.generations:
+            generation_mask = empty.copy()
+            for generation in query.generations:
+                generation_mask |= self.bitmaps["Generation"].get(generation, empty)
+            mask &= generation_mask
+        if query.legendary is not None:
+            mask &= self.bitmaps["Legendary"].get(int(query.legendary), empty)
+
+        for name, (low, high) in query.stat_ranges.items():
+            if low is None and high is None:
+                continue
+            order, sorted_values = self.sorted_stats[name]
+            start = 0 if low is None else np.searchsorted(sorted_values, low, side="left")
+            stop = n if high is None else np.searchsorted(sorted_values, high, side="right")
+            stat_mask = empty.copy()
+            stat_mask[order[start:stop]] = True
+            mask &= stat_mask
+        return mask
+
+    @staticmethod
+    def _parse_sort(sort: str) -> List[Tuple[str, bool]]:
+        keys = []
+        for part in sort.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            descending = part.startswith("-")
+            name = part.lstrip("+-")
+            if name not in SORTABLE_FIELDS:
+                raise ValueError(f"Cannot sort by '{name}'.")
+            keys.append((name, descending))
+        # id is unique, so it makes the ordering total and the cursor unambiguous.
+        if not any(name == "id" for name, _ in keys):
+            keys.append(("id", False))
+        return keys
+
+    def _after_cursor(self, rows: np.ndarray, keys: List[Tuple[str, bool]], cursor_values: Sequence[Any]) -> np.ndarray:
+        """Keeps the rows that sort strictly after the cursor position."""
+        after = np.zeros(len(rows), dtype=bool)
+        tied = np.ones(len(rows), dtype=bool)
+        for (name, descending), value in zip(keys, cursor_values):
+            column = self.values[name][rows]
+            after |= tied & ((column < value) if descending else (column > value))
+            tied &= column == value
+        return rows[after]
+
+    @staticmethod
+    def encode_cursor(sort: str, values: Sequence[Any]) -> str:
+        raw = json.dumps([sort, list(values)], separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str, sort: str, n_keys: int) -> List[Any]:
+        try:
+            cursor_sort, values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            raise ValueError("Malformed cursor.")
+        if cursor_sort != sort or len(values) != n_keys:
+            raise ValueError("Cursor does not belong to this sort order.")
+        return values
+
+    def query(self, query: PokedexQuery) -> Dict[str, Any]:
+        keys = self._parse_sort(query.sort)
+        projection = query.fields or list(ALL_FIELDS)
+        unknown = [name for name in projection if name not in ALL_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}.")
+
+        rows = np.flatnonzero(self._mask(query))
+        total = len(rows)
+        if query.cursor:
+            try:
+                rows = self._after_cursor(rows, keys, self.decode_cursor(query.cursor, query.sort, len(keys)))
+            except TypeError:
+                raise ValueError("Malformed cursor.")
+
+        # np.lexsort treats the last key as primary.
+        sort_keys = [-self.ranks[name][rows] if descending else self.ranks[name][rows] for name, descending in reversed(keys)]
+        page = rows[np.lexsort(sort_keys)[: query.limit]] if len(rows) else rows
+
+        items = [{name: getattr(self.entries[i], name) for name in projection} for i in page]
+        next_cursor = None
+        if len(page) == query.limit and len(rows) > query.limit:
+            last = page[-1]
+            next_cursor = self.encode_cursor(query.sort, [self.values[name][last].item() for name, _ in keys])
+        return {"total": total, "items": items, "next_cursor": next_cursor}
+
+
+_index: Optional[PokedexIndex] = None
+
+
+def get_pokedex_index() -> PokedexIndex:
+    """FastAPI dependency returning the index for the current catalog snapshot."""
+    global _index
+    catalog = get_catalog()
+    index = _index
+    if index is None or index.catalog is not catalog:
+        index = _index = PokedexIndex(catalog)
+    return index
@@ -0,0 +1,165 @@
+"""
+Cache of ready-to-send response bodies for reference data and static pages.
+
+Each entry holds the encoded bytes plus gzip (and, when the optional `brotli`
+package is installed, brotli) variants computed once, and a strong ETag so
+repeat visitors get a bodyless 304. Catalog-backed entries are keyed by the
+catalog version and dropped on reload; static pages are re-read when their
+mtime or size changes.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from . import catalog
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+REFERENCE_CACHE_CONTROL = "public, max-age=300"
+STATIC_CACHE_CONTROL = "public, no-cache"
+# Variants are compressed on the cache miss, inside the request: about 2 ms each for the full
+# listing, where gzip 9 and brotli 11 cost about 7 ms and 300 ms for a few KB less
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+@dataclass(frozen=True)
+class CachedPayload:
+    body: bytes
+    media_type: str
+    etag: str
+    cache_control: str
+    encoded: Dict[str, bytes]  # content-coding -> compressed body
+
+    @classmethod
+    def build(cls, body: bytes, media_type: str, cache_control: str) -> "CachedPayload":
+        encoded = {"gzip": gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)}
+        if brotli is not None:
+            encoded["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+        # Only keep variants that actually save bytes.
+        encoded = {coding: data for coding, data in encoded.items() if len(data) < len(body)}
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        return cls(body, media_type, etag, cache_control, encoded)
+
+
+def json_payload(content: Any, cache_control: str = REFERENCE_CACHE_CONTROL) -> CachedPayload:
+    # Same encoding FastAPI's JSONResponse would produce.
+    body = json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    return CachedPayload.build(body, "application/json", cache_control)
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match.
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def respond(request: Request, payload: CachedPayload) -> Response:
+    """Builds a 200 (picking the best precompressed variant) or a 304."""
+    headers = {"ETag": payload.etag, "Cache-Control": payload.cache_control, "Vary": "Accept-Encoding"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, payload.etag):
+        return Response(status_code=304, headers=headers)
+
+    accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+    for coding in ("br", "gzip"):
+        if coding in payload.encoded and accepted.get(coding, accepted.get("*", 0)) > 0:
+            headers["Content-Encoding"] = coding
+            return Response(payload.encoded[coding], media_type=payload.media_type, headers=headers)
+    return Response(payload.body, media_type=payload.media_type, headers=headers)
+
+
+class ResponseCache:
+    """A bounded LRU of CachedPayloads."""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CachedPayload]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key: Hashable, builder: Callable[[], CachedPayload]) -> CachedPayload:
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                return payload
+        payload = builder()
+        with self._lock:
+            self._entries[key] = payload
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return payload
+
+    def invalidate(self, prefix: Optional[Tuple] = None) -> None:
+        """Drops every entry, or only those whose key tuple starts with `prefix`."""
+        with self._lock:
+            if prefix is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if isinstance(k, tuple) and k[:len(prefix)] == prefix]:
+                    del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+cache = ResponseCache()
+
+
+@catalog.on_reload
+def _drop_catalog_entries(new_catalog) -> None:
+    cache.invalidate(("catalog",))
+
+
+def catalog_response(request: Request, key: Tuple, build: Callable[[], Any]) -> Response:
+    """Serves catalog-derived JSON; `key` must include the catalog version."""
+    return respond(request, cache.get_or_build(("catalog",) + key, lambda: json_payload(build())))
+
+
+_static_stamps: Dict[str, Tuple[int, int]] = {}
+
+
+def static_page(request: Request, path: str, media_type: str = "text/html") -> Response:
+    """Serves a file from disk through the cache, rebuilding it when the file changes."""
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    key = ("static", path, stamp)
+    if _static_stamps.get(path) != stamp:
+        cache.invalidate(("static", path))
+        _static_stamps[path] = stamp
+
+    def build() -> CachedPayload:
+        with open(path, "rb") as f:
+            return CachedPayload.build(f.read(), media_type, STATIC_CACHE_CONTROL)
+
+    return respond(request, cache.get_or_build(key, build))
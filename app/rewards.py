@@ -0,0 +1,227 @@
+"""
+Write-behind buffer for XP and PokéCoin grants.
+
+The frontend grants XP and coins after every battle and catch. Instead of a
+write transaction per grant, each worker adds the delta to `reward_buffer`
+and a flusher thread (`start_flushing()`) writes every pending user in one
+transaction every REWARD_FLUSH_SECONDS:
+
+    UPDATE player_profiles SET experience = experience + :xp,
+                               poke_coins = poke_coins + :coins
+     WHERE user_id = :user_id                       -- one executemany
+
+followed by one SELECT of the users who gained XP and one executemany that
+applies their level-ups. The first UPDATE is additive, so workers flushing
+the same user never overwrite each other, and it holds the row locks the
+level-up then relies on. Pending deltas are merged into this worker's
+profile responses and are flushed on shutdown; a failed flush keeps them for
+the next one.
+
+A profile stores its level and the XP earned within that level. Level-ups are
+computed in closed form from the total XP implied by those two.
+"""
+import threading
+import time
+from math import floor
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import bindparam, select, update
+
+from . import models
+from .database import engine
+
+
+def xp_for_level(level: int) -> int:
+    """Calculates the total XP needed to reach the next level."""
+    return 100 * (level ** 2)
+
+
+def xp_to_reach(level: int) -> int:
+    """XP earned from level 1 to reach `level`: the sum of xp_for_level(1 .. level - 1)."""
+    return 100 * (level - 1) * level * (2 * level - 1) // 6
+
+
+def level_for_xp(total_xp: int) -> int:
+    """The highest level whose xp_to_reach is at most `total_xp`."""
+    if total_xp <= 0:
+        return 1
+    # xp_to_reach(L) is about 100 * (L - 0.5)^3 / 3; the estimate is off by at most one
+    level = max(1, floor((3 * total_xp / 100) ** (1 / 3) + 0.5))
+    while xp_to_reach(level + 1) <= total_xp:
+        level += 1
+    while level > 1 and xp_to_reach(level) > total_xp:
+        level -= 1
+    return level
+
+
+def apply_xp(level: int, experience: int) -> Tuple[int, int]:
+    """(level, experience within it) after levelling up as far as `experience` allows; never levels down."""
+    if experience < xp_for_level(level):
+        return level, experience
+    total = xp_to_reach(level) + experience
+    new_level = level_for_xp(total)
+    return new_level, total - xp_to_reach(new_level)
+
+
+_profiles = models.PlayerProfile.__table__
+
+_add_rewards = (
+    update(_profiles)
+    .where(_profiles.c.user_id == bindparam("b_user_id"))
+    .values(
+        experience=_profiles.c.experience + bindparam("b_xp"),
+        poke_coins=_profiles.c.poke_coins + bindparam("b_coins"),
+    )
+)
+
+_set_level = (
+    update(_profiles)
+    .where(_profiles.c.user_id == bindparam("b_user_id"))
+    .values(level=bindparam("b_level"), experience=bindparam("b_experience"))
+)
+
+
+class RewardBuffer:
+    """Per-user XP and coin deltas waiting to be written, with flush counters."""
+
+    def __init__(self):
+        self._pending: Dict[int, list] = {}
+        self._lock = threading.Lock()
+        # Serializes flushes, so a manual flush() and the flusher thread never write the same deltas twice
+        self._flush_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # Set when flushing is disabled: every grant is then written at once
+        self.write_through = False
+        self.grants = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.level_ups = 0
+        self.last_flush_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def add(self, user_id: int, xp: int = 0, coins: int = 0) -> None:
+        with self._lock:
+            entry = self._pending.setdefault(user_id, [0, 0])
+            entry[0] += xp
+            entry[1] += coins
+            self.grants += 1
+        if self.write_through:
+            self.flush()
+
+    def pending(self, user_id: int) -> Tuple[int, int]:
+        """(xp, coins) granted to the user on this worker and not yet written."""
+        with self._lock:
+            return tuple(self._pending.get(user_id, (0, 0)))
+
+    def take_coins(self, user_id: int) -> int:
+        """Removes and returns the user's pending coins, for a caller that writes them itself."""
+        with self._lock:
+            entry = self._pending.get(user_id)
+            if entry is None:
+                return 0
+            coins, entry[1] = entry[1], 0
+            if entry[0] == 0:
+                del self._pending[user_id]
+            return coins
+
+    def merged(self, profile: "models.PlayerProfile") -> Dict:
+        """The profile's response fields with this worker's pending deltas applied."""
+        xp, coins = self.pending(profile.user_id)
+        level, experience = apply_xp(profile.level, profile.experience + xp)
+        return {
+            "level": level,
+            "experience": experience,
+            "poke_coins": profile.poke_coins + coins,
+            "pokeballs": profile.pokeballs,
+        }
+
+    def flush(self) -> int:
+        """Writes every pending delta in one transaction; returns the number of users written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            started = time.perf_counter()
+            try:
+                level_ups = self._write(batch)
+            except Exception as e:
+                # Put the deltas back (merged with any granted since) for the next flush
+                with self._lock:
+                    for user_id, (xp, coins) in batch.items():
+                        entry = self._pending.setdefault(user_id, [0, 0])
+                        entry[0] += xp
+                        entry[1] += coins
+                self.last_error = f"{type(e).__name__}: {e}"
+                raise
+            self.flushes += 1
+            self.rows_flushed += len(batch)
+            self.level_ups += level_ups
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+            self.last_error = None
+            return len(batch)
+
+    def _write(self, batch: Dict[int, list]) -> int:
+        with engine.begin() as conn:
+            conn.execute(_add_rewards, [
+                {"b_user_id": user_id, "b_xp": xp, "b_coins": coins} for user_id, (xp, coins) in batch.items()
+            ])
+            gained = [user_id for user_id, (xp, _) in batch.items() if xp > 0]
+            if not gained:
+                return 0
+            # These rows are locked by the UPDATE above until commit, so the level-up cannot race another flush
+            rows = conn.execute(
+                select(_profiles.c.user_id, _profiles.c.level, _profiles.c.experience).where(_profiles.c.user_id.in_(gained))
+            )
+            changes = []
+            for user_id, level, experience in rows:
+                new_level, new_experience = apply_xp(level, experience)
+                if new_level != level:
+                    changes.append({"b_user_id": user_id, "b_level": new_level, "b_experience": new_experience})
+            if changes:
+                conn.execute(_set_level, changes)
+            return len(changes)
+
+    def _flush_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:  # the flusher must outlive a database outage; deltas are retried
+                print(f"Reward flush failed, will retry: {e}")
+
+    def start_flushing(self, interval: float) -> None:
+        """Flushes every `interval` seconds on a daemon thread; call once per worker. 0 writes every grant at once."""
+        self.write_through = interval <= 0
+        if self.write_through or (self._flusher is not None and self._flusher.is_alive()):
+            return
+        self._stop.clear()
+        self._flusher = threading.Thread(target=self._flush_loop, args=(interval,), name="reward-flusher", daemon=True)
+        self._flusher.start()
+
+    def stop_flushing(self) -> None:
+        """Stops the flusher and writes whatever is still pending."""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Final reward flush failed; {len(self._pending)} users' XP and coins were not written: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pending_users = len(self._pending)
+        return {
+            "pending_users": pending_users,
+            "grants": self.grants,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "level_ups": self.level_ups,
+            "last_flush_ms": self.last_flush_ms,
+            "last_error": self.last_error,
+        }
+
+
+reward_buffer = RewardBuffer()
@@ -0,0 +1,75 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel
+
+from .. import oauth2
+from ..auth_cache import UserIdentity
+from ..config import settings
+from ..model_loader import ModelUnavailable, loader
+from ..model_registry import RegistryError, read_registry
+
+router = APIRouter(
+    prefix="/admin/models",
+    tags=["Admin"]
+)
+
+
+def get_admin_user(current_user: UserIdentity = Depends(oauth2.get_current_identity)) -> UserIdentity:
+    admins = {name.strip() for name in settings.ADMIN_USERNAMES.split(",") if name.strip()}
+    if current_user.username not in admins:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required.")
+    return current_user
+
+
+AdminUser = Annotated[UserIdentity, Depends(get_admin_user)]
+
+
+class ActivateRequest(BaseModel):
+    version: str
+
+
+def registry_report():
+    try:
+        registry = read_registry(loader.registry_path)
+    except RegistryError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    return {
+        "active": registry.get("active"),
+        "history": registry.get("history", []),
+        "versions": registry.get("versions", {}),
+        # Other workers switch on their next registry poll
+        "this_worker": loader.status(),
+    }
+
+
+@router.get("/")
+def list_models(admin: AdminUser):
+    """Registered model versions, the active one, and what this worker is serving."""
+    return registry_report()
+
+
+@router.post("/activate")
+def activate_model(request: ActivateRequest, admin: AdminUser):
+    """Loads and validates a registered version, then makes it active in every worker."""
+    try:
+        loader.activate(request.version)
+    except RegistryError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except ModelUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Version {request.version} failed to load: {e}")
+    print(f"Model v{request.version} activated by {admin.username}.")
+    return registry_report()
+
+
+@router.post("/rollback")
+def rollback_model(admin: AdminUser):
+    """Re-activates the previously active version."""
+    try:
+        artifacts = loader.rollback()
+    except RegistryError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except ModelUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Previous version failed to load: {e}")
+    print(f"Model rolled back to v{artifacts.version} by {admin.username}.")
+    return registry_report()
@@ -1,97 +1,300 @@
-import pandas as pd
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel
+import warnings
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from pydantic import BaseModel, Field
+from scipy.optimize import linear_sum_assignment
 from sqlalchemy.orm import Session
-import joblib
-from typing import Annotated
+from typing import Annotated, List, Optional
 
 from .. import models, oauth2
+from ..auth_cache import UserIdentity
+from ..battle_features import RAW_FEATURES, SpeciesFeatures
+from ..catalog import PokemonCatalog, get_catalog
 from ..database import get_db
+from ..ground_truth import GroundTruth
+from ..model_loader import ModelArtifacts, ModelUnavailable, loader
+from ..response_cache import cache, json_payload, respond
+from ..type_chart import ENCODER_CODES
 
 router = APIRouter(
     prefix="/predict",
     tags=["Prediction"]
 )
 
-# Using your specified paths for the models
-modelpath = "app/ml_models/battle_predictor.pkl"
-encoderpath = "app/ml_models/type_encoder.pkl"
+# The active version in app/ml_models/registry.json is loaded on the first prediction
+# (or in the gunicorn master) and followed when it changes, see app.model_loader.
 
-# --- Load Models ---
-try:
-    model = joblib.load(modelpath)
-    type_encoder = joblib.load(encoderpath)
-    print("ML model and encoder loaded successfully.")
-except FileNotFoundError:
-    model = None
-    type_encoder = None
-    print(f"Error: Could not find model files at {modelpath} or {encoderpath}. Prediction endpoint will be disabled.")
+MAX_BATCH_PAIRS = 1000
+MAX_TEAM_SIZE = 30
+# Team predictions depend on the caller's private teams
+TEAM_CACHE_CONTROL = "private, no-cache"
 
 # --- Schemas ---
 class BattleRequest(BaseModel):
     pokemon1_id: int
     pokemon2_id: int
 
+class BatchBattleRequest(BaseModel):
+    pairs: List[BattleRequest] = Field(..., min_length=1, max_length=MAX_BATCH_PAIRS)
+
+class TeamBattleRequest(BaseModel):
+    """Each side is either one of the caller's saved teams or an explicit list of Pokémon ids."""
+    team1_id: Optional[int] = None
+    team2_id: Optional[int] = None
+    team1: Optional[List[int]] = Field(None, min_length=1, max_length=MAX_TEAM_SIZE)
+    team2: Optional[List[int]] = Field(None, min_length=1, max_length=MAX_TEAM_SIZE)
+
 # --- Dependencies ---
 DBSession = Annotated[Session, Depends(get_db)]
-CurrentUser = Annotated[models.User_model, Depends(oauth2.get_current_user)]
+CurrentUser = Annotated[UserIdentity, Depends(oauth2.get_current_identity)]
+Catalog = Annotated[PokemonCatalog, Depends(get_catalog)]
+
+
+def get_model() -> Optional[ModelArtifacts]:
+    """The loaded model, or None when it is unavailable and answers must come from the outcome table."""
+    try:
+        return loader.get()
+    except ModelUnavailable:
+        return None
+
+
+Model = Annotated[Optional[ModelArtifacts], Depends(get_model)]
+
+
+# --- Fallback: simulated winner of every pair (see app.ground_truth) ---
+_ground_truth = None
+
+
+def get_ground_truth() -> Optional[GroundTruth]:
+    global _ground_truth
+    if _ground_truth is None:
+        _ground_truth = GroundTruth.load() or False
+    return _ground_truth or None
+
+
+def prediction_unavailable() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Prediction service is not available. Model has not been trained or loaded."
+    )
+
+
+# --- Fast path: per-species feature rows gathered into one matrix ---
+_species_features = None
+
+
+def get_species_features(catalog: PokemonCatalog, artifacts: Optional[ModelArtifacts]) -> SpeciesFeatures:
+    """Feature table for this catalog snapshot and model, rebuilt when either changes."""
+    global _species_features
+    current = _species_features
+    if current is None or current[0] is not artifacts or current[1].entries is not catalog.entries:
+        if artifacts is None:
+            species = SpeciesFeatures(catalog.entries, ENCODER_CODES, RAW_FEATURES)
+        else:
+            species = SpeciesFeatures(catalog.entries, artifacts.type_codes, artifacts.features)
+        current = _species_features = (artifacts, species)
+    return current[1]
+
+
+def resolve_rows(species: SpeciesFeatures, ids: List[int]) -> np.ndarray:
+    """Feature-table rows for Pokémon ids; 404 naming every id missing from the catalog."""
+    row_of = species.row_of
+    missing = sorted({pid for pid in ids if pid not in row_of})
+    if missing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"One or more Pokémon not found: {missing}")
+    return np.fromiter((row_of[pid] for pid in ids), dtype=np.intp, count=len(ids))
+
+
+def simulated_p1_wins(catalog: PokemonCatalog, rows1: np.ndarray, rows2: np.ndarray) -> np.ndarray:
+    """1.0/0.0 from the all-pairs outcome table, for when no model is loaded."""
+    ground_truth = get_ground_truth()
+    if ground_truth is None:
+        raise prediction_unavailable()
+    table_rows = ground_truth.rows_for(catalog.entries)
+    t1, t2 = table_rows[rows1], table_rows[rows2]
+    if (t1 < 0).any() or (t2 < 0).any():
+        raise prediction_unavailable()
+    return ground_truth.p1_wins(t1, t2).astype(np.float64)
+
+
+def p1_win_probabilities(catalog: PokemonCatalog, artifacts: Optional[ModelArtifacts], species: SpeciesFeatures,
+                         rows1: np.ndarray, rows2: np.ndarray) -> np.ndarray:
+    """P(pokemon1 wins) per row pair: win matrix where it covers the pair, one predict_proba call for the rest."""
+    if artifacts is None:
+        return simulated_p1_wins(catalog, rows1, rows2)
+    model, win_matrix = artifacts.model, artifacts.win_matrix
+    p1_win = np.empty(len(rows1), dtype=np.float64)
+    uncovered = np.ones(len(rows1), dtype=bool)
+    if win_matrix is not None:
+        matrix_rows = win_matrix.rows_for(catalog.entries)
+        m1, m2 = matrix_rows[rows1], matrix_rows[rows2]
+        covered = (m1 >= 0) & (m2 >= 0)
+        p1_win[covered] = win_matrix.p1_win(m1[covered], m2[covered])
+        uncovered = ~covered
+
+    if uncovered.any():
+        try:
+            X_predict = species.encode(rows1[uncovered], rows2[uncovered])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid Pokémon type found: {e}")
+
+        # --- Make Prediction ---
+        with warnings.catch_warnings():
+            # The model was fitted on a DataFrame; we feed it the same columns as a plain array
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            prediction_proba = model.predict_proba(X_predict)
+        p1_win[uncovered] = prediction_proba[:, list(model.classes_).index(0)]
+    return p1_win
+
+
+def predict_pairs(catalog: PokemonCatalog, artifacts: Optional[ModelArtifacts], pairs: List[BattleRequest]) -> List[dict]:
+    """
+    Answers from the win matrix where possible and scores the rest with a single predict_proba call.
+    Without a model, the simulated outcome table answers with certainty.
+    """
+    species = get_species_features(catalog, artifacts)
+    rows = resolve_rows(species, [pair.pokemon1_id for pair in pairs] + [pair.pokemon2_id for pair in pairs])
+    rows1, rows2 = rows[:len(pairs)], rows[len(pairs):]
+    p1_win = p1_win_probabilities(catalog, artifacts, species, rows1, rows2)
+
+    # Same tie-break as argmax over [P(p1), P(p2)]
+    winner_indexes = np.where(p1_win >= 0.5, 0, 1)
+    win_probabilities = np.where(winner_indexes == 0, p1_win, 1 - p1_win)
+
+    # Primary-type multiplier each side's attacks get, from the shared type chart
+    p1_multipliers = species.type_multipliers(rows1, rows2)
+    p2_multipliers = species.type_multipliers(rows2, rows1)
+
+    results = []
+    for i, (row1, row2) in enumerate(zip(rows1, rows2)):
+        p1 = catalog.entries[row1]
+        p2 = catalog.entries[row2]
+        winner = p1 if winner_indexes[i] == 0 else p2
+        results.append({
+            "pokemon1": p1.name,
+            "pokemon2": p2.name,
+            "predicted_winner": winner.name,
+            "win_probability": f"{win_probabilities[i]:.2f}",
+            "type_effectiveness": {"pokemon1": float(p1_multipliers[i]), "pokemon2": float(p2_multipliers[i])}
+        })
+    return results
 
 
 @router.post("/battle/")
 def predict_battle_winner(
     request: BattleRequest,
-    db: DBSession,
-    current_user: CurrentUser
+    current_user: CurrentUser,
+    catalog: Catalog,
+    artifacts: Model
 ):
-    if not model or not type_encoder:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Prediction service is not available. Model has not been trained or loaded."
-        )
-
-    # Fetch Pokémon from the database
-    p1 = db.query(models.Pokemon_model).filter(models.Pokemon_model.id == request.pokemon1_id).first()
-    p2 = db.query(models.Pokemon_model).filter(models.Pokemon_model.id == request.pokemon2_id).first()
-
-    if not p1 or not p2:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="One or more Pokémon not found.")
-
-    # --- Preprocess data for prediction (using the simple, raw stats) ---
-    data = {
-        'p1_HP': [p1.HP], 'p1_Attack': [p1.Attack], 'p1_Defense': [p1.Defense], 'p1_Speed': [p1.Speed],
-        'p1_Type 1': [p1.type1], 'p1_Type 2': [p1.type2 if p1.type2 else 'None'],
-        'p2_HP': [p2.HP], 'p2_Attack': [p2.Attack], 'p2_Defense': [p2.Defense], 'p2_Speed': [p2.Speed],
-        'p2_Type 1': [p2.type1], 'p2_Type 2': [p2.type2 if p2.type2 else 'None'],
-    }
-    battle_df = pd.DataFrame(data)
+    return predict_pairs(catalog, artifacts, [request])[0]
 
-    try:
-        battle_df['p1_Type 1_encoded'] = type_encoder.transform(battle_df['p1_Type 1'])
-        battle_df['p1_Type 2_encoded'] = type_encoder.transform(battle_df['p1_Type 2'])
-        battle_df['p2_Type 1_encoded'] = type_encoder.transform(battle_df['p2_Type 1'])
-        battle_df['p2_Type 2_encoded'] = type_encoder.transform(battle_df['p2_Type 2'])
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=f"Invalid Pokémon type found: {e}")
-
-    # The list of features the old model expects
-    features = [
-        'p1_HP', 'p1_Attack', 'p1_Defense', 'p1_Speed', 'p1_Type 1_encoded', 'p1_Type 2_encoded',
-        'p2_HP', 'p2_Attack', 'p2_Defense', 'p2_Speed', 'p2_Type 1_encoded', 'p2_Type 2_encoded'
-    ]
-    X_predict = battle_df[features]
-
-    # --- Make Prediction ---
-    prediction = model.predict(X_predict)
-    prediction_proba = model.predict_proba(X_predict)
-
-    winner_index = prediction[0]
-    win_probability = prediction_proba[0][winner_index]
-
-    winner = p1 if winner_index == 0 else p2
-    
+
+@router.post("/battle/batch")
+def predict_battle_batch(
+    request: BatchBattleRequest,
+    current_user: CurrentUser,
+    catalog: Catalog,
+    artifacts: Model
+):
+    """Predicts many matchups in one vectorized pass; results keep the order of `pairs`."""
+    return {"results": predict_pairs(catalog, artifacts, request.pairs)}
+
+
+def team_members(db: Session, current_user: UserIdentity, team_id: Optional[int],
+                 pokemon_ids: Optional[List[int]], side: str) -> List[int]:
+    if (team_id is None) == (pokemon_ids is None):
+        raise HTTPException(status_code=400, detail=f"Give exactly one of {side}_id or {side}.")
+    if pokemon_ids is not None:
+        return pokemon_ids
+
+    team = db.query(models.Team).filter(models.Team.id == team_id).first()
+    if not team:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Team with id {team_id} not found.")
+    if team.owner_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to use this team.")
+    rows = (
+        db.query(models.team_pokemon.c.pokemon_id)
+        .filter(models.team_pokemon.c.team_id == team_id)
+        .order_by(models.team_pokemon.c.pokemon_id)
+        .all()
+    )
+    if not rows:
+        raise HTTPException(status_code=400, detail=f"Team {team_id} has no Pokémon.")
+    return [pid for (pid,) in rows]
+
+
+def majority_probability(probabilities: np.ndarray) -> float:
+    """P(winning more than half of independent matches with these win probabilities)."""
+    wins = np.zeros(len(probabilities) + 1)
+    wins[0] = 1.0
+    for p in probabilities:
+        wins[1:] = wins[1:] * (1 - p) + wins[:-1] * p
+        wins[0] *= 1 - p
+    return float(wins[len(probabilities) // 2 + 1:].sum())
+
+
+def score_teams(catalog: PokemonCatalog, artifacts: Optional[ModelArtifacts], team1: List[int], team2: List[int]) -> dict:
+    species = get_species_features(catalog, artifacts)
+    rows = resolve_rows(species, team1 + team2)
+    rows1, rows2 = rows[:len(team1)], rows[len(team1):]
+
+    # The whole cross-matchup grid in one pass, team2 varying fastest
+    grid = p1_win_probabilities(
+        catalog, artifacts, species, np.repeat(rows1, len(rows2)), np.tile(rows2, len(rows1))
+    ).reshape(len(rows1), len(rows2))
+
+    # One-on-one matches: random pairing vs. team1 choosing the best pairing
+    matches = min(grid.shape)
+    picks1, picks2 = linear_sum_assignment(grid, maximize=True)
+    assigned = grid[picks1, picks2]
+
+    names1 = [catalog.entries[r].name for r in rows1]
+    names2 = [catalog.entries[r].name for r in rows2]
     return {
-        "pokemon1": p1.name,
-        "pokemon2": p2.name,
-        "predicted_winner": winner.name,
-        "win_probability": f"{win_probability:.2f}"
+        "team1": [{"id": pid, "name": name} for pid, name in zip(team1, names1)],
+        "team2": [{"id": pid, "name": name} for pid, name in zip(team2, names2)],
+        "matrix": np.round(grid, 4).tolist(),
+        "random_order": {
+            "expected_wins": round(float(grid.mean()) * matches, 3),
+            "matches": matches,
+        },
+        "optimal_assignment": {
+            "pairs": [
+                {"pokemon1": names1[i], "pokemon2": names2[j], "win_probability": f"{grid[i, j]:.2f}"}
+                for i, j in zip(picks1, picks2)
+            ],
+            "expected_wins": round(float(assigned.sum()), 3),
+            "team1_win_probability": f"{majority_probability(assigned):.2f}",
+        },
     }
+
+
+@router.post("/team")
+def predict_team_battle(
+    request: Request,
+    body: TeamBattleRequest,
+    db: DBSession,
+    current_user: CurrentUser,
+    catalog: Catalog,
+    artifacts: Model
+):
+    """
+    Scores every member of team1 against every member of team2.
+    `matrix[i][j]` is P(team1[i] beats team2[j]); results are cached per composition.
+    """
+    team1 = team_members(db, current_user, body.team1_id, body.team1, "team1")
+    team2 = team_members(db, current_user, body.team2_id, body.team2, "team2")
+    # Keyed on the catalog namespace so a catalog reload drops these entries too
+    model_key = (artifacts.version, artifacts.loaded_at) if artifacts is not None else ("ground-truth",)
+    key = ("catalog", "predict/team", catalog.version) + model_key + (tuple(team1), tuple(team2))
+    payload = cache.get_or_build(
+        key, lambda: json_payload(score_teams(catalog, artifacts, team1, team2), TEAM_CACHE_CONTROL)
+    )
+    return respond(request, payload)
+
+
+@router.get("/status")
+def model_status():
+    """Whether this worker has its model loaded, which version, and what loading it cost."""
+    return {**loader.status(), "outcome_table": get_ground_truth() is not None}
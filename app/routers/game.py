@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from typing import Annotated
 
 from .. import models, oauth2, schemas
+from ..auth_cache import UserIdentity
 from ..database import get_db
+from ..inventory import adjust
+from ..rewards import reward_buffer
 
 router = APIRouter(
     prefix="/game",
@@ -13,7 +17,7 @@ router = APIRouter(
 
 # --- Dependencies ---
 DBSession = Annotated[Session, Depends(get_db)]
-CurrentUser = Annotated[models.User_model, Depends(oauth2.get_current_user)]
+CurrentUser = Annotated[UserIdentity, Depends(oauth2.get_current_identity)]
 
 # --- Game Data ---
 POKEBALL_PRICES = {
@@ -33,10 +37,6 @@ class PurchaseRequest(BaseModel):
     item_name: str
     quantity: int
 
-def xp_for_level(level: int) -> int:
-    """Calculates the total XP needed to reach the next level."""
-    return 100 * (level ** 2)
-
 # --- Endpoints ---
 
 @router.get("/profile", response_model=schemas.PlayerProfile)
@@ -48,7 +48,7 @@ def get_player_profile(db: DBSession, current_user: CurrentUser):
         db.add(profile)
         db.commit()
         db.refresh(profile)
-    return profile
+    return reward_buffer.merged(profile)
 
 @router.post("/xp", response_model=schemas.PlayerProfile)
 def add_experience(xp_update: ExperienceUpdate, db: DBSession, current_user: CurrentUser):
@@ -56,18 +56,10 @@ def add_experience(xp_update: ExperienceUpdate, db: DBSession, current_user: Cur
     profile = db.query(models.PlayerProfile).filter(models.PlayerProfile.user_id == current_user.id).first()
     if not profile:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Player profile not found.")
-        
-    profile.experience += xp_update.xp
-    
-    xp_needed = xp_for_level(profile.level)
-    while profile.experience >= xp_needed:
-        profile.level += 1
-        profile.experience -= xp_needed
-        xp_needed = xp_for_level(profile.level)
-        
-    db.commit()
-    db.refresh(profile)
-    return profile
+
+    # Written by the reward flusher; the response already includes it
+    reward_buffer.add(current_user.id, xp=xp_update.xp)
+    return reward_buffer.merged(profile)
 
 # --- NEW Endpoint to add PokéCoins ---
 @router.post("/coins", response_model=schemas.PlayerProfile)
@@ -76,11 +68,9 @@ def add_pokecoins(coins_update: CoinsUpdate, db: DBSession, current_user: Curren
     profile = db.query(models.PlayerProfile).filter(models.PlayerProfile.user_id == current_user.id).first()
     if not profile:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Player profile not found.")
-        
-    profile.poke_coins += coins_update.coins
-    db.commit()
-    db.refresh(profile)
-    return profile
+
+    reward_buffer.add(current_user.id, coins=coins_update.coins)
+    return reward_buffer.merged(profile)
 
 # --- NEW Endpoint for the Shop ---
 @router.post("/buy", response_model=schemas.PlayerProfile)
@@ -89,21 +79,29 @@ def buy_items(request: PurchaseRequest, db: DBSession, current_user: CurrentUser
     if request.item_name not in POKEBALL_PRICES or request.quantity <= 0:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid item or quantity.")
 
-    profile = db.query(models.PlayerProfile).filter(models.PlayerProfile.user_id == current_user.id).first()
-    if not profile:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Player profile not found.")
-        
     total_cost = POKEBALL_PRICES[request.item_name] * request.quantity
-    if profile.poke_coins < total_cost:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Not enough PokéCoins.")
+    # Coins this worker has granted but not flushed yet count towards the price and are written here
+    pending_coins = reward_buffer.take_coins(current_user.id)
+    try:
+        # Coins and balls both change in conditional UPDATEs, so concurrent purchases cannot overspend
+        paid = db.execute(
+            update(models.PlayerProfile)
+            .where(models.PlayerProfile.user_id == current_user.id, models.PlayerProfile.poke_coins + pending_coins >= total_cost)
+            .values(poke_coins=models.PlayerProfile.poke_coins + pending_coins - total_cost)
+            .returning(models.PlayerProfile.id)
+        ).first()
+        if paid is not None:
+            adjust(db, current_user.id, request.item_name, request.quantity)
+            db.commit()
+    except Exception:
+        # Nothing was written (a lost connection, a deadlock): the taken coins go back to the buffer
+        db.rollback()
+        reward_buffer.add(current_user.id, coins=pending_coins)
+        raise
 
-    profile.poke_coins -= total_cost
-    
-    # Safely update the JSON 'pokeballs' field
-    new_pokeballs = profile.pokeballs.copy()
-    new_pokeballs[request.item_name] = new_pokeballs.get(request.item_name, 0) + request.quantity
-    profile.pokeballs = new_pokeballs
-
-    db.commit()
-    db.refresh(profile)
-    return profile
+    if paid is None:
+        reward_buffer.add(current_user.id, coins=pending_coins)
+        if not db.query(models.PlayerProfile.id).filter(models.PlayerProfile.user_id == current_user.id).first():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Player profile not found.")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Not enough PokéCoins.")
+    return reward_buffer.merged(db.get(models.PlayerProfile, paid.id))
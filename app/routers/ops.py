@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends
+
+from ..auth_cache import auth_cache
+from ..hashing import hash_pool
+from ..rewards import reward_buffer
+from ..spawn_engine import spawn_engine
+from .admin import get_admin_user
+
+# Internal counters and server paths: admins only, as for /admin
+router = APIRouter(
+    prefix="/ops",
+    tags=["Ops"],
+    dependencies=[Depends(get_admin_user)]
+)
+
+
+@router.get("/auth-cache")
+def auth_cache_stats():
+    """Hit/miss counters of this worker's token cache (see app.auth_cache)."""
+    return auth_cache.stats()
+
+
+@router.get("/hash-pool")
+def hash_pool_stats():
+    """Queue depth, rejections and latency of this worker's password hashing pool (see app.hashing)."""
+    return hash_pool.stats()
+
+
+@router.get("/spawn-tables")
+def spawn_table_status():
+    """Loaded safari zones, active events and the last reload error (see app.spawn_engine)."""
+    return spawn_engine.status()
+
+
+@router.get("/rewards")
+def reward_buffer_stats():
+    """Pending users and flush counters of this worker's XP and coin buffer (see app.rewards)."""
+    return reward_buffer.stats()
@@ -1,26 +1,85 @@
-from fastapi import APIRouter,Depends
-from ..database import get_db
-from sqlalchemy.orm import Session
-from typing import Annotated
-from .. import schemas,models
+from fastapi import APIRouter,Depends,HTTPException,Query,Request,status
+from typing import Annotated,List,Optional
+from ..catalog import PokemonCatalog, get_catalog
+from ..name_search import NameSearchIndex, get_name_index
+from ..pokedex_index import PokedexIndex, PokedexQuery, get_pokedex_index
+from ..response_cache import catalog_response
 
 
 router = APIRouter()
 
-DBSession = Annotated[Session,Depends(get_db)]
+Catalog = Annotated[PokemonCatalog,Depends(get_catalog)]
+Index = Annotated[PokedexIndex,Depends(get_pokedex_index)]
+NameIndex = Annotated[NameSearchIndex,Depends(get_name_index)]
 
 @router.get("/pokemon")
-async def get_pokemons(db:DBSession):
-    pokemons = db.query(models.Pokemon_model).all()
-    return pokemons
+async def get_pokemons(request:Request,catalog:Catalog):
+    return catalog_response(request, ("pokemon", catalog.version), lambda: catalog.entries)
+
+@router.get("/pokemon/query")
+async def query_pokemons(
+    request:Request,
+    index:Index,
+    type1:Optional[str] = None,
+    type2:Optional[str] = Query(None, description="Use 'None' for single-type Pokémon."),
+    generation:Optional[List[int]] = Query(None),
+    legendary:Optional[bool] = None,
+    min_HP:Optional[int] = None, max_HP:Optional[int] = None,
+    min_Attack:Optional[int] = None, max_Attack:Optional[int] = None,
+    min_Defense:Optional[int] = None, max_Defense:Optional[int] = None,
+    min_Sp_Atk:Optional[int] = None, max_Sp_Atk:Optional[int] = None,
+    min_Sp_Def:Optional[int] = None, max_Sp_Def:Optional[int] = None,
+    min_Speed:Optional[int] = None, max_Speed:Optional[int] = None,
+    sort:str = Query("id", description="Comma-separated fields, prefix with '-' for descending, e.g. '-Attack,name'."),
+    fields:Optional[str] = Query(None, description="Comma-separated fields to include in each item."),
+    limit:int = Query(50, ge=1, le=200),
+    cursor:Optional[str] = None,
+):
+    """
+    Filter, sort and page through the Pokédex. Pass the returned `next_cursor`
+    back as `cursor` (with the same filters and sort) to fetch the next page.
+    """
+    query = PokedexQuery(
+        type1=type1,
+        type2=type2,
+        generations=generation,
+        legendary=legendary,
+        stat_ranges={
+            "HP": (min_HP, max_HP),
+            "Attack": (min_Attack, max_Attack),
+            "Defense": (min_Defense, max_Defense),
+            "Sp_Atk": (min_Sp_Atk, max_Sp_Atk),
+            "Sp_Def": (min_Sp_Def, max_Sp_Def),
+            "Speed": (min_Speed, max_Speed),
+        },
+        sort=sort,
+        fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+        limit=limit,
+        cursor=cursor,
+    )
+
+    def run_query():
+        try:
+            return index.query(query)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return catalog_response(request, ("pokemon/query", index.catalog.version, query.cache_key()), run_query)
+
+@router.get("/pokemon/search")
+async def search_pokemons(name_index:NameIndex,q:str = Query(..., min_length=1),limit:int = Query(10, ge=1, le=50)):
+    """
+    Ranked name suggestions for type-ahead: exact and prefix matches first,
+    then typo-tolerant fuzzy matches.
+    """
+    return name_index.search(q, limit)
 
 @router.get("/pokemonbyid")
-async def get_pokemon_byID(id:int,db:DBSession):
-    pokemon = db.query(models.Pokemon_model).filter(models.Pokemon_model.id == id).first()
-    return pokemon
+async def get_pokemon_byID(id:int,catalog:Catalog):
+    return catalog.get(id)
 
 @router.get("/pokemonbyname")
-async def get_pokemon_byname(name:str,db:DBSession):
-    pokemon = db.query(models.Pokemon_model).filter(models.Pokemon_model.name == name).first()
-    return pokemon
+async def get_pokemon_byname(name:str,catalog:Catalog,name_index:NameIndex):
+    # Fall back to the normalized key so "Farfetch’d" finds "Farfetch'd"
+    return catalog.by_name(name) or name_index.lookup(name)
 
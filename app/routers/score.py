@@ -4,6 +4,7 @@ from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 
 from .. import schemas, models, oauth2
+from ..auth_cache import UserIdentity
 from ..database import get_db
 
 router = APIRouter(
@@ -12,7 +13,7 @@ router = APIRouter(
 )
 
 DBSession = Annotated[Session, Depends(get_db)]
-CurrentUser = Annotated[models.User_model, Depends(oauth2.get_current_user)]
+CurrentUser = Annotated[UserIdentity, Depends(oauth2.get_current_identity)]
 
 # --- Schema for updating score ---
 class ScoreUpdate(BaseModel):
@@ -24,7 +25,10 @@ def get_user_me(db: DBSession, current_user: CurrentUser):
     Get the details of the currently authenticated user, including their battle score.
     """
     # Eagerly load the battle_score relationship
-    user = db.query(models.User_model).filter(models.User_model.id == current_user.id).one()
+    user = db.query(models.User_model).filter(models.User_model.id == current_user.id).first()
+    # A token trusted from its uid claim can outlive a user deleted on another worker
+    if user is None:
+        raise oauth2.credentials_exception()
     
     # If the user has no score entry yet, create one.
     if not user.battle_score:
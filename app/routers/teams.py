@@ -1,11 +1,15 @@
 # app/routers/teams.py
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Annotated
 
 from .. import schemas, models, oauth2
-from ..database import get_db
+from ..auth_cache import UserIdentity
+from ..catalog import PokemonCatalog, get_catalog
+from ..database import get_async_db, get_db
 
 router = APIRouter(
     prefix="/teams",  # All routes in this file will start with /teams
@@ -13,13 +17,16 @@ router = APIRouter(
 )
 
 DBSession = Annotated[Session, Depends(get_db)]
-CurrentUser = Annotated[models.User_model, Depends(oauth2.get_current_user)]
+AsyncDBSession = Annotated[AsyncSession, Depends(get_async_db)]
+CurrentUser = Annotated[UserIdentity, Depends(oauth2.get_current_identity)]
+Catalog = Annotated[PokemonCatalog, Depends(get_catalog)]
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.Team)
 def create_team(
     request: schemas.TeamCreate, 
     db: DBSession, 
-    current_user: CurrentUser
+    current_user: CurrentUser,
+    catalog: Catalog
 ):
     """
     Create a new team for the currently authenticated user.
@@ -28,14 +35,15 @@ def create_team(
     # Create the team instance
     new_team = models.Team(name=request.name, owner_id=current_user.id)
     
-    # If pokemon_ids are provided, fetch them and add to the team
-    if request.pokemon_ids:
-        pokemons = db.query(models.Pokemon_model).filter(models.Pokemon_model.id.in_(request.pokemon_ids)).all()
-        if len(pokemons) != len(request.pokemon_ids):
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="One or more Pokémon IDs not found.")
-        new_team.pokemons = pokemons
+    # If pokemon_ids are provided, validate them against the catalog before touching the DB
+    pokemon_ids = list(dict.fromkeys(request.pokemon_ids))
+    if len(pokemon_ids) != len(request.pokemon_ids) or any(pid not in catalog for pid in pokemon_ids):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="One or more Pokémon IDs not found.")
         
     db.add(new_team)
+    db.flush()
+    if pokemon_ids:
+        db.execute(models.team_pokemon.insert(), [{"team_id": new_team.id, "pokemon_id": pid} for pid in pokemon_ids])
     db.commit()
     db.refresh(new_team)
     return new_team
@@ -74,11 +82,12 @@ def delete_team(team_id: int, db: DBSession, current_user: CurrentUser):
 async def update_team(
     team_id: int, 
     team_update: schemas.TeamUpdate, 
-    db: DBSession, 
-    current_user: CurrentUser  # ✅ Enforce logged-in user
+    db: AsyncDBSession, 
+    current_user: CurrentUser,  # ✅ Enforce logged-in user
+    catalog: Catalog
 ):
     # Get the team
-    team = db.query(models.Team).filter(models.Team.id == team_id).first()
+    team = await db.get(models.Team, team_id)
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
 
@@ -91,16 +100,27 @@ async def update_team(
 
     # If pokemon_ids provided, update association
     if team_update.pokemon_ids is not None:
+        try:
+            catalog.many(team_update.pokemon_ids)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=f"Pokemon with id {e.args[0]} not found")
+
         # Clear existing pokemons
-        db.query(models.team_pokemon).filter(models.team_pokemon.c.team_id == team_id).delete()
+        await db.execute(delete(models.team_pokemon).where(models.team_pokemon.c.team_id == team_id))
 
         # Add new pokemons
-        for pid in team_update.pokemon_ids:
-            pokemon = db.query(models.Pokemon_model).filter(models.Pokemon_model.id == pid).first()
-            if not pokemon:
-                raise HTTPException(status_code=404, detail=f"Pokemon with id {pid} not found")
-            db.execute(models.team_pokemon.insert().values(team_id=team.id, pokemon_id=pid))
-
-    db.commit()
-    db.refresh(team)
-    return team
+        if team_update.pokemon_ids:
+            await db.execute(
+                models.team_pokemon.insert(),
+                [{"team_id": team.id, "pokemon_id": pid} for pid in team_update.pokemon_ids]
+            )
+
+    await db.commit()
+    # Lazy loads are not allowed on an AsyncSession, so fetch the members with the team
+    result = await db.execute(
+        select(models.Team)
+        .options(selectinload(models.Team.pokemons))
+        .where(models.Team.id == team_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().one()
@@ -1,6 +1,8 @@
-from ..hashing import Hash
-from ..database import get_db
+from ..hashing import HashPoolBusy, hash_pool
+from ..database import get_db, get_async_db
 from typing import Annotated,List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi import APIRouter,Depends,HTTPException,status
 from ..schemas import User,UserCreate,BattleScore
@@ -17,25 +19,48 @@ router = APIRouter(
 )
 
 DBSession = Annotated[Session,Depends(get_db)]
+AsyncDBSession = Annotated[AsyncSession,Depends(get_async_db)]
+
+def hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins at once, please retry.",
+        headers={"Retry-After": "1"},
+    )
+
 
 @router.post("/create_user")
-async def create_user(request:UserCreate,db:DBSession):
-    new_user = models.User_model(email = request.email,username = request.username,password = Hash.hashing(request.password))
+async def create_user(request:UserCreate,db:AsyncDBSession):
+    # bcrypt runs on the hashing pool, not the event loop
+    try:
+        hashed_password = await hash_pool.hash(request.password)
+    except HashPoolBusy:
+        raise hashing_busy()
+    new_user = models.User_model(email = request.email,username = request.username,password = hashed_password)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
 @router.post("/login")
-async def login(db:DBSession,request:OAuth2PasswordRequestForm = Depends()):
-    user = db.query(models.User_model).filter(models.User_model.username == request.username).first()
+async def login(db:AsyncDBSession,request:OAuth2PasswordRequestForm = Depends()):
+    result = await db.execute(select(models.User_model).where(models.User_model.username == request.username))
+    user = result.scalars().first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="User Not Found")
-    if not Hash.verify(request.password,user.password):
+    try:
+        valid, new_hash = await hash_pool.verify_and_update(request.password,user.password)
+    except HashPoolBusy:
+        raise hashing_busy()
+    if not valid:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="Password Incorrect")
+    if new_hash is not None:
+        # Stored with an older bcrypt cost: upgrade it while we have the plain password
+        user.password = new_hash
+        await db.commit()
     
-    access_token = token.create_access_token(data={"sub": user.username})
+    access_token = token.create_access_token(data={"sub": user.username, "uid": user.id})
     return {"access_token": access_token, "token_type": "bearer"}
     
 
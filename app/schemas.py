@@ -76,6 +76,9 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+    user_id: Optional[int] = None  # `uid` claim; absent in tokens issued before it was added
+    issued_at: Optional[int] = None
+    expires_at: Optional[int] = None
 
 
 class LeaderboardUser(BaseModel):
@@ -0,0 +1,384 @@
+"""
+Safari spawn tables, compiled into Walker alias tables.
+
+Each zone is a JSON file in app/spawn_tables/ listing its tiers, each tier's
+spawn weight and the Pokémon ids it holds (a list, or an {id: weight} object
+for uneven odds within the tier):
+
+    {"zone": "default",
+     "tiers": {"common": {"weight": 0.70, "species": [10, 13, ...]}, ...}}
+
+Tiers are listed from most to least common; when every species of the drawn
+tier is already caught the encounter falls back to the more common tiers
+first, then the rarer ones. An event file may add "starts_at"/"ends_at" (ISO
+timestamps) and "replaces": "<zone>" to take over a zone for a while.
+Catch rates live in catch_rates.json, keyed by Pokémon id, with an explicit
+default; spawnable species without a rate of their own are listed at load.
+
+Tables are compiled once per file version: the tier draw and the species
+draw inside a tier are each one alias-table lookup. Each worker polls the
+directory (`start_watching()`) and recompiles when a file is added, edited or
+removed, so events are switched by dropping in a file, with no deploy.
+
+    python -m app.spawn_engine --benchmark   # encounters per second
+    python -m app.spawn_engine --check       # chi-square test of the sampled distribution
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SPAWN_TABLES_DIR = "app/spawn_tables"
+CATCH_RATES_FILE = "catch_rates.json"
+DEFAULT_ZONE = "default"
+# Draws from a tier before switching to an exact scan of its uncaught species
+MAX_REJECTIONS = 8
+
+
+class SpawnTableError(ValueError):
+    """A spawn table file that is missing or malformed."""
+
+
+class AliasTable:
+    """Walker/Vose alias table: O(1) draws from a fixed discrete distribution."""
+
+    def __init__(self, items: Sequence, weights: Sequence[float]):
+        if not items or len(items) != len(weights) or min(weights) < 0 or sum(weights) <= 0:
+            raise SpawnTableError("An alias table needs items with non-negative weights and a positive total.")
+        n = len(items)
+        total = float(sum(weights))
+        scaled = [w * n / total for w in weights]
+        self.items = list(items)
+        self.probabilities = [1.0] * n
+        self.aliases = list(range(n))
+        # Columns left over when one list runs out keep probability 1 (they are 1 up to rounding)
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.probabilities[s] = scaled[s]
+            self.aliases[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        self.weights = [w / total for w in weights]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def draw(self, rng=random):
+        column = int(rng.random() * len(self.items))
+        if rng.random() < self.probabilities[column]:
+            return self.items[column]
+        return self.items[self.aliases[column]]
+
+    def draw_indices(self, count: int, rng: np.random.Generator) -> np.ndarray:
+        """`count` draws at once, as positions in `items`."""
+        columns = rng.integers(0, len(self.items), size=count)
+        keep = rng.random(count) < np.asarray(self.probabilities)[columns]
+        return np.where(keep, columns, np.asarray(self.aliases)[columns])
+
+
+class SpawnTable:
+    """One zone's compiled tiers."""
+
+    def __init__(self, config: Dict, source: str = ""):
+        self.zone = config.get("zone") or os.path.splitext(os.path.basename(source))[0]
+        self.source = source
+        self.replaces = config.get("replaces")
+        self.starts_at = _timestamp(config.get("starts_at"))
+        self.ends_at = _timestamp(config.get("ends_at"))
+        tiers = config.get("tiers")
+        if not tiers:
+            raise SpawnTableError(f"{source or self.zone}: no tiers.")
+
+        self.tier_names: List[str] = list(tiers)
+        self.species: Dict[str, AliasTable] = {}
+        self.masks: Dict[str, int] = {}
+        for name, tier in tiers.items():
+            species = tier["species"]
+            if isinstance(species, dict):
+                ids, weights = [int(k) for k in species], [float(v) for v in species.values()]
+            else:
+                ids, weights = [int(pid) for pid in species], [1.0] * len(species)
+            self.species[name] = AliasTable(ids, weights)
+            self.masks[name] = _mask_of(ids)
+        self.tiers = AliasTable(self.tier_names, [float(tiers[name]["weight"]) for name in self.tier_names])
+
+    def active(self, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        return (self.starts_at is None or now >= self.starts_at) and (self.ends_at is None or now < self.ends_at)
+
+    def cascade(self, tier: str) -> List[str]:
+        """`tier`, then each more common tier, then the rarer ones nearest first."""
+        position = self.tier_names.index(tier)
+        return self.tier_names[position::-1] + self.tier_names[position + 1:]
+
+    def _uncaught_in(self, tier: str, owned: int, rng) -> Optional[int]:
+        table = self.species[tier]
+        if not self.masks[tier] & ~owned:
+            return None
+        # Rejection keeps the tier's relative weights exactly; fall back to a scan for well-filled collections
+        for _ in range(MAX_REJECTIONS):
+            pokemon_id = table.draw(rng)
+            if not owned >> pokemon_id & 1:
+                return pokemon_id
+        candidates = [(pid, w) for pid, w in zip(table.items, table.weights) if not owned >> pid & 1]
+        return rng.choices([pid for pid, _ in candidates], weights=[w for _, w in candidates], k=1)[0]
+
+    def encounter(self, owned: int = 0, rng=random) -> Optional[int]:
+        """A wild Pokémon id the owner of bitmap `owned` has not caught, or None if they have them all."""
+        for tier in self.cascade(self.tiers.draw(rng)):
+            pokemon_id = self._uncaught_in(tier, owned, rng)
+            if pokemon_id is not None:
+                return pokemon_id
+        return None
+
+    def expected_distribution(self) -> Dict[int, float]:
+        """P(species) for a player who has caught nothing."""
+        expected: Dict[int, float] = {}
+        for name, tier_p in zip(self.tiers.items, self.tiers.weights):
+            table = self.species[name]
+            for pid, p in zip(table.items, table.weights):
+                expected[pid] = expected.get(pid, 0.0) + tier_p * p
+        return expected
+
+    def sample_many(self, count: int, seed: Optional[int] = None) -> np.ndarray:
+        """`count` encounters for a player who has caught nothing, drawn vectorized."""
+        rng = np.random.default_rng(seed)
+        tiers = self.tiers.draw_indices(count, rng)
+        out = np.empty(count, dtype=np.int64)
+        for position, name in enumerate(self.tier_names):
+            rows = np.flatnonzero(tiers == position)
+            table = self.species[name]
+            out[rows] = np.asarray(table.items)[table.draw_indices(len(rows), rng)]
+        return out
+
+
+class CatchRates:
+    def __init__(self, config: Dict):
+        self.default = int(config["default"])
+        self.rates: Dict[int, int] = {int(pid): int(rate) for pid, rate in config.get("rates", {}).items()}
+
+    def get(self, pokemon_id: int) -> int:
+        return self.rates.get(pokemon_id, self.default)
+
+
+def _mask_of(pokemon_ids) -> int:
+    # Same layout as app.collection_index bitmaps; not imported so the CLI runs without the database settings
+    mask = 0
+    for pid in pokemon_ids:
+        mask |= 1 << pid
+    return mask
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def _read_json(path: str) -> Dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise SpawnTableError(f"Cannot read spawn table {path}: {e}")
+
+
+class SpawnEngine:
+    """Every zone file in a directory, recompiled on a watcher thread when the files change."""
+
+    def __init__(self, directory: str = SPAWN_TABLES_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._stamp: Optional[Tuple] = None
+        self._tables: List[SpawnTable] = []
+        self._catch_rates: Optional[CatchRates] = None
+        self._error: Optional[str] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _directory_stamp(self) -> Tuple:
+        entries = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((name, stat.st_mtime_ns, stat.st_size))
+        return tuple(entries)
+
+    def _compile(self, stamp: Tuple) -> Tuple[List[SpawnTable], CatchRates]:
+        tables, rates = [], None
+        for name, _, _ in stamp:
+            path = os.path.join(self.directory, name)
+            if name == CATCH_RATES_FILE:
+                rates = CatchRates(_read_json(path))
+            else:
+                tables.append(SpawnTable(_read_json(path), path))
+        if rates is None:
+            raise SpawnTableError(f"{CATCH_RATES_FILE} is missing from {self.directory}.")
+        for table in tables:
+            missing = sorted(pid for name in table.tier_names for pid in table.species[name].items if pid not in rates.rates)
+            if missing:
+                print(f"Spawn zone {table.zone}: {len(missing)} species use the default catch rate {rates.default}: {missing}")
+        return tables, rates
+
+    def load(self) -> None:
+        """Compiles every file in the directory; a malformed file raises SpawnTableError."""
+        with self._lock:
+            stamp = self._directory_stamp()
+            tables, rates = self._compile(stamp)
+            self._tables, self._catch_rates, self._stamp, self._error = tables, rates, stamp, None
+        print(f"Spawn tables loaded: {', '.join(t.zone for t in tables)}.")
+
+    def _loaded(self) -> None:
+        if self._stamp is None:
+            self.load()
+
+    def check_for_update(self) -> bool:
+        """
+        Recompiles the tables if any file changed. Compilation happens before the
+        swap, and a bad edit keeps the previous tables serving; returns True if
+        new tables were swapped in.
+        """
+        if self._stamp is None or self._directory_stamp() == self._stamp:
+            return False
+        try:
+            self.load()
+        except (SpawnTableError, KeyError, TypeError, ValueError) as e:
+            self._stamp = self._directory_stamp()
+            self._error = f"Spawn tables failed to compile: {e}"
+            print(f"{self._error} Keeping the current tables.")
+            return False
+        return True
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.check_for_update()
+            except Exception as e:  # the watcher must outlive any single bad reload
+                print(f"Spawn table watcher error: {e}")
+
+    def start_watching(self, interval: float) -> None:
+        """Polls the directory every `interval` seconds on a daemon thread; call once per worker."""
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+        self._loaded()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="spawn-table-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+
+    def zones(self) -> List[str]:
+        self._loaded()
+        return sorted({t.zone for t in self._tables if not t.replaces})
+
+    def table(self, zone: str = DEFAULT_ZONE, now: Optional[float] = None) -> Optional[SpawnTable]:
+        """The zone's table, or an active event table that replaces it."""
+        self._loaded()
+        base = None
+        for table in self._tables:
+            if table.replaces == zone and table.active(now):
+                return table
+            if table.zone == zone and not table.replaces and table.active(now):
+                base = table
+        return base
+
+    def catch_rate(self, pokemon_id: int) -> int:
+        self._loaded()
+        return self._catch_rates.get(pokemon_id)
+
+    def status(self) -> Dict:
+        self._loaded()
+        now = time.time()
+        return {
+            "zones": self.zones(),
+            "tables": [
+                {"zone": t.zone, "source": t.source, "replaces": t.replaces, "active": t.active(now),
+                 "tiers": {name: round(p, 4) for name, p in zip(t.tiers.items, t.tiers.weights)}}
+                for t in self._tables
+            ],
+            "catch_rates": len(self._catch_rates.rates),
+            "default_catch_rate": self._catch_rates.default,
+            "last_reload_error": self._error,
+        }
+
+
+spawn_engine = SpawnEngine()
+
+
+def benchmark(table: SpawnTable, encounters: int = 200_000) -> None:
+    rng = random.Random(0)
+    owned = 0
+    start = time.perf_counter()
+    for _ in range(encounters):
+        table.encounter(owned, rng)
+    single = encounters / (time.perf_counter() - start)
+
+    # A collector who owns 90% of the zone exercises the rejection fallback
+    all_ids = [pid for name in table.tier_names for pid in table.species[name].items]
+    owned = _mask_of(all_ids[: int(len(all_ids) * 0.9)])
+    start = time.perf_counter()
+    for _ in range(encounters // 10):
+        table.encounter(owned, rng)
+    collector = encounters // 10 / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    table.sample_many(encounters * 10, seed=0)
+    vectorized = encounters * 10 / (time.perf_counter() - start)
+    print(f"Zone {table.zone}: {single:,.0f} encounters/s (new player), {collector:,.0f}/s (90% caught), "
+          f"{vectorized:,.0f}/s vectorized")
+
+
+def check_distribution(table: SpawnTable, samples: int = 1_000_000, seed: int = 0) -> float:
+    """Chi-square goodness of fit of `samples` draws against the configured weights; returns the p-value."""
+    from scipy.stats import chisquare
+
+    expected = table.expected_distribution()
+    ids = sorted(expected)
+    drawn = table.sample_many(samples, seed)
+    observed = np.bincount(np.searchsorted(ids, drawn), minlength=len(ids))
+    _, p_value = chisquare(observed, np.array([expected[pid] for pid in ids]) * samples)
+
+    # The per-request path (rng.random per draw) must match too
+    rng = random.Random(seed)
+    per_request = np.bincount(np.searchsorted(ids, [table.encounter(0, rng) for _ in range(samples // 10)]), minlength=len(ids))
+    _, p_single = chisquare(per_request, np.array([expected[pid] for pid in ids]) * (samples // 10))
+    print(f"Zone {table.zone}: chi-square p = {p_value:.3f} (vectorized, {samples:,} draws), "
+          f"{p_single:.3f} (per request, {samples // 10:,} draws) over {len(ids)} species")
+    return min(p_value, p_single)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the compiled safari spawn tables.")
+    parser.add_argument("--dir", default=SPAWN_TABLES_DIR)
+    parser.add_argument("--zone", default=DEFAULT_ZONE)
+    parser.add_argument("--benchmark", action="store_true", help="Encounters per second")
+    parser.add_argument("--check", action="store_true", help="Chi-square test of sampled vs configured odds")
+    args = parser.parse_args()
+
+    engine = SpawnEngine(args.dir)
+    table = engine.table(args.zone)
+    if table is None:
+        raise SystemExit(f"No active spawn table for zone {args.zone!r}; zones: {engine.zones()}")
+    if args.benchmark:
+        benchmark(table)
+    if args.check and check_distribution(table) < 0.001:
+        raise SystemExit("Sampled encounters do not match the configured weights.")
+    if not (args.benchmark or args.check):
+        for name, p in zip(table.tiers.items, table.tiers.weights):
+            print(f"{name:<10} {p:6.1%}  {len(table.species[name])} species")
+
+
+if __name__ == "__main__":
+    main()
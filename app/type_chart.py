@@ -0,0 +1,130 @@
+"""
+Pokémon type effectiveness, shared by the simulator, the training script and the server.
+
+TYPE_CHART is the chart as a nested dict (pairs not listed are neutral, 1x).
+It is compiled into arrays so that a multiplier is one array gather:
+
+    MULTIPLIERS[attack, defend]              18 x 18 single-type multipliers
+    DUAL_MULTIPLIERS[attack, combo]          18 x 171, against every defending type
+                                             combination (18 single + 153 dual types)
+
+Types are indexed in TYPE_CHART order; `combo_index(type1, type2)` gives the
+column for a defender and is the same for either order of its types.
+ENCODER_CLASSES / ENCODER_CODES reproduce the LabelEncoder used in training
+(type_encoder.pkl): alphabetical, with 'None' for a missing second type.
+
+The ML scripts import this module from the repo root (see `ML model/battle_simulator.py`).
+"""
+from itertools import combinations
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+TYPE_CHART = {
+    'Normal': {'Rock': 0.5, 'Ghost': 0, 'Steel': 0.5},
+    'Fire': {'Fire': 0.5, 'Water': 0.5, 'Grass': 2, 'Ice': 2, 'Bug': 2, 'Rock': 0.5, 'Dragon': 0.5, 'Steel': 2},
+    'Water': {'Fire': 2, 'Water': 0.5, 'Grass': 0.5, 'Ground': 2, 'Rock': 2, 'Dragon': 0.5},
+    'Electric': {'Water': 2, 'Electric': 0.5, 'Grass': 0.5, 'Ground': 0, 'Flying': 2, 'Dragon': 0.5},
+    'Grass': {'Fire': 0.5, 'Water': 2, 'Grass': 0.5, 'Poison': 0.5, 'Ground': 2, 'Flying': 0.5, 'Bug': 0.5, 'Rock': 2, 'Dragon': 0.5, 'Steel': 0.5},
+    'Ice': {'Fire': 0.5, 'Water': 0.5, 'Grass': 2, 'Ice': 0.5, 'Ground': 2, 'Flying': 2, 'Dragon': 2, 'Steel': 0.5},
+    'Fighting': {'Normal': 2, 'Ice': 2, 'Poison': 0.5, 'Flying': 0.5, 'Psychic': 0.5, 'Bug': 0.5, 'Rock': 2, 'Ghost': 0, 'Dark': 2, 'Steel': 2, 'Fairy': 0.5},
+    'Poison': {'Grass': 2, 'Poison': 0.5, 'Ground': 0.5, 'Rock': 0.5, 'Ghost': 0.5, 'Steel': 0, 'Fairy': 2},
+    'Ground': {'Fire': 2, 'Electric': 2, 'Grass': 0.5, 'Poison': 2, 'Flying': 0, 'Bug': 0.5, 'Rock': 2, 'Steel': 2},
+    'Flying': {'Electric': 0.5, 'Grass': 2, 'Fighting': 2, 'Bug': 2, 'Rock': 0.5, 'Steel': 0.5},
+    'Psychic': {'Fighting': 2, 'Poison': 2, 'Psychic': 0.5, 'Dark': 0, 'Steel': 0.5},
+    'Bug': {'Fire': 0.5, 'Grass': 2, 'Fighting': 0.5, 'Poison': 0.5, 'Flying': 0.5, 'Psychic': 2, 'Ghost': 0.5, 'Dark': 2, 'Steel': 0.5, 'Fairy': 0.5},
+    'Rock': {'Fire': 2, 'Ice': 2, 'Fighting': 0.5, 'Ground': 0.5, 'Flying': 2, 'Bug': 2, 'Steel': 0.5},
+    'Ghost': {'Normal': 0, 'Psychic': 2, 'Ghost': 2, 'Dark': 0.5},
+    'Dragon': {'Dragon': 2, 'Steel': 0.5, 'Fairy': 0},
+    'Dark': {'Fighting': 0.5, 'Psychic': 2, 'Ghost': 2, 'Dark': 0.5, 'Fairy': 0.5},
+    'Steel': {'Fire': 0.5, 'Water': 0.5, 'Electric': 0.5, 'Ice': 2, 'Rock': 2, 'Steel': 0.5, 'Fairy': 2},
+    'Fairy': {'Fire': 0.5, 'Fighting': 2, 'Poison': 0.5, 'Dragon': 2, 'Dark': 2, 'Steel': 0.5},
+}
+
+TYPES = tuple(TYPE_CHART)
+TYPE_INDEX = {name: i for i, name in enumerate(TYPES)}
+# Index used for a missing second type (and any type the chart does not know)
+NO_TYPE = len(TYPES)
+
+# Label encoding used for the model's *_encoded features
+ENCODER_CLASSES = tuple(sorted(TYPES + ('None',)))
+ENCODER_CODES: Dict[str, int] = {label: code for code, label in enumerate(ENCODER_CLASSES)}
+
+
+def type_index(type_name: Optional[str]) -> int:
+    return TYPE_INDEX.get(type_name, NO_TYPE) if isinstance(type_name, str) else NO_TYPE
+
+
+def _multipliers() -> np.ndarray:
+    """Attacker x defender multipliers, with an extra neutral row/column at NO_TYPE."""
+    multipliers = np.ones((NO_TYPE + 1, NO_TYPE + 1))
+    for attack_type, row in TYPE_CHART.items():
+        for defend_type, value in row.items():
+            multipliers[TYPE_INDEX[attack_type], TYPE_INDEX[defend_type]] = value
+    return multipliers
+
+
+_MULTIPLIERS_PADDED = _multipliers()
+MULTIPLIERS = _MULTIPLIERS_PADDED[:NO_TYPE, :NO_TYPE]
+
+# Defending type combinations: single types first, then every unordered pair
+COMBOS: Tuple[Tuple[int, int], ...] = tuple((t, NO_TYPE) for t in range(NO_TYPE)) + tuple(combinations(range(NO_TYPE), 2))
+_COMBO_OF = np.full((NO_TYPE + 1, NO_TYPE + 1), -1, dtype=np.intp)
+for _combo, (_first, _second) in enumerate(COMBOS):
+    _COMBO_OF[_first, _second] = _COMBO_OF[_second, _first] = _combo
+for _t in range(NO_TYPE):
+    _COMBO_OF[_t, _t] = _COMBO_OF[_t, NO_TYPE]
+# An unknown primary type defends like a neutral type: use a trailing all-neutral column
+_COMBO_OF[NO_TYPE, :] = len(COMBOS)
+_COMBO_OF[:NO_TYPE, NO_TYPE] = np.arange(NO_TYPE)
+_combo_types = np.array(COMBOS + ((NO_TYPE, NO_TYPE),), dtype=np.intp)
+
+# Same order of multiplication as the simulator: (1 * m(type 1)) * m(type 2)
+_DUAL_PADDED = _MULTIPLIERS_PADDED[:, _combo_types[:, 0]] * _MULTIPLIERS_PADDED[:, _combo_types[:, 1]]
+DUAL_MULTIPLIERS = _DUAL_PADDED[:NO_TYPE, :len(COMBOS)]
+
+
+def combo_index(type1: Optional[str], type2: Optional[str] = None):
+    """DUAL_MULTIPLIERS column of a defender; accepts type names or arrays of type indices."""
+    if isinstance(type1, np.ndarray):
+        return _COMBO_OF[type1, type2]
+    return int(_COMBO_OF[type_index(type1), type_index(type2)])
+
+
+def dual_multiplier(attack_type: Optional[str], type1: Optional[str], type2: Optional[str] = None) -> float:
+    """Multiplier of an `attack_type` move against a defender of type1/type2."""
+    return float(_DUAL_PADDED[type_index(attack_type), combo_index(type1, type2)])
+
+
+def dual_multipliers(attack_types: np.ndarray, combos: np.ndarray) -> np.ndarray:
+    """Vectorized dual_multiplier over type indices (NO_TYPE allowed) and combo_index values."""
+    return _DUAL_PADDED[attack_types, combos]
+
+
+def effectiveness(attack_type: str, defend_type: Optional[str]) -> float:
+    return float(_MULTIPLIERS_PADDED[type_index(attack_type), type_index(defend_type)])
+
+
+def _advantage_scores() -> np.ndarray:
+    """+1 for super effective, -1 for not very effective or immune, 0 otherwise; the NO_TYPE row/column is 0."""
+    return np.sign(_MULTIPLIERS_PADDED - 1).astype(np.int8)
+
+
+ADVANTAGE_SCORES = _advantage_scores()
+# Score of one attacking type against each defending combination (NO_TYPE row is 0)
+_ADVANTAGE_BY_COMBO = (ADVANTAGE_SCORES[:, _combo_types[:, 0]] + ADVANTAGE_SCORES[:, _combo_types[:, 1]]).astype(np.int8)
+
+
+def type_advantages(attack1: np.ndarray, attack2: np.ndarray, combos: np.ndarray) -> np.ndarray:
+    """Vectorized type_advantage from the attacker's two type indices and the defender's combo_index."""
+    return _ADVANTAGE_BY_COMBO[attack1, combos] + _ADVANTAGE_BY_COMBO[attack2, combos]
+
+
+def type_advantage(attacker_types: Iterable[Optional[str]], defender_types: Iterable[Optional[str]]) -> int:
+    """
+    The `Type_Advantage` model feature: over every (attacker type, defender type)
+    combination, the number of super-effective matchups minus the number of
+    resisted or immune ones.
+    """
+    defenders = [type_index(t) for t in defender_types]
+    return int(sum(ADVANTAGE_SCORES[type_index(a), d] for a in attacker_types for d in defenders))
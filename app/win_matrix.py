@@ -0,0 +1,150 @@
+"""
+Precomputed win probabilities for every ordered pair of species.
+
+The Pokédex is small enough (~800 species, ~640k ordered pairs) to run the
+trained model over every matchup offline and store P(pokemon1 wins) as a
+float16 matrix. Workers memory-map the file, so all of them share one copy
+through the page cache and a prediction becomes an array index.
+
+The matrix records the SHA-256 of the model and encoder it was built from and
+is ignored when they no longer match. It also records each species'
+fingerprint (app.catalog.species_fingerprint), so species whose data changed
+since the build are scored by the model instead. Rebuild it whenever the model
+or the Pokédex changes:
+
+    python -m app.win_matrix            # always rebuild
+    python -m app.win_matrix --if-stale # only when missing or out of date
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .battle_features import SpeciesFeatures, type_codes
+from .catalog import PokemonCatalog, species_fingerprint
+
+MATRIX_PATH = "app/ml_models/win_matrix.npy"
+META_PATH = "app/ml_models/win_matrix.json"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_win_matrix(model, type_encoder, catalog: PokemonCatalog, model_sha256: str, encoder_sha256: str,
+                     features: List[str], matrix_path: str = MATRIX_PATH, meta_path: str = META_PATH,
+                     block_rows: int = 64) -> np.ndarray:
+    """Scores every ordered pair with `model` and writes the matrix plus its metadata."""
+    species = SpeciesFeatures(catalog.entries, type_codes(type_encoder), features)
+    n = len(species)
+    p1_column = list(model.classes_).index(0)
+
+    tmp_path = matrix_path + ".tmp"
+    matrix = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float16, shape=(n, n))
+    for rows, X in species.all_pairs(block_rows):
+        matrix[rows] = model.predict_proba(X)[:, p1_column].reshape(-1, n)
+    matrix.flush()
+    del matrix
+    os.replace(tmp_path, matrix_path)
+
+    meta = {
+        "model_sha256": model_sha256,
+        "encoder_sha256": encoder_sha256,
+        "names": [p.name for p in species.entries],
+        "fingerprints": [species_fingerprint(p) for p in species.entries],
+        "dtype": "float16",
+        "built_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)
+    return np.load(matrix_path, mmap_mode="r")
+
+
+class WinMatrix:
+    def __init__(self, matrix: np.ndarray, names: List[str], model_sha256: str,
+                 fingerprints: Optional[List[str]] = None):
+        self.matrix = matrix
+        self.model_sha256 = model_sha256
+        self.row_of_name: Dict[str, int] = {name: row for row, name in enumerate(names)}
+        self.fingerprints = fingerprints
+        self._catalog_rows = None  # (entries, mapping) for the last catalog seen
+
+    @classmethod
+    def load(cls, model_path: str, encoder_path: str,
+             matrix_path: str = MATRIX_PATH, meta_path: str = META_PATH) -> Optional["WinMatrix"]:
+        """Memory-maps the matrix, or returns None if it is missing or was built from another model."""
+        if not (os.path.exists(matrix_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        try:
+            current = (file_sha256(model_path), file_sha256(encoder_path))
+        except FileNotFoundError:
+            return None
+        if current != (meta["model_sha256"], meta["encoder_sha256"]):
+            print(f"Win matrix at {matrix_path} was built from a different model; run `python -m app.win_matrix` to rebuild it.")
+            return None
+        return cls(np.load(matrix_path, mmap_mode="r"), meta["names"], meta["model_sha256"], meta.get("fingerprints"))
+
+    def rows_for(self, entries) -> np.ndarray:
+        """Matrix row of each catalog entry (by position), -1 for species the matrix has never seen or that changed."""
+        cached = self._catalog_rows
+        if cached is not None and cached[0] is entries:
+            return cached[1]
+        rows = np.array([self.row_of_name.get(p.name, -1) for p in entries], dtype=np.intp)
+        if self.fingerprints is not None:
+            changed = np.fromiter((row >= 0 and self.fingerprints[row] != p.fingerprint for p, row in zip(entries, rows)),
+                                  dtype=bool, count=len(rows))
+            rows[changed] = -1
+        self._catalog_rows = (entries, rows)
+        return rows
+
+    def p1_win(self, matrix_rows1: np.ndarray, matrix_rows2: np.ndarray) -> np.ndarray:
+        return self.matrix[matrix_rows1, matrix_rows2].astype(np.float64)
+
+
+def main():
+    import joblib
+
+    from .model_loader import read_manifest
+    from .model_registry import REGISTRY_PATH
+
+    parser = argparse.ArgumentParser(description="Precompute the all-pairs win probability matrix.")
+    parser.add_argument("--registry", default=REGISTRY_PATH, help="Model registry naming the model, encoder and features")
+    parser.add_argument("--version", help="Registered model version (default: the active one)")
+    parser.add_argument("--csv", default="pokemon_data.csv")
+    parser.add_argument("--out", default=MATRIX_PATH)
+    parser.add_argument("--meta", default=META_PATH)
+    parser.add_argument("--if-stale", action="store_true", help="Skip the build when the existing matrix matches the model.")
+    args = parser.parse_args()
+
+    manifest = read_manifest(args.version, args.registry)
+    model_path, encoder_path = manifest["model"], manifest["encoder"]
+    if args.if_stale and WinMatrix.load(model_path, encoder_path, args.out, args.meta) is not None:
+        print(f"{args.out} is up to date.")
+        return
+
+    start = time.perf_counter()
+    model = joblib.load(model_path)
+    type_encoder = joblib.load(encoder_path)
+    catalog = PokemonCatalog.from_csv(args.csv)
+    matrix = build_win_matrix(
+        model, type_encoder, catalog, file_sha256(model_path), file_sha256(encoder_path), manifest["features"],
+        args.out, args.meta
+    )
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {matrix.shape[0]}x{matrix.shape[1]} win matrix to {args.out} in {elapsed:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,26 @@
 # load_data.py
+#
+# Seeds (or re-seeds) the pokemon_model table from pokemon_data.csv.
+#
+# Rows are upserted on (pokedex_id, name), so running it again updates stats in
+# place instead of duplicating every Pokémon, and ids on a fresh database follow
+# the CSV order (app.catalog.PokemonCatalog.from_csv relies on that). PostgreSQL
+# streams the file through COPY into a temporary table and upserts from there in
+# one statement; SQLite upserts with executemany in batches.
+#
+# --sync instead diffs the CSV against the table by row fingerprint and applies
+# only the inserts, updates and deletes in one transaction (--dry-run prints them
+# without writing). A species whose name changed but whose pokedex_id did not is
+# updated in place, so teams and collections keep pointing at it. Either mode
+# bumps catalog_version, which tells running workers to reload their catalog.
+#
+#     python load_data.py [--csv pokemon_data.csv] [--sync [--dry-run]]
 
+import argparse
+import csv
 import os
 import sys
-import pandas as pd
+import time
 from dotenv import load_dotenv
 
 # Load environment variables from .env
@@ -16,17 +34,25 @@ if not db_url:
     print("DATABASE_URL=sqlite:///./pokemon.db")
     sys.exit(1)
 
+from sqlalchemy import Boolean, Column, Integer, MetaData, String, Table, bindparam, delete, func, insert, select, update
+
 # Import after confirming DATABASE_URL exists
-from app.database import SessionLocal
-from app.models import Pokemon_model
+from app.catalog import species_fingerprint
+from app.database import engine, is_postgres
+from app.models import Base, CatalogVersion, CollectionBitmap, Pokemon_model, team_pokemon, user_collection_association
 
-db = SessionLocal()
+CSV_PATH = "pokemon_data.csv"
+BATCH_SIZE = 5000
 
-# --- Data Loading and Cleaning ---
-df = pd.read_csv("Pokemon/pokemon_data.csv")
+pokemon_table = Pokemon_model.__table__
+version_table = CatalogVersion.__table__
+bitmap_table = CollectionBitmap.__table__
+LINK_TABLES = ((team_pokemon, team_pokemon.c.team_id), (user_collection_association, user_collection_association.c.user_id))
+UPSERT_KEY = ["pokedex_id", "name"]
 
-column_mapping = {
-    '#': 'id',
+# CSV header -> pokemon_model column, in file order
+COLUMN_MAPPING = {
+    '#': 'pokedex_id',
     'Name': 'name',
     'Type 1': 'type1',
     'Type 2': 'type2',
@@ -39,38 +65,263 @@ column_mapping = {
     'Generation': 'Generation',
     'Legendary': 'Legendary'
 }
-df = df.rename(columns=column_mapping)
-
-df['type2'] = df['type2'].where(pd.notna(df['type2']), None)
-
-print("Starting to load Pokémon data into the database...")
-df.columns = df.columns.str.strip()
-
-print(df.columns)
-
-
-for _, row in df.iterrows():
-    pokemon_record = Pokemon_model(
-        pokedex_id=row["id"],
-        name=row['name'],
-        type1=row['type1'],
-        type2=row['type2'],
-        HP=row['HP'],
-        Attack=row['Attack'],
-        Defense=row['Defense'],
-        Sp_Atk=row['Sp_Atk'],
-        Sp_Def=row['Sp_Def'],
-        Speed=row['Speed'],
-        Generation=row['Generation'],
-        Legendary=row['Legendary']
+DATA_COLUMNS = list(COLUMN_MAPPING.values())
+UPDATE_COLUMNS = [c for c in DATA_COLUMNS if c not in UPSERT_KEY]
+TEXT_COLUMNS = {'name', 'type1', 'type2'}
+
+
+def read_rows(path):
+    """Streams the CSV as dicts keyed by pokemon_model column."""
+    with open(path, newline="", encoding="utf-8") as f:
+        for record in csv.DictReader(f):
+            row = {column: record[header].strip() for header, column in COLUMN_MAPPING.items()}
+            for column in DATA_COLUMNS:
+                if column == 'Legendary':
+                    row[column] = row[column].upper() == "TRUE"
+                elif column not in TEXT_COLUMNS:
+                    row[column] = int(row[column])
+            row['type2'] = row['type2'] or None
+            yield row
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def drop_collection_bitmaps(conn, pokemon_ids):
+    """Owners of these species get their collection bitmap rebuilt from user_collection on next use."""
+    owners = select(user_collection_association.c.user_id).where(user_collection_association.c.pokemon_id.in_(pokemon_ids))
+    conn.execute(delete(bitmap_table).where(bitmap_table.c.user_id.in_(owners)))
+
+
+def remove_duplicates(conn):
+    """
+    Merges rows left behind by earlier non-idempotent runs, keeping the lowest id
+    of each (pokedex_id, name) and moving team and collection links onto it, so
+    the unique index can be created on an existing database.
+    """
+    keepers = (
+        select(func.min(pokemon_table.c.id).label("keep_id"), pokemon_table.c.pokedex_id, pokemon_table.c.name)
+        .group_by(pokemon_table.c.pokedex_id, pokemon_table.c.name)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    duplicates = dict(conn.execute(
+        select(pokemon_table.c.id, keepers.c.keep_id)
+        .join(keepers, (pokemon_table.c.pokedex_id == keepers.c.pokedex_id) & (pokemon_table.c.name == keepers.c.name))
+        .where(pokemon_table.c.id != keepers.c.keep_id)
+    ).all())
+    if not duplicates:
+        return 0
+
+    drop_collection_bitmaps(conn, list(duplicates))
+    for link, owner in LINK_TABLES:
+        moved = conn.execute(select(owner, link.c.pokemon_id).where(link.c.pokemon_id.in_(duplicates))).all()
+        if not moved:
+            continue
+        conn.execute(delete(link).where(link.c.pokemon_id.in_(duplicates)))
+        targets = {(owner_id, duplicates[pokemon_id]) for owner_id, pokemon_id in moved}
+        existing = set(conn.execute(
+            select(owner, link.c.pokemon_id).where(link.c.pokemon_id.in_({t for _, t in targets}))
+        ).all())
+        missing = [{owner.name: o, "pokemon_id": p} for o, p in targets - existing]
+        if missing:
+            conn.execute(insert(link), missing)
+
+    conn.execute(delete(pokemon_table).where(pokemon_table.c.id.in_(duplicates)))
+    return len(duplicates)
+
+
+def ensure_upsert_key(conn):
+    """Creates the (pokedex_id, name) unique index on tables created before it existed."""
+    removed = remove_duplicates(conn)
+    if removed:
+        print(f"Removed {removed} duplicate Pokémon rows from earlier loads.")
+    for index in pokemon_table.indexes:
+        if index.unique:
+            index.create(conn, checkfirst=True)
+
+
+def load_postgres(conn, path):
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+    # Staging table in the CSV's column order; `ordinal` remembers the file order
+    staging = Table(
+        "pokemon_staging", MetaData(),
+        Column("ordinal", Integer, primary_key=True, autoincrement=True),
+        *(Column(c, String if c in TEXT_COLUMNS else Boolean if c == 'Legendary' else Integer) for c in DATA_COLUMNS),
+        prefixes=["TEMPORARY"],
+        postgresql_on_commit="DROP",
+    )
+    staging.create(conn)
+
+    copy_columns = ", ".join(f'"{c}"' for c in DATA_COLUMNS)
+    cursor = conn.connection.cursor()
+    with open(path, encoding="utf-8") as f:
+        cursor.copy_expert(f"COPY pokemon_staging ({copy_columns}) FROM STDIN WITH (FORMAT csv, HEADER true)", f)
+    copied = cursor.rowcount
+
+    upsert = pg_insert(pokemon_table).from_select(
+        DATA_COLUMNS, select(*(staging.c[c] for c in DATA_COLUMNS)).order_by(staging.c.ordinal)
+    )
+    conn.execute(upsert.on_conflict_do_update(
+        index_elements=UPSERT_KEY, set_={c: upsert.excluded[c] for c in UPDATE_COLUMNS}
+    ))
+    return copied
+
+
+def load_sqlite(conn, path, batch_size):
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+    upsert = sqlite_insert(pokemon_table)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=UPSERT_KEY, set_={c: upsert.excluded[c] for c in UPDATE_COLUMNS}
     )
-    db.add(pokemon_record)
-
-try:
-    db.commit()
-    print(f"✅ Successfully loaded {len(df)} Pokémon records into the database.")
-except Exception as e:
-    db.rollback()
-    print(f"❌ An error occurred while inserting data: {e}")
-finally:
-    db.close()
+    loaded = 0
+    for batch in batches(read_rows(path), batch_size):
+        conn.execute(upsert, batch)
+        loaded += len(batch)
+    return loaded
+
+
+def bump_catalog_version(conn):
+    """Signals running workers (see app.catalog.start_watching) to reload the Pokédex."""
+    bumped = conn.execute(update(version_table).where(version_table.c.id == 1).values(version=version_table.c.version + 1))
+    if bumped.rowcount == 0:
+        conn.execute(insert(version_table).values(id=1, version=1))
+
+
+def plan_sync(conn, path):
+    """Inserts, updates (with the changed columns) and deletes that make pokemon_model match the CSV."""
+    db_rows = {(r["pokedex_id"], r["name"]): dict(r) for r in conn.execute(select(pokemon_table)).mappings()}
+    csv_rows = {(r["pokedex_id"], r["name"]): r for r in read_rows(path)}
+
+    inserts = [row for key, row in csv_rows.items() if key not in db_rows]
+    deletes = [row for key, row in db_rows.items() if key not in csv_rows]
+    updates = [
+        (db_rows[key], row) for key, row in csv_rows.items()
+        if key in db_rows and species_fingerprint(row) != species_fingerprint(db_rows[key])
+    ]
+
+    # A lone insert and delete sharing a pokedex_id is a rename (e.g. a spelling fix): update that row in place
+    inserted_by_number, deleted_by_number = {}, {}
+    for row in inserts:
+        inserted_by_number.setdefault(row["pokedex_id"], []).append(row)
+    for row in deletes:
+        deleted_by_number.setdefault(row["pokedex_id"], []).append(row)
+    for number, added in inserted_by_number.items():
+        removed = deleted_by_number.get(number, [])
+        if len(added) == 1 and len(removed) == 1:
+            updates.append((removed[0], added[0]))
+            inserts.remove(added[0])
+            deletes.remove(removed[0])
+
+    changes = [(old, new, [c for c in DATA_COLUMNS if old[c] != new[c]]) for old, new in updates]
+    return inserts, changes, deletes
+
+
+def count_links(conn, pokemon_ids):
+    if not pokemon_ids:
+        return 0
+    return sum(
+        conn.execute(select(func.count()).select_from(link).where(link.c.pokemon_id.in_(pokemon_ids))).scalar_one()
+        for link, _ in LINK_TABLES
+    )
+
+
+def apply_sync(conn, inserts, changes, deletes):
+    deleted_ids = [row["id"] for row in deletes]
+    if deleted_ids:
+        # Species that left the Pokédex also leave teams and collections
+        drop_collection_bitmaps(conn, deleted_ids)
+        for link, _ in LINK_TABLES:
+            conn.execute(delete(link).where(link.c.pokemon_id.in_(deleted_ids)))
+        conn.execute(delete(pokemon_table).where(pokemon_table.c.id.in_(deleted_ids)))
+    if changes:
+        statement = (
+            update(pokemon_table)
+            .where(pokemon_table.c.id == bindparam("row_id"))
+            .values({c: bindparam(f"new_{c}") for c in DATA_COLUMNS})
+        )
+        conn.execute(statement, [{"row_id": old["id"], **{f"new_{c}": new[c] for c in DATA_COLUMNS}} for old, new, _ in changes])
+    if inserts:
+        conn.execute(insert(pokemon_table), inserts)
+
+
+def sync(path, dry_run):
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        ensure_upsert_key(conn)
+        inserts, changes, deletes = plan_sync(conn, path)
+        planned = time.perf_counter()
+
+        for row in inserts:
+            print(f"  + {row['name']} (#{row['pokedex_id']})")
+        for old, new, columns in changes:
+            diff = ", ".join(f"{c}: {old[c]!r} -> {new[c]!r}" for c in columns)
+            print(f"  ~ {old['name']}: {diff}")
+        links = count_links(conn, [row["id"] for row in deletes])
+        for row in deletes:
+            print(f"  - {row['name']} (#{row['pokedex_id']})")
+        summary = f"{len(inserts)} inserts, {len(changes)} updates, {len(deletes)} deletes"
+        if links:
+            summary += f" ({links} team/collection entries of deleted species removed)"
+
+        if dry_run:
+            print(f"Dry run: {summary}; nothing written.")
+            conn.rollback()
+            return
+        if not (inserts or changes or deletes):
+            print("Pokédex already matches the CSV; nothing to do.")
+            return
+        apply_sync(conn, inserts, changes, deletes)
+        bump_catalog_version(conn)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Applied {summary} in {(elapsed - (planned - start)) * 1000:.1f}ms "
+          f"(diff took {(planned - start) * 1000:.1f}ms); running workers will reload the catalog.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upsert the Pokédex CSV into pokemon_model.")
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows per executemany on SQLite")
+    parser.add_argument("--sync", action="store_true", help="Apply only the rows that differ from the database")
+    parser.add_argument("--dry-run", action="store_true", help="With --sync: report the changes without writing")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    if args.sync or args.dry_run:
+        try:
+            sync(args.csv, args.dry_run)
+        except Exception as e:
+            print(f"❌ An error occurred while syncing data: {e}")
+            sys.exit(1)
+        return
+
+    print(f"Loading Pokémon data from {args.csv} ({'COPY' if is_postgres else 'executemany'})...")
+
+    start = time.perf_counter()
+    try:
+        with engine.begin() as conn:
+            ensure_upsert_key(conn)
+            if is_postgres:
+                loaded = load_postgres(conn, args.csv)
+            else:
+                loaded = load_sqlite(conn, args.csv, args.batch_size)
+            bump_catalog_version(conn)
+    except Exception as e:
+        print(f"❌ An error occurred while loading data: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Upserted {loaded} Pokémon records in {elapsed:.2f}s ({loaded / max(elapsed, 1e-9):,.0f} rows/s).")
+
+
+if __name__ == "__main__":
+    main()
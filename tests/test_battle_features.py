@@ -0,0 +1,83 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from app.battle_features import RAW_FEATURES, SpeciesFeatures, type_codes
+from app.catalog import CatalogPokemon
+from app.type_chart import ENCODER_CLASSES, TYPES, combo_index, type_advantage, type_advantages, type_index
+
+# The version 2 model's columns
+DIFF_FEATURES = [
+    'HP_diff', 'Attack_diff', 'Defense_diff', 'Speed_diff', 'Type_Advantage',
+    'p1_Type 1_encoded', 'p1_Type 2_encoded', 'p2_Type 1_encoded', 'p2_Type 2_encoded',
+]
+
+
+class _Encoder:
+    classes_ = np.array(ENCODER_CLASSES)
+
+
+def _pokemon(id, type1, type2, hp, attack, defense, speed):
+    return CatalogPokemon(id=id, pokedex_id=id, name=f"p{id}", type1=type1, type2=type2, HP=hp, Attack=attack,
+                          Defense=defense, Sp_Atk=50, Sp_Def=50, Speed=speed, Generation=1, Legendary=False)
+
+
+SPECIES = [
+    _pokemon(1, 'Grass', 'Poison', 45, 49, 49, 45),
+    _pokemon(2, 'Water', None, 44, 48, 65, 43),
+    _pokemon(3, 'Electric', None, 35, 55, 40, 90),
+    _pokemon(4, 'Ground', 'Rock', 80, 110, 130, 45),
+]
+
+
+@pytest.mark.parametrize("attacker, defender, expected", [
+    (['Water'], ['Fire'], 1),
+    (['Fire'], ['Water'], -1),
+    (['Electric'], ['Ground'], -1),   # immune counts as resisted
+    (['Normal'], ['Normal'], 0),
+    (['Grass', 'Poison'], ['Water', 'Ground'], 1),
+    (['Water', None], ['Fire', None], 1),
+])
+def test_type_advantage(attacker, defender, expected):
+    assert type_advantage(attacker, defender) == expected
+
+
+def test_type_advantages_matches_the_scalar_form():
+    combos = [(t1, t2) for t1 in TYPES for t2 in (None,) + TYPES if t2 != t1]
+    attackers = [combo for combo in combos if combo[1] is None or combo[0] < combo[1]][::7]
+    pairs = list(itertools.product(attackers, combos))
+    vectorized = type_advantages(
+        np.array([type_index(a[0]) for a, _ in pairs]),
+        np.array([type_index(a[1]) for a, _ in pairs]),
+        np.array([combo_index(*d) for _, d in pairs]),
+    )
+    assert vectorized.tolist() == [type_advantage(a, d) for a, d in pairs]
+
+
+def test_encode_diff_and_advantage_features():
+    codes = type_codes(_Encoder())
+    species = SpeciesFeatures(SPECIES, codes, DIFF_FEATURES)
+    X = species.encode(np.array([0, 2]), np.array([1, 3]))
+    for row, (p1, p2) in enumerate([(SPECIES[0], SPECIES[1]), (SPECIES[2], SPECIES[3])]):
+        assert X[row].tolist() == [
+            p1.HP - p2.HP, p1.Attack - p2.Attack, p1.Defense - p2.Defense, p1.Speed - p2.Speed,
+            type_advantage([p1.type1, p1.type2], [p2.type1, p2.type2]),
+            codes[p1.type1], codes[p1.type2 or 'None'], codes[p2.type1], codes[p2.type2 or 'None'],
+        ]
+
+
+def test_encode_raw_features():
+    codes = type_codes(_Encoder())
+    X = SpeciesFeatures(SPECIES, codes).encode(np.array([3]), np.array([0]))
+    p1, p2 = SPECIES[3], SPECIES[0]
+    assert X[0].tolist() == [
+        p1.HP, p1.Attack, p1.Defense, p1.Speed, codes['Ground'], codes['Rock'],
+        p2.HP, p2.Attack, p2.Defense, p2.Speed, codes['Grass'], codes['Poison'],
+    ]
+    assert len(RAW_FEATURES) == X.shape[1]
+
+
+def test_unknown_feature_is_rejected():
+    with pytest.raises(ValueError):
+        SpeciesFeatures(SPECIES, type_codes(_Encoder()), ['Sp. Atk_ratio'])
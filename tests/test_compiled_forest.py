@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from app.compiled_forest import CompiledForest, sample_inputs, verify
+
+
+def _training_data(seed=0, n=2000, features=6):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, features))
+    y = (X[:, 0] + X[:, 1] * X[:, 2] - X[:, 3] > 0).astype(int)
+    return X, y
+
+
+def _assert_parity(model, tmp_path):
+    compiled = CompiledForest.from_model(model)
+    assert verify(model, compiled, n=5000) < 1e-6
+
+    # The saved, memory-mapped form must give the same answers as the in-memory one
+    compiled.save(str(tmp_path / "model.forest"))
+    loaded = CompiledForest.load(str(tmp_path / "model.forest"), mmap=True)
+    X = sample_inputs(compiled, 1000, seed=1)
+    np.testing.assert_allclose(loaded.predict_proba(X), model.predict_proba(X), atol=1e-6)
+    np.testing.assert_array_equal(loaded.predict(X), model.predict(X))
+
+
+def test_random_forest_parity(tmp_path):
+    X, y = _training_data()
+    model = RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0).fit(X, y)
+    _assert_parity(model, tmp_path)
+
+
+def test_xgboost_parity(tmp_path):
+    xgboost = pytest.importorskip("xgboost")
+    X, y = _training_data(seed=1)
+    model = xgboost.XGBClassifier(n_estimators=30, max_depth=4, random_state=0).fit(X, y)
+    _assert_parity(model, tmp_path)
+
+
+def test_xgboost_missing_values_follow_default_direction(tmp_path):
+    xgboost = pytest.importorskip("xgboost")
+    X, y = _training_data(seed=2)
+    X[::7, 1] = np.nan
+    model = xgboost.XGBClassifier(n_estimators=20, max_depth=4, random_state=0).fit(X, y)
+    compiled = CompiledForest.from_model(model)
+    np.testing.assert_allclose(compiled.predict_proba(X), model.predict_proba(X), atol=1e-6)
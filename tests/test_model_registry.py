@@ -0,0 +1,30 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from app.battle_features import SpeciesFeatures
+from app.model_loader import load_artifacts
+from app.model_registry import REGISTRY_PATH, read_registry, rollback
+from tests.test_battle_features import SPECIES
+
+
+@pytest.mark.parametrize("version", sorted(read_registry()["versions"]))
+def test_shipped_versions_load_compiled(version):
+    artifacts = load_artifacts(version)
+    assert artifacts.version == version
+    assert artifacts.source == "compiled"
+
+    species = SpeciesFeatures(SPECIES, artifacts.type_codes, artifacts.features)
+    rows = np.arange(len(SPECIES))
+    proba = artifacts.model.predict_proba(species.encode(np.repeat(rows, len(rows)), np.tile(rows, len(rows))))
+    np.testing.assert_allclose(proba.sum(axis=1), 1.0)
+
+
+def test_fresh_deploy_can_roll_back(tmp_path):
+    path = str(tmp_path / "registry.json")
+    shutil.copy(REGISTRY_PATH, path)
+    active = read_registry(path)["active"]
+    registry = rollback(path)
+    assert registry["active"] != active
+    assert registry["active"] in registry["versions"]
@@ -0,0 +1,64 @@
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.pokedex_index import PokedexQuery
+from app.response_cache import CachedPayload, json_payload, respond
+
+BODY = json.dumps([{"id": i, "name": f"Pokemon{i}", "type1": "Water", "HP": i % 200} for i in range(500)]).encode()
+
+
+def _client(payload):
+    app = FastAPI()
+
+    @app.get("/")
+    def page(request: Request):
+        return respond(request, payload)
+
+    return TestClient(app)
+
+
+def _raw(client, accept_encoding, **headers):
+    # The undecoded bytes, to check what was actually sent
+    with client.stream("GET", "/", headers={"Accept-Encoding": accept_encoding, **headers}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_gzip_variant():
+    payload = CachedPayload.build(BODY, "application/json", "public")
+    response, raw = _raw(_client(payload), "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(raw) == BODY
+
+
+def test_brotli_variant_preferred():
+    brotli = pytest.importorskip("brotli")
+    payload = CachedPayload.build(BODY, "application/json", "public")
+    response, raw = _raw(_client(payload), "gzip, br")
+    assert response.headers["content-encoding"] == "br"
+    assert brotli.decompress(raw) == BODY
+
+    response, raw = _raw(_client(payload), "gzip, br;q=0")
+    assert response.headers["content-encoding"] == "gzip"
+
+
+def test_identity_and_not_modified():
+    payload = json_payload({"ok": True})
+    client = _client(payload)
+    response, raw = _raw(client, "identity")
+    assert "content-encoding" not in response.headers
+    assert raw == payload.body
+    response, raw = _raw(client, "gzip", **{"If-None-Match": payload.etag})
+    assert response.status_code == 304 and raw == b""
+
+
+def test_query_cache_key_ignores_parameter_order():
+    a = PokedexQuery(type1="Fire", generations=[3, 1], stat_ranges={"HP": (10, None), "Attack": (None, None)})
+    b = PokedexQuery(type1="Fire", generations=[1, 3, 3], stat_ranges={"Attack": (None, None), "HP": (10, None)})
+    assert a.cache_key() == b.cache_key()
+    assert hash(a.cache_key()) == hash(b.cache_key())
+    assert a.cache_key() != PokedexQuery(type1="Fire", generations=[1]).cache_key()
+    assert PokedexQuery(generations=[]).cache_key() == PokedexQuery().cache_key()
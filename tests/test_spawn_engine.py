@@ -0,0 +1,68 @@
+import random
+
+import numpy as np
+from scipy.stats import chisquare
+
+from app.spawn_engine import AliasTable, SpawnTable
+
+SAMPLES = 200_000
+
+# Uneven tier weights, and uneven species weights inside the first tier
+TABLE = {
+    "zone": "test",
+    "tiers": {
+        "common": {"weight": 0.6, "species": {"10": 5, "13": 3, "16": 1, "19": 1}},
+        "uncommon": {"weight": 0.3, "species": [1, 4, 7]},
+        "rare": {"weight": 0.09, "species": [131, 143]},
+        "legendary": {"weight": 0.01, "species": [150]},
+    },
+}
+
+
+def _p_value(table, drawn):
+    expected = table.expected_distribution()
+    ids = sorted(expected)
+    observed = np.bincount(np.searchsorted(ids, drawn), minlength=len(ids))
+    return chisquare(observed, np.array([expected[pid] for pid in ids]) * len(drawn)).pvalue
+
+
+def test_expected_distribution_follows_the_weights():
+    expected = SpawnTable(TABLE).expected_distribution()
+    assert abs(sum(expected.values()) - 1.0) < 1e-12
+    assert abs(expected[10] - 0.6 * 0.5) < 1e-12
+    assert abs(expected[4] - 0.3 / 3) < 1e-12
+    assert abs(expected[150] - 0.01) < 1e-12
+
+
+def test_sample_many_matches_the_weights():
+    table = SpawnTable(TABLE)
+    assert _p_value(table, table.sample_many(SAMPLES, seed=0)) > 0.001
+
+
+def test_encounter_matches_the_weights():
+    table = SpawnTable(TABLE)
+    rng = random.Random(0)
+    assert _p_value(table, [table.encounter(0, rng) for _ in range(SAMPLES)]) > 0.001
+
+
+def test_chi_square_detects_wrong_weights():
+    # Guards the test itself: the same number of draws from a flat table must be rejected
+    table = SpawnTable(TABLE)
+    flat = SpawnTable({"tiers": {"all": {"weight": 1, "species": sorted(table.expected_distribution())}}})
+    assert _p_value(table, flat.sample_many(SAMPLES, seed=0)) < 0.001
+
+
+def test_encounter_skips_caught_species():
+    table = SpawnTable(TABLE)
+    rng = random.Random(0)
+    owned = sum(1 << pid for pid in table.expected_distribution() if pid != 143)
+    assert {table.encounter(owned, rng) for _ in range(200)} == {143}
+    assert table.encounter(owned | 1 << 143, rng) is None
+
+
+def test_alias_table_draw_indices():
+    table = AliasTable(["a", "b", "c"], [1, 0, 3])
+    drawn = table.draw_indices(SAMPLES, np.random.default_rng(0))
+    counts = np.bincount(drawn, minlength=3)
+    assert counts[1] == 0
+    assert chisquare(counts[[0, 2]], np.array([0.25, 0.75]) * SAMPLES).pvalue > 0.001